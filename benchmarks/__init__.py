@@ -0,0 +1,3 @@
+'''
+Benchmarks de la ETL sobre datos sinteticos
+'''
@@ -0,0 +1,163 @@
+'''
+Programa utilizado para medir la ETL original, la del primer commit del
+repositorio, sobre los mismos datos sinteticos que benchmarks.run, y guardar
+la linea base versionada en benchmarks/results/baseline.json
+El codigo original se extrae con git worktree en una carpeta temporal y se
+importa desde ella, por lo que este programa no importa los modulos de la
+ETL actual. Se ejecuta desde la raiz del repositorio:
+    python -m benchmarks.baseline --scale small
+Los pasos se miden con los mismos nombres que en benchmarks.run. En el codigo
+original r_cleaner ya crea los ficheros de reviews, por lo que no hay un paso
+partition_reviews, y g_cleaner y r_cleaner reciben el dataset sin interpretar
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import argparse
+from contextlib import ExitStack, redirect_stdout
+import importlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import warnings
+import pandas as pd
+from benchmarks.timing import (
+    FOLDER, data_arguments, git_commit, hook_helpers, keep_best, measure,
+    recorder, save_results, show_results, summarize, unhook_helpers,
+    write_data
+    )
+
+# %%
+# Se definen las constantes
+
+# Primer commit del repositorio, con la ETL original
+BASELINE_COMMIT = 'f0104d0'
+
+# Funciones internas del codigo original que se miden
+HELPERS = {
+    'games_cleaner': [
+        'fill_mean', 'fill_mode', 'keyword_explosion', 'get_new_keywords',
+        'col_onehot', 'get_top'
+        ],
+    'review_cleaner': ['get_id']
+    }
+
+# %%
+# Se definen las funciones de medida
+
+
+def checkout(stack, commit):
+    '''
+    Se extrae commit en una carpeta temporal, que se elimina al cerrar stack
+    '''
+    folder = os.path.join(
+        stack.enter_context(tempfile.TemporaryDirectory()), 'src'
+        )
+    git = ['git', '-C', FOLDER, 'worktree']
+    subprocess.run(
+        git + ['add', '--detach', folder, commit],
+        capture_output=True, check=True
+        )
+    stack.callback(
+        subprocess.run, git + ['remove', '--force', folder],
+        capture_output=True, check=False
+        )
+    return folder
+
+
+def import_modules(folder):
+    '''
+    Se importan los modulos de la ETL desde folder
+    '''
+    sys.path.insert(0, folder)
+    return {
+        name: importlib.import_module(name)
+        for name in ['games_cleaner', 'review_cleaner', 'games_treatment']
+        }
+
+
+def read_reviews(reviews_folder):
+    '''
+    Se leen las reviews como en el cleaner.py original
+    '''
+    reviews_list = []
+    for file in sorted(os.listdir(reviews_folder)):
+        reviews_list.append(
+            pd.read_feather(os.path.join(reviews_folder, file))
+            .drop('review_text', axis=1)
+            )
+    return pd.concat(reviews_list).drop_duplicates('id')
+
+
+def run_once(modules, games_path, reviews_folder):
+    '''
+    Se ejecuta la ETL original una vez, con las funciones internas medidas,
+    y se devuelven los tiempos de cada funcion
+    '''
+    records = []
+    record = recorder(records)
+    originals = hook_helpers(record, {
+        modules[name]: names for name, names in HELPERS.items()
+        })
+    try:
+        # El codigo original informa de cada paso por pantalla
+        with redirect_stdout(io.StringIO()):
+            games_df = measure(
+                record, 'load_games', pd.read_feather, games_path
+                )
+            first_clean_df = measure(
+                record, 'g_cleaner', modules['games_cleaner'].g_cleaner,
+                games_df
+                )
+            reviews_df = measure(
+                record, 'load_reviews', read_reviews, reviews_folder
+                )
+            second_clean_df, _ = measure(
+                record, 'r_cleaner', modules['review_cleaner'].r_cleaner,
+                first_clean_df, reviews_df
+                )
+            measure(
+                record, 'g_treatment',
+                modules['games_treatment'].g_treatment, second_clean_df,
+                games_df
+                )
+    finally:
+        unhook_helpers(originals)
+    return summarize(records)
+
+
+# %%
+# Se define la funcion principal
+
+
+def main():
+    '''
+    Se generan los datos si no existen, se ejecuta la ETL original repeat
+    veces y se guarda el mejor tiempo de cada funcion
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    data_arguments(parser)
+    parser.add_argument('--commit', default=BASELINE_COMMIT)
+    args = parser.parse_args()
+    n_games, n_reviews, games_path, reviews_folder = write_data(args)
+
+    warnings.filterwarnings('ignore')
+    best = dict()
+    with ExitStack() as stack:
+        modules = import_modules(checkout(stack, args.commit))
+        for _ in range(args.repeat):
+            keep_best(best, run_once(modules, games_path, reviews_folder))
+
+    results = save_results(
+        best, args.label or 'baseline',
+        commit=git_commit(args.commit), games=n_games, reviews=n_reviews,
+        chunked=False, processes=1, repeat=args.repeat
+        )
+    show_results(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
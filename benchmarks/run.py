@@ -0,0 +1,185 @@
+'''
+Programa utilizado para medir el tiempo de cada paso de la ETL sobre datos
+sinteticos, guardando los resultados para compararlos entre commits
+Se ejecuta desde la raiz del repositorio. La linea base versionada es
+benchmarks/results/baseline.json:
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --scale small --compare <resultados.json>
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import argparse
+from contextlib import ExitStack
+from functools import wraps
+from multiprocessing import Manager
+import os
+import warnings
+import games_cleaner
+import review_cleaner
+from games_cleaner import g_cleaner
+from games_loader import (
+    games_columns, cleaner_columns, complex_columns, nested_columns,
+    load_games
+    )
+from games_treatment import g_treatment
+from parsers import PARSED_COLS, parse_columns
+from review_chunked import r_cleaner_chunked
+from review_cleaner import r_cleaner
+from review_loader import REVIEW_COLS, iter_reviews, load_reviews
+from benchmarks.timing import (
+    collect, data_arguments, git_commit, hook_helpers, keep_best, measure,
+    recorder, save_results, show_results, summarize, timed, unhook_helpers,
+    write_data
+    )
+
+# %%
+# Se definen las constantes
+
+# Funciones internas que se miden mientras se ejecutan las publicas
+HELPERS = {
+    games_cleaner: [
+        'fill_mean', 'fill_mode', 'keyword_explosion', 'get_new_keywords',
+        'col_onehot', 'get_top', 'prune_top'
+        ],
+    review_cleaner: [
+        'unique_names', 'user_stats', 'valid_users', 'game_stats',
+        'clean_games'
+        ]
+    }
+
+# %%
+# Se definen las funciones de medida
+
+
+def capture(record, function):
+    '''
+    Se envuelve prune_top para guardar una copia de sus entradas, sobre las
+    que despues se mide get_top
+    '''
+    @wraps(function)
+    def wrapper(d_f, col, *args, **kwargs):
+        record('top', (d_f[[col, 'OC_rating']].copy(), col, args, kwargs))
+        return function(d_f, col, *args, **kwargs)
+    return wrapper
+
+
+def run_steps(record, games_path, reviews_folder, chunked, processes):
+    '''
+    Se ejecutan los pasos de la ETL con las funciones internas medidas
+    '''
+    names = games_columns(games_path)
+    clean_cols = cleaner_columns(names)
+    complex_cols = complex_columns(names)
+    files = [
+        (name, os.path.getsize(os.path.join(reviews_folder, name)))
+        for name in sorted(os.listdir(reviews_folder))
+        ]
+
+    originals = hook_helpers(record, HELPERS)
+    games_cleaner.prune_top = capture(record, games_cleaner.prune_top)
+    try:
+        games_df = measure(
+            record, 'load_games', load_games, games_path,
+            columns=[col for col in names if col in clean_cols + complex_cols]
+            )
+        games_df = measure(
+            record, 'parse_columns', parse_columns, games_df,
+            PARSED_COLS + [
+                col for col in nested_columns(names) if col not in PARSED_COLS
+                ]
+            )
+        first_clean_df, _ = measure(
+            record, 'g_cleaner', g_cleaner, games_df[clean_cols],
+            max_workers=processes
+            )
+        if chunked:
+            second_clean_df, clean_reviews = measure(
+                record, 'r_cleaner_chunked', r_cleaner_chunked,
+                first_clean_df,
+                lambda: iter_reviews(reviews_folder, files, REVIEW_COLS)
+                )
+        else:
+            reviews_df = measure(
+                record, 'load_reviews', load_reviews, reviews_folder, files
+                )
+            second_clean_df, clean_reviews = measure(
+                record, 'r_cleaner', r_cleaner, first_clean_df, reviews_df
+                )
+        # Las reviews limpias se generan segun se piden
+        measure(
+            record, 'partition_reviews',
+            lambda parts: sum(len(part) for _, part in parts), clean_reviews
+            )
+        measure(
+            record, 'g_treatment', g_treatment, second_clean_df,
+            games_df[complex_cols]
+            )
+    finally:
+        unhook_helpers(originals)
+
+
+def run_once(games_path, reviews_folder, chunked=False, processes=1):
+    '''
+    Se ejecuta la ETL completa una vez sobre los ficheros locales y se
+    devuelven los tiempos de cada funcion. Con varios procesos, los tiempos
+    de las funciones internas que se ejecutan en el pool llegan a traves de
+    una cola de un Manager
+    '''
+    with ExitStack() as stack:
+        queue = None
+        if processes > 1:
+            queue = stack.enter_context(Manager()).Queue()
+        records = []
+        record = recorder(records, queue)
+        run_steps(record, games_path, reviews_folder, chunked, processes)
+        collect(records, queue)
+
+    # get_top no se usa dentro de g_cleaner, se mide sobre las mismas
+    # entradas que prune_top
+    time_records = [entry for entry in records if entry[0] == 'time']
+    get_top = timed(
+        recorder(time_records), 'games_cleaner.get_top', games_cleaner.get_top
+        )
+    for entry in records:
+        if entry[0] == 'top':
+            d_f, col, args, kwargs = entry[1]
+            get_top(d_f, col, *args, **kwargs)
+    return summarize(time_records)
+
+
+# %%
+# Se define la funcion principal
+
+
+def main():
+    '''
+    Se generan los datos si no existen, se ejecuta la ETL repeat veces y se
+    guarda el mejor tiempo de cada funcion en RESULTS_FOLDER
+    '''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    data_arguments(parser)
+    parser.add_argument('--chunked', action='store_true')
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+    n_games, n_reviews, games_path, reviews_folder = write_data(args)
+
+    warnings.filterwarnings('ignore')
+    best = dict()
+    for _ in range(args.repeat):
+        keep_best(best, run_once(
+            games_path, reviews_folder, args.chunked, args.processes
+            ))
+
+    commit = git_commit()
+    results = save_results(
+        best, args.label or f'{commit}_g{n_games}_r{n_reviews}',
+        commit=commit, games=n_games, reviews=n_reviews,
+        chunked=args.chunked, processes=args.processes, repeat=args.repeat
+        )
+    show_results(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
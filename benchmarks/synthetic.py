@@ -0,0 +1,331 @@
+'''
+Programa utilizado para generar datasets sinteticos de juegos y reviews con
+el mismo formato que los originales de S3: columnas de texto, listas y
+diccionarios guardados como texto y valores nulos como 'nan' o 'None'
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# %%
+# Se definen las constantes
+
+# Columnas del dataset de juegos en su orden original. Las funciones de
+# games_loader y el orden final de r_cleaner y g_treatment seleccionan
+# columnas segun su posicion: first_release_date es la tercera, las columnas
+# de complex_columns no coinciden con las del dataset limpio que usa
+# g_treatment, y game_engines, expansions y advanced_devs son las posiciones
+# 26, 28 y 49
+GAMES_COLS = [
+    'id', 'platforms', 'first_release_date', 'genres', 'game_modes', 'name',
+    'RAWG_link', 'player_perspectives', 'keywords', 'themes', 'age_ratings',
+    'summary', 'OC_rating', 'MC_rating', 'RAWG_rating',
+    'RAWG_nreviews', 'franchises', 'developer', 'publisher', 'OC_equal_name',
+    'HLTB_equal_name', 'HLTB_main_duration', 'HLTB_extra_duration',
+    'HLTB_complete_duration', 'RAWG_equal_name', 'bundles', 'game_engines',
+    'category', 'expansions', 'devs', 'expanded_games', 'HLTB_link',
+    'HLTB_name', 'OC_link', 'OC_name', 'OC_nreviews', 'n_count',
+    'parent_game', 'porting', 'ports', 'RAWG_name', 'release_dates',
+    'remakes', 'remasters', 'standalone_expansions', 'status', 'storyline',
+    'supporting', 'updated_at', 'advanced_devs'
+    ]
+
+GENRES = [
+    'Action', 'Adventure', 'RPG', 'Shooter', 'Puzzle', 'Indie', 'Strategy',
+    'Simulator', 'Sport', 'Racing'
+    ]
+THEMES = [
+    'Fantasy', 'Horror', 'Science fiction', 'Comedy', 'Drama', 'Open world',
+    'Survival', 'Historical'
+    ]
+KEYWORDS = [f'keyword {i}' for i in range(300)] + [
+    'steam', 'sequel', 'fantasy', 'achievements', 'digital distribution'
+    ]
+PLATFORMS = [
+    'PC (Microsoft Windows)', 'PlayStation 4', 'Nintendo Switch',
+    'Xbox One', 'Mac', 'Linux'
+    ]
+GAME_MODES = ['Single player', 'Multiplayer', 'Co-operative']
+PERSPECTIVES = ['First person', 'Third person', 'Side view', 'Bird view']
+POSITIONS = ['director', 'writer', 'artist', 'producer', 'designer', 'music']
+PEGI = [3, 7, 12, 16, 18]
+ESRB = [10, 13, 17, 18]
+RATINGS = [1, 3, 4, 5]
+RATING_P = [0.15, 0.25, 0.35, 0.25]
+
+# Filas por bloque al generar listas aleatorias
+BLOCK = 100000
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def sample_lists(rng, pool, n_rows, low, high):
+    '''
+    Se eligen entre low y high elementos distintos de pool para cada fila,
+    por bloques para acotar la memoria
+    '''
+    lists = []
+    for start in range(0, n_rows, BLOCK):
+        size = min(BLOCK, n_rows - start)
+        order = np.argsort(rng.random((size, len(pool))), axis=1)
+        lengths = rng.integers(low, high + 1, size=size)
+        lists.extend(
+            [pool[j] for j in row[:length]]
+            for row, length in zip(order.tolist(), lengths.tolist())
+            )
+    return lists
+
+
+def with_nulls(rng, values, rate, null='nan'):
+    '''
+    Se sustituye una fraccion rate de los valores por el valor nulo dado
+    '''
+    values = np.asarray(values, dtype=object)
+    values[rng.random(len(values)) < rate] = null
+    return values
+
+
+def named(values, key='name'):
+    '''
+    Se pasa cada lista de nombres a una lista de diccionarios como texto
+    '''
+    return [str([{key: value} for value in row]) for row in values]
+
+
+# %%
+# Se definen las funciones que generan los datasets
+
+
+def games(n_games, seed=0):
+    '''
+    Se genera un dataset de n_games juegos. Cada juego aparece en una fila
+    por plataforma, igual que en el dataset original
+    '''
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n_games + 1)
+    games_df = pd.DataFrame({'id': ids.astype(str)})
+
+    # Nombres repetidos entre juegos distintos, para que unique_names tenga
+    # que anadir el ano y las plataformas
+    games_df['name'] = [
+        f'Game {i}' for i in rng.integers(0, max(1, n_games // 2), n_games)
+        ]
+    games_df['RAWG_link'] = [f'game-{i}' for i in ids]
+    games_df['first_release_date'] = with_nulls(
+        rng,
+        (
+            pd.Timestamp('2000-01-01')
+            + pd.to_timedelta(rng.integers(0, 8000, n_games), unit='D')
+            ).astype(str),
+        0.05
+        )
+    games_df['age_ratings'] = with_nulls(
+        rng,
+        [
+            str([{'rating': f'PEGI_{pegi}'}, {'rating': f'ESRB_{esrb}'}])
+            for pegi, esrb in zip(
+                rng.choice(PEGI, n_games).tolist(),
+                rng.choice(ESRB, n_games).tolist()
+                )
+            ],
+        0.3, 'None'
+        )
+    games_df['OC_rating'] = with_nulls(
+        rng, rng.integers(40, 100, n_games).astype(float).astype(str), 0.3
+        )
+    games_df['MC_rating'] = with_nulls(
+        rng, rng.integers(40, 100, n_games).astype(float).astype(str), 0.2
+        )
+    games_df['RAWG_rating'] = (rng.random(n_games) * 5).round(2).astype(str)
+    games_df['RAWG_nreviews'] = [
+        str({'1': low, '4': high})
+        for low, high in zip(
+            rng.integers(0, 5, n_games).tolist(),
+            rng.integers(0, 5, n_games).tolist()
+            )
+        ]
+    games_df['genres'] = with_nulls(
+        rng, [str(row) for row in sample_lists(rng, GENRES, n_games, 1, 2)],
+        0.05
+        )
+    games_df['themes'] = [
+        str(row) for row in sample_lists(rng, THEMES, n_games, 0, 2)
+        ]
+    games_df['summary'] = with_nulls(rng, ['summary'] * n_games, 0.02)
+    games_df['game_modes'] = with_nulls(
+        rng,
+        [str(row) for row in sample_lists(rng, GAME_MODES, n_games, 1, 2)],
+        0.2
+        )
+    games_df['player_perspectives'] = with_nulls(
+        rng,
+        [str(row) for row in sample_lists(rng, PERSPECTIVES, n_games, 1, 1)],
+        0.2
+        )
+    games_df['keywords'] = [
+        str(row) for row in sample_lists(rng, KEYWORDS, n_games, 0, 10)
+        ]
+    n_franchises = max(2, n_games // 20)
+    games_df['franchises'] = with_nulls(
+        rng,
+        [
+            str([{'id': 1, 'name': f'Franchise {i}'}])
+            for i in rng.integers(0, n_franchises, n_games).tolist()
+            ],
+        0.5
+        )
+    n_companies = max(2, n_games // 10)
+    games_df['developer'] = [
+        str(
+            [{'name': f'Developer {dev}', 'country': str(country)}]
+            + ([{'name': f'Developer {extra}'}] if extra >= 0 else [])
+            )
+        for dev, country, extra in zip(
+            rng.integers(0, n_companies, n_games).tolist(),
+            rng.integers(1, 900, n_games).tolist(),
+            np.where(
+                rng.random(n_games) > 0.5,
+                rng.integers(0, n_companies, n_games), -1
+                ).tolist()
+            )
+        ]
+    games_df['publisher'] = with_nulls(
+        rng,
+        named([
+            [f'Publisher {i}']
+            for i in rng.integers(0, n_companies, n_games).tolist()
+            ]),
+        0.1
+        )
+    for col, rate in (
+            ('OC_equal_name', 0.2), ('HLTB_equal_name', 0.2),
+            ('RAWG_equal_name', 0.1)):
+        games_df[col] = (rng.random(n_games) > rate).astype(str)
+    games_df['HLTB_main_duration'] = (
+        (rng.random(n_games) * 50).round(1).astype(str)
+        )
+    games_df['HLTB_extra_duration'] = with_nulls(
+        rng, (rng.random(n_games) * 80).round(1).astype(str), 0.3
+        )
+    games_df['HLTB_complete_duration'] = (
+        (rng.random(n_games) * 100).round(1).astype(str)
+        )
+    games_df['game_engines'] = with_nulls(
+        rng,
+        [
+            str([{'id': 1, 'name': f'Engine {i}'}])
+            for i in rng.integers(0, 50, n_games).tolist()
+            ],
+        0.5
+        )
+    games_df['expansions'] = with_nulls(
+        rng,
+        [
+            str([{'id': 2, 'name': f'Expansion {i}'}])
+            for i in rng.integers(0, n_games, n_games).tolist()
+            ],
+        0.7
+        )
+    n_people = max(2, n_games // 5)
+    people = rng.integers(0, n_people, (n_games, 4)).tolist()
+    positions = rng.choice(POSITIONS, (n_games, 4)).tolist()
+    games_df['advanced_devs'] = with_nulls(
+        rng,
+        [
+            str([
+                {'Name': f'Person {person}', 'Position': [position]}
+                for person, position in zip(
+                    person_row[:length], position_row[:length]
+                    )
+                ])
+            for person_row, position_row, length in zip(
+                people, positions, rng.integers(0, 5, n_games).tolist()
+                )
+            ],
+        0.1
+        )
+
+    # Una fila por plataforma
+    platforms = sample_lists(rng, PLATFORMS, n_games, 1, 3)
+    games_df = (
+        games_df
+        .assign(platforms=platforms)
+        .explode('platforms', ignore_index=True)
+        )
+    for col in GAMES_COLS:
+        if col not in games_df:
+            games_df[col] = 'nan'
+    return games_df[GAMES_COLS]
+
+
+def review_shards(n_reviews, n_games, shard_size=1000000, n_users=None,
+                  dup_rate=0.001, seed=1):
+    '''
+    Se generan n_reviews reviews en ficheros de shard_size filas, con ids
+    crecientes. Un 10% de las reviews son de juegos que no existen y una
+    fraccion dup_rate se repite, igual que en los ficheros originales
+    '''
+    rng = np.random.default_rng(seed)
+    n_users = max(1, n_reviews // 25) if n_users is None else n_users
+    users = pd.Index([f'user-{i}' for i in range(n_users)])
+    game_links = pd.Index([
+        f'game-{i}' for i in range(1, int(n_games * 1.1) + 2)
+        ])
+    # Los usuarios siguen una distribucion sesgada: unos pocos usuarios
+    # escriben muchas reviews
+    weights = rng.lognormal(0, 1.5, n_users)
+    weights /= weights.sum()
+    last_id = 0
+    for start in range(0, n_reviews, shard_size):
+        size = min(shard_size, n_reviews - start)
+        ids = last_id + np.cumsum(rng.integers(1, 4, size))
+        last_id = int(ids[-1])
+        shard = pd.DataFrame({
+            'id': ids.astype(str),
+            'user_id': users.take(rng.choice(n_users, size, p=weights)),
+            'game_id': game_links.take(
+                rng.integers(0, len(game_links), size)
+                ),
+            'review_rating': rng.choice(RATINGS, size, p=RATING_P).astype(str),
+            'review_text': 'text'
+            })
+        dups = shard.loc[rng.random(size) < dup_rate]
+        yield pd.concat([shard, dups], ignore_index=True)
+
+
+def columns(path):
+    '''
+    Se leen los nombres de las columnas de un fichero feather sin cargarlo
+    '''
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def write_dataset(folder, n_games, n_reviews, shard_size=1000000, seed=0):
+    '''
+    Se escriben los juegos y las reviews en folder, con la misma estructura
+    que en S3: games.feather y una carpeta reviews/ con un fichero por parte
+    Si ya existen no se vuelven a generar, salvo los juegos si sus columnas
+    no siguen el orden de GAMES_COLS
+    '''
+    games_path = os.path.join(folder, 'games.feather')
+    reviews_folder = os.path.join(folder, 'reviews')
+    if not os.path.exists(games_path) or columns(games_path) != GAMES_COLS:
+        os.makedirs(folder, exist_ok=True)
+        games(n_games, seed).to_feather(games_path)
+    if not os.path.isdir(reviews_folder):
+        tmp_folder = f'{reviews_folder}.tmp'
+        os.makedirs(tmp_folder, exist_ok=True)
+        shards = review_shards(n_reviews, n_games, shard_size, seed=seed + 1)
+        for i, shard in enumerate(shards):
+            shard.to_feather(
+                os.path.join(tmp_folder, f'reviews_{i:05d}.feather')
+                )
+        os.rename(tmp_folder, reviews_folder)
+    return games_path, reviews_folder
@@ -0,0 +1,240 @@
+'''
+Funciones comunes de medida de los benchmarks. No importan ningun modulo de
+la ETL, de forma que se pueden usar tanto con el codigo actual como con el
+del commit de la linea base
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+from functools import wraps
+import json
+import os
+import platform
+import subprocess
+from time import perf_counter
+import pandas as pd
+from benchmarks.synthetic import write_dataset
+
+# %%
+# Se definen las constantes
+
+FOLDER = os.path.dirname(os.path.abspath(__file__))
+DATA_FOLDER = os.path.join(FOLDER, 'data')
+RESULTS_FOLDER = os.path.join(FOLDER, 'results')
+
+# Numero de juegos y de reviews de cada escala
+SCALES = {
+    'tiny': (2000, 100000),
+    'small': (10000, 1000000),
+    'medium': (100000, 10000000),
+    'large': (1000000, 100000000)
+    }
+
+# %%
+# Se definen las funciones que preparan los datos
+
+
+def data_arguments(parser):
+    '''
+    Se anaden a parser los argumentos comunes de los datos, las repeticiones
+    y los resultados
+    '''
+    parser.add_argument('--scale', choices=SCALES, default='tiny')
+    parser.add_argument('--games', type=int, help='sustituye a la escala')
+    parser.add_argument('--reviews', type=int, help='sustituye a la escala')
+    parser.add_argument('--shard-size', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data', default=DATA_FOLDER)
+    parser.add_argument('--label', help='nombre del fichero de resultados')
+    parser.add_argument('--compare', help='resultados con los que comparar')
+
+
+def write_data(args):
+    '''
+    Se generan los datos de la escala pedida si no existen. Devuelve el
+    numero de juegos y de reviews, la ruta de los juegos y la carpeta de las
+    reviews
+    '''
+    n_games, n_reviews = SCALES[args.scale]
+    n_games = args.games or n_games
+    n_reviews = args.reviews or n_reviews
+    games_path, reviews_folder = write_dataset(
+        os.path.join(
+            args.data, f'g{n_games}_r{n_reviews}_s{args.seed}'
+            ),
+        n_games, n_reviews, args.shard_size, args.seed
+        )
+    return n_games, n_reviews, games_path, reviews_folder
+
+
+# %%
+# Se definen las funciones de medida
+
+
+def recorder(records, queue=None):
+    '''
+    Se devuelve una funcion que guarda cada registro en records. Los procesos
+    del pool de g_cleaner heredan las funciones medidas pero no comparten
+    memoria con el principal, por lo que desde ellos se envian por queue
+    '''
+    pid = os.getpid()
+
+    def record(*entry):
+        if queue is not None and os.getpid() != pid:
+            queue.put(entry)
+        else:
+            records.append(entry)
+    return record
+
+
+def collect(records, queue=None):
+    '''
+    Se anaden a records los registros enviados por los procesos del pool
+    '''
+    while queue is not None and not queue.empty():
+        records.append(queue.get())
+
+
+def timed(record, name, function):
+    '''
+    Se envuelve una funcion para registrar el tiempo de cada llamada
+    '''
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record('time', name, perf_counter() - start)
+    return wrapper
+
+
+def hook_helpers(record, helpers):
+    '''
+    Se sustituyen las funciones internas de helpers, un diccionario de
+    modulos y nombres, por versiones medidas. Devuelve las originales para
+    restaurarlas
+    '''
+    originals = []
+    for module, names in helpers.items():
+        for name in names:
+            function = getattr(module, name)
+            originals.append((module, name, function))
+            setattr(
+                module, name,
+                timed(record, f'{module.__name__}.{name}', function)
+                )
+    return originals
+
+
+def unhook_helpers(originals):
+    '''
+    Se restauran las funciones internas originales
+    '''
+    for module, name, function in originals:
+        setattr(module, name, function)
+
+
+def measure(record, name, function, *args, **kwargs):
+    '''
+    Se ejecuta una funcion publica midiendo su tiempo
+    '''
+    return timed(record, name, function)(*args, **kwargs)
+
+
+def summarize(records):
+    '''
+    Se suman las llamadas y el tiempo de cada funcion
+    '''
+    timings = dict()
+    for _, name, seconds in records:
+        entry = timings.setdefault(name, {'calls': 0, 'seconds': 0.0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+    return timings
+
+
+def keep_best(best, timings):
+    '''
+    Se guarda en best el menor tiempo de cada funcion
+    '''
+    for name, entry in timings.items():
+        if name not in best or entry['seconds'] < best[name]['seconds']:
+            best[name] = entry
+
+
+# %%
+# Se definen las funciones que guardan y comparan los resultados
+
+
+def git_commit(ref='HEAD'):
+    '''
+    Commit abreviado de ref en el repositorio, si se puede obtener
+    '''
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', ref],
+            capture_output=True, text=True, check=True, cwd=FOLDER
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(best, label, **info):
+    '''
+    Se guardan en RESULTS_FOLDER los tiempos de best junto a la informacion
+    de la ejecucion y del entorno. Devuelve los resultados
+    '''
+    results = {
+        **info,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'timings': {
+            name: {
+                'calls': entry['calls'],
+                'seconds': round(entry['seconds'], 4)
+                }
+            for name, entry in best.items()
+            }
+        }
+    os.makedirs(RESULTS_FOLDER, exist_ok=True)
+    path = os.path.join(RESULTS_FOLDER, f'{label}.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
+    print(f'Resultados guardados en {path}')
+    return results
+
+
+def show_results(results, baseline_path=None):
+    '''
+    Se comparan los resultados con los de baseline_path o, si no se indica,
+    se muestran solos
+    '''
+    baseline = results
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as file:
+            baseline = json.load(file)
+    compare(baseline, results)
+
+
+def compare(baseline, results):
+    '''
+    Se muestra, para cada funcion, el tiempo de la linea base, el actual y
+    su cociente
+    '''
+    rows = []
+    for name, entry in results['timings'].items():
+        base = baseline['timings'].get(name)
+        rows.append({
+            'function': name,
+            'baseline_s': None if base is None else base['seconds'],
+            'current_s': entry['seconds'],
+            'ratio': (
+                None if not base or not base['seconds']
+                else round(entry['seconds'] / base['seconds'], 3)
+                )
+            })
+    print(pd.DataFrame(rows).to_string(index=False))
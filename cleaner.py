@@ -6,83 +6,345 @@ limpias
 # Se cargan las librerías necesarias para realizar este proceso
 
 from configparser import ConfigParser
+import json
+import shutil
+import sys
+import tempfile
 import warnings
-import pandas as pd
-import boto3
-from botocore.exceptions import ClientError
-from games_cleaner import g_cleaner
-from review_cleaner import r_cleaner
+from games_cleaner import TOP_COLS, banned_keys, g_cleaner
+from review_cleaner import USER_RULES, filter_reviews, r_cleaner
 from games_treatment import g_treatment
+from review_chunked import r_cleaner_chunked
+from review_loader import REVIEW_COLS, iter_reviews, load_reviews
+from feature_store import align_features, save_features
+from games_loader import (
+    games_columns, cleaner_columns, complex_columns, nested_columns,
+    load_games
+    )
+from name_index import build_index, write_index
+from parsers import PARSED_COLS, parse_columns
+from rating_matrix import ratings_from_files, save_ratings, track_reviews
+from instrumentation import configure, stage
+from incremental import (
+    read_manifest, write_manifest, read_state, write_state, shard_entries,
+    pending_files, removed_files, load_shards, update_state
+    )
+from review_exporter import export_reviews, partition_reviews, write_parquet
+from schema import apply_dtypes, feather_frame
+from stage_cache import (
+    CACHE_FOLDER, MAX_BYTES, cache_key, cached, code_version
+    )
+from storage import storage_root, file_fingerprint, list_files, make_parent
 
 # %%
-# Se cargan las claves necesarias para utilizar a lo largo del proceso
-# También se necesitan claves de acceso a nuestro servidor de AWS
+# Se definen las rutas dentro del almacenamiento
 
-config = ConfigParser()
-config.read('secrets.toml', encoding='utf-8')
-
-BUCKET_S3 = config['AWS']['bucket_s3']
 ORIGINAL_NAME = 'dataset/games.feather'
 NEW_FILE_NAME = 'clean_dataset/games_clean.feather'
 COMPLEX_NAME = 'clean_dataset/games_complex.feather'
+INDEX_NAME = 'clean_dataset/games_complex.index.arrow'
+NEW_PARQUET_NAME = 'clean_dataset/games_clean.parquet'
+COMPLEX_PARQUET_NAME = 'clean_dataset/games_complex.parquet'
+FEATURES_FOLDER = 'clean_dataset/features/'
+RATINGS_FOLDER = 'clean_dataset/ratings/'
 FOLDER = 'reviews/'
 CLEAN_FOLDER = 'clean_reviews/'
-warnings.filterwarnings('ignore')
+DATASET_FOLDER = 'clean_reviews_dataset/'
+STATE_FOLDER = 'clean_state/'
 
 # %%
-# Se carga el dataset existente
+# Se define la lectura de la configuracion
 
-try:
-    games_df = pd.read_feather(f'{BUCKET_S3}/{ORIGINAL_NAME}')
-    print('Dataset cargado correctamente desde S3')
-except OSError or ClientError:
-    print('No se ha podido cargar el dataset')
 
-# %%
-# Se realiza la conexion con S3
-bucket = (
-    boto3.resource('s3', region_name='us-east-1')
-    .Bucket(name=BUCKET_S3[5:])
-    )
+def read_settings(path='secrets.toml'):
+    '''
+    Se lee la configuracion de la ETL
+    La seccion [STORAGE] indica el almacenamiento (backend = s3, local o
+    memory) y su raiz. Sin ella se usa el bucket de [AWS] bucket_s3
+    '''
+    config = ConfigParser()
+    config.read(path, encoding='utf-8')
+
+    backend = config.get('STORAGE', 'backend', fallback='s3')
+    root = config.get(
+        'STORAGE', 'root',
+        fallback=config.get('AWS', 'bucket_s3', fallback='')
+        )
+
+    # En modo por partes las reviews se leen dos veces sin cargarlas todas a
+    # la vez en memoria
+    chunked = config.getboolean('ETL', 'chunked', fallback=False)
+    return {
+        'root': storage_root(backend, root),
+        'chunked': chunked,
+        # En modo incremental solo se leen los ficheros de reviews nuevos o
+        # modificados y solo se reescriben los ficheros limpios que cambien.
+        # No es compatible con el modo por partes
+        'incremental': (
+            config.getboolean('ETL', 'incremental', fallback=False)
+            and not chunked
+            ),
+        # Division de las reviews limpias en ficheros: por rango de id
+        # ('id'), por hash de game_id ('game') o por tamano ('size')
+        'partition': {'mode': config.get('ETL', 'partition', fallback='id')},
+        'max_workers': config.getint('ETL', 'max_workers', fallback=16),
+        # Reglas de los usuarios validos, como una lista JSON con el formato
+        # de USER_RULES
+        'user_rules': json.loads(
+            config.get('ETL', 'user_rules', fallback='null')
+            ) or USER_RULES,
+        # Formatos de salida: feather, con todo como texto, y parquet, con
+        # los tipos nativos y las reviews en un dataset particionado
+        # Matriz dispersa de usuarios por juegos con las notas de las reviews
+        # limpias. Ocupa memoria en proporcion al numero de reviews, por lo
+        # que en modo por partes solo se crea si se pide
+        'ratings': config.getboolean('ETL', 'ratings', fallback=not chunked),
+        'formats': [
+            fmt.strip() for fmt in
+            config.get('ETL', 'formats', fallback='feather').split(',')
+            ],
+        # Procesos con los que g_cleaner trata en paralelo las columnas
+        # independientes
+        'processes': config.getint('ETL', 'processes', fallback=1),
+        # Medidas de cada etapa en lineas JSON y perfiles de cProfile. Si no
+        # se indican, se usan las variables de entorno VRA_METRICS y
+        # VRA_PROFILE
+        'metrics': config.get('ETL', 'metrics', fallback=None),
+        'profile': config.get('ETL', 'profile', fallback=None),
+        # Cache en disco local del resultado de cada etapa, con cache = true.
+        # La seccion [CACHE] indica su carpeta (folder) y su tamano (max_gb)
+        'cache': (
+            {
+                'folder': config.get(
+                    'CACHE', 'folder', fallback=CACHE_FOLDER
+                    ),
+                'max_bytes': int(2 ** 30 * config.getfloat(
+                    'CACHE', 'max_gb', fallback=MAX_BYTES / 2 ** 30
+                    ))
+                }
+            if config.getboolean('ETL', 'cache', fallback=False) else None
+            )
+        }
+
 
 # %%
-# Se leen las reviews disponibles
+# Se definen las etapas que se guardan en la cache
 
-av_files = [
-    obj.key for obj in bucket.objects.filter(Prefix=FOLDER)
-    if len(obj.key) > len(FOLDER)
-    ]
 
-reviews_list = []
-for file in av_files:
-    reviews_list.append(
-        pd.read_feather(f'{BUCKET_S3}/{file}').drop('review_text', axis=1)
+def stage_keys(games_input, av_files, settings):
+    '''
+    Se calcula la clave de cada etapa. La de cada etapa depende de la de la
+    anterior, de forma que un cambio en una etapa invalida las siguientes
+    '''
+    g_key = cache_key(
+        'g_cleaner', games_input,
+        {'top_cols': TOP_COLS, 'banned_keys': sorted(banned_keys)},
+        code_version(g_cleaner, load_games, parse_columns, apply_dtypes)
+        )
+    r_key = cache_key(
+        'r_cleaner', [g_key, shard_entries(av_files)],
+        {
+            'chunked': settings['chunked'],
+            'incremental': settings['incremental'],
+            'user_rules': settings['user_rules']
+            },
+        code_version(
+            filter_reviews, r_cleaner_chunked, load_reviews, update_state
+            )
+        )
+    t_key = cache_key(
+        'g_treatment', [r_key, games_input], None,
+        code_version(g_treatment, parse_columns)
         )
+    return g_key, r_key, t_key
+
+
+def clean_all_reviews(root, av_files, games_df, max_workers,
+                      user_rules=None):
+    '''
+    Se cargan todas las reviews y se limpian, sin dividirlas en ficheros. Si
+    el resultado se recupera de la cache no se descargan las reviews
+    '''
+    reviews_df = load_reviews(
+        root, [(key, size) for key, size, _ in av_files],
+        max_workers=max_workers
+        )
+    print('Reviews cargadas')
+    with stage('r_cleaner', reviews_df) as record:
+        games_df, reviews_df = filter_reviews(
+            games_df, reviews_df, user_rules=user_rules
+            )
+        record['rows_out'] = len(reviews_df)
+    return games_df, reviews_df
 
-reviews_df = pd.concat(reviews_list).drop_duplicates('id')
-print('Reviews cargadas')
 
 # %%
-# Se limpia el dataset
-first_clean_df = g_cleaner(games_df)
-second_clean_df, clean_reviews = r_cleaner(first_clean_df, reviews_df)
-clean_df, complex_df = g_treatment(second_clean_df, games_df)
+# Se define el proceso completo
+
+
+def main(settings):
+    '''
+    Se ejecuta la ETL completa sobre el almacenamiento de settings
+    '''
+    root = settings['root']
+    max_workers = settings['max_workers']
+    cache = settings.get('cache')
+    configure(metrics=settings['metrics'], profile=settings['profile'])
+    warnings.filterwarnings('ignore')
+
+    # Se carga el dataset existente. Se leen en una sola pasada las columnas
+    # que usan g_cleaner y g_treatment, filtrando por RAWG_equal_name y con
+    # los tipos ya convertidos
+
+    try:
+        names = games_columns(f'{root}/{ORIGINAL_NAME}')
+        clean_cols = cleaner_columns(names)
+        complex_cols = complex_columns(names)
+        games_df = load_games(
+            f'{root}/{ORIGINAL_NAME}',
+            columns=[
+                col for col in names if col in clean_cols + complex_cols
+                ]
+            )
+        print('Dataset cargado correctamente')
+
+        # Las columnas con listas y diccionarios se interpretan una unica vez
+        # y se comparten entre g_cleaner y g_treatment
+        games_df = parse_columns(
+            games_df,
+            PARSED_COLS + [
+                col for col in nested_columns(names) if col not in PARSED_COLS
+                ]
+            )
+        games_input = file_fingerprint(f'{root}/{ORIGINAL_NAME}')
+    except OSError:
+        print('No se ha podido cargar el dataset')
+        return
+
+    # Se leen las reviews disponibles de forma concurrente, cargando solo las
+    # columnas que se usan en la limpieza
+
+    av_files = list_files(root, FOLDER)
+    g_key, r_key, t_key = stage_keys(games_input, av_files, settings)
+
+    manifest = {'shards': dict(), 'outputs': dict()}
+    users_df = None
+    if settings['incremental']:
+        manifest = read_manifest(f'{root}/{STATE_FOLDER}')
+        # Se vuelven a cargar los ficheros nuevos o modificados, y del estado
+        # se eliminan las reviews de estos y de los que ya no existen
+        pending = pending_files(av_files, manifest)
+        state_df, reviews_df, users_df = update_state(
+            *read_state(f'{root}/{STATE_FOLDER}', manifest),
+            load_shards(root, pending, max_workers),
+            [key for key, _ in pending] + removed_files(av_files, manifest)
+            )
+        print('Reviews cargadas')
+
+    # Se limpia el dataset
+    first_clean_df, features = cached(
+        cache, 'g_cleaner', g_key,
+        g_cleaner, games_df[clean_cols], max_workers=settings['processes']
+        )
+    if settings['chunked']:
+        second_clean_df, clean_reviews = r_cleaner_chunked(
+            first_clean_df,
+            lambda: iter_reviews(
+                root, [(key, size) for key, size, _ in av_files],
+                REVIEW_COLS, max_workers
+                ),
+            settings['partition'],
+            user_rules=settings['user_rules']
+            )
+    elif settings['incremental']:
+        second_clean_df, clean_reviews = r_cleaner(
+            first_clean_df, reviews_df, users_df, settings['partition'],
+            settings['user_rules']
+            )
+    else:
+        second_clean_df, reviews_clean_df = cached(
+            cache, 'r_cleaner', r_key,
+            clean_all_reviews, root, av_files, first_clean_df, max_workers,
+            settings['user_rules']
+            )
+        print('Se obtienen las reviews limpias')
+        clean_reviews = partition_reviews(
+            reviews_clean_df, **settings['partition']
+            )
+
+    # Las matrices de one_hot se alinean con las filas del dataset limpio
+    # antes de que g_treatment elimine la columna id
+    features = align_features(features, second_clean_df['id'])
+    clean_df, complex_df = cached(
+        cache, 'g_treatment', t_key,
+        g_treatment, second_clean_df, games_df[complex_cols]
+        )
+
+    # Las columnas de la matriz de notas se guardan en disco local segun se
+    # exportan las reviews
+    rating_folder = None
+    if settings['ratings']:
+        rating_folder = tempfile.mkdtemp(prefix='ratings_')
+        clean_reviews = track_reviews(clean_reviews, rating_folder)
+
+    feather = 'feather' in settings['formats']
+    parquet = 'parquet' in settings['formats']
+    digests, changed = export_reviews(
+        clean_reviews,
+        f'{root}/{CLEAN_FOLDER}' if feather else None,
+        manifest['outputs'],
+        max_workers,
+        f'{root}/{DATASET_FOLDER}' if parquet else None
+        )
+
+    if settings['incremental']:
+        write_state(state_df, users_df, f'{root}/{STATE_FOLDER}')
+        write_manifest(
+            {'shards': shard_entries(av_files), 'outputs': digests},
+            f'{root}/{STATE_FOLDER}'
+            )
+
+    print(f'Reviews limpias, {len(changed)} ficheros actualizados')
+
+    if settings['ratings']:
+        with stage('write_ratings') as record:
+            try:
+                ratings = ratings_from_files(rating_folder)
+            finally:
+                shutil.rmtree(rating_folder, ignore_errors=True)
+            save_ratings(ratings, f'{root}/{RATINGS_FOLDER}')
+            record['rows_out'] = ratings['matrix'].nnz
+        print('Matriz de notas guardada')
+
+    with stage('write_games', clean_df):
+        if feather:
+            feather_frame(clean_df).to_feather(
+                make_parent(f'{root}/{NEW_FILE_NAME}'),
+                compression='lz4'
+            )
+
+            feather_frame(complex_df).to_feather(
+                f'{root}/{COMPLEX_NAME}',
+                compression='lz4'
+            )
+
+        if parquet:
+            # Los juegos conservan el orden del fichero feather, que es el
+            # de las filas de las matrices de features
+            write_parquet(clean_df, f'{root}/{NEW_PARQUET_NAME}', sort=None)
+            write_parquet(
+                complex_df, f'{root}/{COMPLEX_PARQUET_NAME}', sort=None
+                )
 
-for review in clean_reviews:
-    clean_reviews[review].to_feather(
-        f'{BUCKET_S3}/{CLEAN_FOLDER}{review}',
-        compression='lz4')
+        save_features(features, f'{root}/{FEATURES_FOLDER}')
 
-print('Reviews limpias')
+        # Indice de nombres con la fila de cada juego en games_complex
+        write_index(
+            build_index(complex_df['name']), f'{root}/{INDEX_NAME}'
+            )
 
-clean_df.reset_index(drop=True).astype(str).to_feather(
-    f'{BUCKET_S3}/{NEW_FILE_NAME}',
-    compression='lz4'
-)
+    print('Dataset limpio')
 
-complex_df.reset_index(drop=True).astype(str).to_feather(
-    f'{BUCKET_S3}/{COMPLEX_NAME}',
-    compression='lz4'
-)
 
-print('Dataset limpio')
+if __name__ == '__main__':
+    main(read_settings(*sys.argv[1:]))
@@ -0,0 +1,77 @@
+'''
+Programa utilizado para guardar las variables one_hot_encoding de los juegos
+como matrices dispersas, junto a su vocabulario
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import io
+import json
+import fsspec
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# %%
+# Se definen los nombres de los ficheros
+ID_FILE = 'id.npy'
+VOCABULARY_FILE = 'vocabulary.json'
+
+# %%
+# Se definen las funciones del almacen de variables
+
+
+def align_features(features, ids):
+    '''
+    Se reordenan las filas de cada matriz para que sigan el orden de los id
+    dados, eliminando las de juegos que no aparezcan. Todos los id dados
+    deben tener fila en las matrices
+    '''
+    pos = pd.Index(features['id']).get_indexer(ids)
+    if (pos < 0).any():
+        missing = np.asarray(ids)[pos < 0]
+        raise ValueError(
+            f'{len(missing)} id sin variables one_hot, por ejemplo '
+            f'{missing[:5].tolist()}'
+            )
+    return {
+        'id': np.asarray(ids),
+        'matrix': {
+            col: matrix[pos] for col, matrix in features['matrix'].items()
+            },
+        'vocabulary': features['vocabulary']
+        }
+
+
+def save_features(features, folder):
+    '''
+    Se guarda una matriz CSR por cada grupo de columnas en formato npz, los
+    id de cada fila y el vocabulario de cada grupo
+    '''
+    with fsspec.open(f'{folder}{ID_FILE}', 'wb') as file:
+        np.save(file, features['id'])
+    for col, matrix in features['matrix'].items():
+        # Se escribe primero en memoria, pues save_npz necesita poder
+        # desplazarse por el fichero
+        buffer = io.BytesIO()
+        sparse.save_npz(buffer, matrix.tocsr())
+        with fsspec.open(f'{folder}{col}.npz', 'wb') as file:
+            file.write(buffer.getvalue())
+    with fsspec.open(f'{folder}{VOCABULARY_FILE}', 'w') as file:
+        json.dump(features['vocabulary'], file)
+
+
+def load_features(folder):
+    '''
+    Se cargan las matrices guardadas con save_features
+    '''
+    with fsspec.open(f'{folder}{ID_FILE}', 'rb') as file:
+        ids = np.load(file)
+    with fsspec.open(f'{folder}{VOCABULARY_FILE}', 'r') as file:
+        vocabulary = json.load(file)
+    matrix = dict()
+    for col in vocabulary:
+        with fsspec.open(f'{folder}{col}.npz', 'rb') as file:
+            matrix[col] = sparse.load_npz(io.BytesIO(file.read()))
+    return {'id': ids, 'matrix': matrix, 'vocabulary': vocabulary}
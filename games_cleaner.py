@@ -8,10 +8,15 @@ para mostrar sus datos en la aplicacion final
 # %%
 # Se cargan las librerías necesarias para realizar este proceso
 
-import ast
+from itertools import chain
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import MultiLabelBinarizer
+from games_loader import DROP_COLS
+from instrumentation import instrument, start_stage, next_stage, end_stage
+from parsers import PARSED_COLS, empty_to_null, literal, is_null
+from schema import GAMES_DTYPES, apply_dtypes
+from task_graph import task, task_pool, run_tasks
 
 # %%
 # Se define la herramienta capaz de realizar one_hot_encoding en funcion
@@ -19,8 +24,8 @@ from sklearn.preprocessing import MultiLabelBinarizer
 mlb = MultiLabelBinarizer(sparse_output=True)
 
 # %%
-# Se define una lista de keywords que no deberan aparecer en los resultados
-banned_keys = [
+# Se define el conjunto de keywords que no deberan aparecer en los resultados
+banned_keys = frozenset([
     'digital distribution', 'steam', 'achievements', 'steam achievements',
     'playstation trophies', 'bink video', 'sequel', 'steam trading cards',
     'gog.com', 'xbox live', 'greatest hits', 'platform exclusive',
@@ -32,7 +37,22 @@ banned_keys = [
     'compilation', 'hack and slash', 'launch titles', 'arcade', 'porting',
     'xbox one x enhanced', 'simulation', 'driving/racing',
     'top-down perspective'
-    ]
+    ])
+
+# %%
+# Se define, para cada columna, cuantos valores se conservan (topx) y cuantos
+# juegos deben tener como minimo (min_games)
+TOP_COLS = {
+    'developer': {'topx': 175, 'min_games': 5},
+    'publisher': {'topx': 100, 'min_games': 10},
+    'keywords': {'topx': 200, 'min_games': 10},
+    'devs': {'topx': 100, 'min_games': 5},
+    'franchises': {'topx': 200, 'min_games': 2},
+    'country': {'topx': 15, 'min_games': 10}
+    }
+
+# Cargos del equipo de desarrollo que se conservan en devs
+STAFF_ROLES = ['director', 'writer', 'designer', 'producer']
 
 # %%
 # Se definen las funciones utiles en todo el proceso de limpieza
@@ -42,9 +62,9 @@ def age_cols(row):
     '''
     Se trata la columna de age_ratings
     '''
-    if row is None or pd.isnull(row):
+    if row is None or is_null(row):
         return np.NaN
-    rts = ast.literal_eval(row)
+    rts = literal(row)
     if isinstance(rts, dict):
         rts = [rts]
     rts = {rat['rating'][:4]: int(rat['rating'][5:]) for rat in rts}
@@ -57,9 +77,9 @@ def franchise_col(row):
     '''
     Se trata la columna de franquicias
     '''
-    if pd.isnull(row):
+    if is_null(row):
         return []
-    data = ast.literal_eval(row)
+    data = literal(row)
     franchises = []
     for franchise in data:
         if isinstance(franchise, dict):
@@ -69,29 +89,13 @@ def franchise_col(row):
     return list(set(franchises))
 
 
-def dev_col(row):
-    '''
-    Se trata la columna de desarrolladoras
-    '''
-    if pd.isnull(row):
-        return []
-    data = ast.literal_eval(row)
-    devs = []
-    countries = []
-    for dev in data:
-        devs.append(dev['name'])
-        if 'country' in dev.keys():
-            countries.append(dev['country'])
-    return list(set(devs)), list(set(countries))
-
-
 def pub_col(row):
     '''
     Se trata la columna de publishers
     '''
-    if pd.isnull(row):
+    if is_null(row):
         return []
-    data = ast.literal_eval(row)
+    data = literal(row)
     pubs = [pub['name'] for pub in data]
     return list(set(pubs))
 
@@ -100,12 +104,47 @@ def rawg_rat(row):
     '''
     Se trata la columna de RAWG_nrewiews
     '''
-    if pd.isnull(row):
+    if is_null(row):
         return 0
-    reviews = ast.literal_eval(row)
+    reviews = literal(row)
     return sum(reviews.values())
 
 
+def map_column(d_f, col, mapper, fill=None):
+    '''
+    Se aplica mapper a cada valor de col, rellenando antes los nulos con fill
+    si se indica
+    '''
+    values = d_f[col] if fill is None else d_f[col].fillna(fill)
+    return values.map(mapper)
+
+
+def fill_hierarchy(d_f, col, levels, fallback):
+    '''
+    Se rellenan los valores nulos de col buscando, del mas especifico al mas
+    general, en cada uno de los niveles dados. Cada nivel es un DataFrame con
+    las columnas de agrupacion seguidas del valor a usar. Los nulos que queden
+    se rellenan con fallback
+    '''
+    filled = d_f[col].copy()
+    for level in levels:
+        missing = filled.isna().to_numpy()
+        if not missing.any():
+            break
+        keys = level.columns[:-1].tolist()
+        lookup = level.set_index(keys)[level.columns[-1]]
+        if len(keys) == 1:
+            target = pd.Index(d_f.loc[missing, keys[0]])
+        else:
+            target = pd.MultiIndex.from_frame(d_f.loc[missing, keys])
+        pos = lookup.index.get_indexer(target)
+        found = pos >= 0
+        filled.iloc[np.flatnonzero(missing)[found]] = (
+            lookup.to_numpy()[pos[found]]
+            )
+    return filled.fillna(fallback)
+
+
 def get_mode(d_f, fixed_col, col):
     '''
     Obtiene la moda de un DataFrame para la columna solicitada y agrupando
@@ -113,7 +152,7 @@ def get_mode(d_f, fixed_col, col):
     '''
     return (
         d_f
-        .groupby(fixed_col + [col])
+        .groupby(fixed_col + [col], observed=True)
         [col]
         .agg(['count', 'max'])
         .sort_values(fixed_col + ['count'])
@@ -125,7 +164,7 @@ def get_mode(d_f, fixed_col, col):
 
 def obtain_mode_df(d_f, col):
     '''
-    Se obtienen los 3 valores necesarios para rellenar la funcion de merge_mode
+    Se obtienen los 3 valores necesarios para rellenar la funcion de fill_mode
     '''
     genre_theme_df = get_mode(d_f, ['genres', 'themes'], col)
     genre_df = get_mode(d_f, ['genres'], col)
@@ -134,54 +173,21 @@ def obtain_mode_df(d_f, col):
     return genre_theme_df, genre_df, mode
 
 
-def merge_mode(value_col, genres, themes, genre_theme_df, genre_df, mode):
-    '''
-    Se rellenan los valores nulos con la moda
-    '''
-    if not pd.isnull(value_col):
-        return value_col
-    sp_df = genre_theme_df.loc[
-        (genre_theme_df['genres'] == genres) &
-        (genre_theme_df['themes'] == themes)
-        ]
-    if len(sp_df) == 1:
-        return sp_df.iloc[0, -1]
-    sp_df = genre_df.loc[genre_df['genres'] == genres]
-    if len(sp_df) == 1:
-        return sp_df.iloc[0, -1]
-    return mode
-
-
 def fill_mode(d_f, col):
     '''
     Realiza el proceso anterior completo
     '''
     genre_theme_df, genre_df, mode = obtain_mode_df(d_f, col)
-    return (
-        d_f
-        .apply(
-            lambda x: merge_mode(
-                x[col], x['genres'], x['themes'],
-                genre_theme_df, genre_df, mode
-                ),
-            axis=1
-            )
-        )
+    return fill_hierarchy(d_f, col, [genre_theme_df, genre_df], mode)
 
 
 def col_onehot(d_f, col):
     '''
-    Se transforma una columna que contenga listas a one hot encoding
+    Se transforma una columna que contenga listas a one hot encoding,
+    devolviendo la matriz dispersa y el nombre de cada una de sus columnas
     '''
-    return d_f.join(
-          pd.DataFrame
-          .sparse
-          .from_spmatrix(
-              mlb.fit_transform(d_f.pop(col)),
-              index=d_f.index,
-              columns=mlb.classes_
-                  )
-          )
+    matrix = mlb.fit_transform(d_f.pop(col))
+    return matrix.tocsr(), [str(name) for name in mlb.classes_]
 
 
 def get_mean(d_f, fixed_col, col, roundng):
@@ -190,13 +196,18 @@ def get_mean(d_f, fixed_col, col, roundng):
     con las columnas dadas
     '''
     if roundng:
-        return round(d_f.groupby(fixed_col, as_index=False)[col].mean(), 0)
-    return round(d_f.groupby(fixed_col, as_index=False)[col].mean(), 2)
+        return round(
+            d_f.groupby(fixed_col, as_index=False, observed=True)[col].mean(),
+            0
+            )
+    return round(
+        d_f.groupby(fixed_col, as_index=False, observed=True)[col].mean(), 2
+        )
 
 
 def obtain_mean_df(d_f, col, roundng):
     '''
-    Se obtienen los 3 valores necesarios para rellenar la funcion de merge_mean
+    Se obtienen los 3 valores necesarios para rellenar la funcion de fill_mean
     '''
     genre_theme_df = get_mean(d_f, ['genres', 'themes'], col, roundng).dropna()
     genre_df = get_mean(d_f, ['genres'], col, roundng).dropna()
@@ -208,48 +219,23 @@ def obtain_mean_df(d_f, col, roundng):
     return genre_theme_df, genre_df, mean
 
 
-def merge_mean(value_col, genres, themes, genre_theme_df, genre_df, mean):
-    '''
-    Se rellenan los valores nulos con la media
-    '''
-    if not pd.isnull(value_col):
-        return value_col
-    sp_df = genre_theme_df.loc[
-        (genre_theme_df['genres'] == genres) &
-        (genre_theme_df['themes'] == themes)
-        ]
-    if len(sp_df) == 1:
-        return sp_df.iloc[0, -1]
-    sp_df = genre_df.loc[genre_df['genres'] == genres]
-    if len(sp_df) == 1:
-        return sp_df.iloc[0, -1]
-    return mean
-
-
 def fill_mean(d_f, col, roundng=True):
     '''
     Realiza el proceso anterior completo
     '''
     genre_theme_df, genre_df, mean = obtain_mean_df(d_f, col, roundng)
-    return (
-        d_f
-        .apply(
-            lambda x: merge_mean(
-                x[col], x['genres'], x['themes'],
-                genre_theme_df, genre_df, mean
-                ),
-            axis=1
-            )
-        )
+    return fill_hierarchy(d_f, col, [genre_theme_df, genre_df], mean)
 
 
 def keyword_explosion(d_f, fixed_col):
     '''
     Se obtiene la cuenta total de cada keyword en funcion de los grupos
-    buscados
+    buscados. Las categoricas se pasan a object para que value_counts no
+    cuente combinaciones sin observar y los empates mantengan su orden
     '''
     return (
         d_f[fixed_col + ['keywords']]
+        .astype(object)
         .explode('keywords')
         .dropna()
         .value_counts()
@@ -258,60 +244,170 @@ def keyword_explosion(d_f, fixed_col):
         )
 
 
-def get_new_keywords(keywords, genres, themes, keys, n_key=6):
+def keyword_index(keys, n_key=6):
+    '''
+    A partir de las cuentas de keyword_explosion, se crea para cada nivel un
+    diccionario con las n_key keywords mas usadas de cada grupo, de forma que
+    completar las keywords de un juego sea una busqueda por clave
+    '''
+    index = []
+    for key_df in keys:
+        fixed_col = key_df.columns[:-2].tolist()
+        if not fixed_col:
+            index.append({(): key_df['keywords'].iloc[:n_key].tolist()})
+            continue
+        index.append(
+            key_df
+            .groupby(fixed_col, sort=False, observed=True)
+            .head(n_key)
+            .groupby(fixed_col, sort=False, observed=True)
+            ['keywords']
+            .agg(list)
+            .to_dict()
+            )
+    return index
+
+
+def get_new_keywords(keywords, genres, themes, index, n_key=6):
     '''
     Se define el numero de keywords que tendra cada juego, y se rellena en
     funcion de las mas usadas por genero y tematica. Se excluiran aquellas que
     esten en la lista de baneadas
     '''
     keywords = [keyword for keyword in keywords if keyword not in banned_keys]
-    while len(keywords) < n_key:
-        to_add = (
-            keys[0].loc[
-                (keys[0]['genres'] == genres) &
-                (keys[0]['themes'] == themes),
-                'keywords'
-            ]
-            .tolist()
+    if len(keywords) < n_key:
+        for to_add in [
+                index[0].get((genres, themes), []),
+                index[1].get(genres, []),
+                index[2][()]
+                ]:
+            keywords += [key for key in to_add if key not in keywords]
+    return keywords[:n_key]
+
+
+def explode_codes(series):
+    '''
+    Se pasa una columna de listas a dos arrays con la fila y el codigo de cada
+    elemento, junto a las categorias ordenadas a las que hacen referencia
+    '''
+    rows = np.repeat(np.arange(len(series)), series.map(len).to_numpy())
+    codes, categories = pd.factorize(
+        pd.Series(list(chain.from_iterable(series)), dtype=object),
+        sort=True
         )
-        for i in range(n_key):
-            try:
-                if to_add[i] not in keywords:
-                    keywords.append(to_add[i])
-            except IndexError:
-                break
-        to_add = (
-            keys[1].loc[keys[1]['genres'] == genres, 'keywords'].tolist()
+    return rows[codes >= 0], codes[codes >= 0], categories
+
+
+def top_categories(codes, n_categories, ratings, topx, min_games):
+    '''
+    Se obtienen, ordenados, los codigos de las topx categorias segun el maximo
+    OC_rating de sus juegos, con mas de min_games juegos y desempatando por
+    numero de juegos. ratings es el OC_rating de cada elemento de codes
+    '''
+    valid = ~np.isnan(ratings)
+    count = np.bincount(codes[valid], minlength=n_categories)
+    best = np.full(n_categories, np.NaN)
+    np.fmax.at(best, codes[valid], ratings[valid])
+
+    candidates = np.flatnonzero(count > min_games)
+    order = np.lexsort((-count[candidates], -best[candidates]))
+    return candidates[order[:topx]]
+
+
+def collect_lists(rows, values, n_rows):
+    '''
+    Se agrupan los valores en una lista por fila. rows debe estar ordenado
+    '''
+    bounds = np.searchsorted(rows, np.arange(1, n_rows))
+    return [part.tolist() for part in np.split(values, bounds)]
+
+
+def staff_records(values, index, kind, name_key):
+    '''
+    Se pasa una columna de listas de diccionarios a una tabla con una fila
+    por elemento, recorriendo todos los elementos en una sola pasada
+    '''
+    records = list(chain.from_iterable(values))
+    return pd.DataFrame({
+        'game': np.repeat(index, values.map(len).to_numpy()),
+        'kind': kind,
+        'name': [record[name_key] for record in records],
+        'position': [
+            (record.get('Position') or [None])[0] for record in records
+            ],
+        'country': [record.get('country') for record in records]
+        })
+
+
+def staff_table(d_f):
+    '''
+    Se obtiene una tabla con una fila por desarrolladora (developer) y por
+    miembro del equipo (advanced_devs) de cada juego, con el indice del
+    juego, el nombre, el cargo principal y el pais
+    '''
+    return pd.concat([
+        staff_records(
+            d_f[col].fillna('[]').map(literal), d_f.index.to_numpy(), kind,
+            name_key
+            )
+        for col, kind, name_key in (
+            ('developer', 'developer', 'name'),
+            ('advanced_devs', 'staff', 'Name')
+            )
+        ], ignore_index=True).astype({'kind': 'category'})
+
+
+def collect_records(records, index, col):
+    '''
+    Se agrupan los valores de col de la tabla en una lista por juego, en el
+    orden de index. Los juegos sin valores reciben una lista vacia
+    '''
+    rows = index.get_indexer(records['game'])
+    order = np.argsort(rows, kind='stable')
+    order = order[rows[order] >= 0]
+    return pd.Series(
+        collect_lists(
+            rows[order], records[col].to_numpy(dtype=object)[order],
+            len(index)
+            ),
+        index=index
         )
-        for i in range(n_key):
-            try:
-                if to_add[i] not in keywords:
-                    keywords.append(to_add[i])
-            except IndexError:
-                break
-        to_add = keys[2]['keywords'].tolist()
-        for i in range(n_key):
-            if to_add[i] not in keywords:
-                keywords.append(to_add[i])
-    return keywords[:n_key]
 
 
 def get_top(d_f, col, topx, min_games):
     '''
     Para la col solicitada, se obtiene el topx juegos segun su OC_rating con un
     minimo min_games de juegos
+    g_cleaner ya no la usa, pues prune_top obtiene el top y poda las listas
+    en una sola pasada. Se conserva como referencia del top en las pruebas y
+    en la medida de tiempos de benchmarks/run.py
+    '''
+    rows, codes, categories = explode_codes(d_f[col])
+    top = top_categories(
+        codes, len(categories), d_f['OC_rating'].to_numpy()[rows],
+        topx, min_games
+        )
+    return categories[top].tolist()
+
+
+def prune_top(d_f, col, topx, min_games):
     '''
-    return (
-        d_f
-        .explode(col)
-        .groupby(col, as_index=False)
-        ['OC_rating']
-        .agg(['max', 'count'])
-        .reset_index()
-        .loc[lambda df: df['count'] > min_games]
-        .sort_values(['max', 'count'], ascending=False)
-        .iloc[:topx, 0]
-        .tolist()
+    Se eliminan de las listas de col los valores que no esten en el top,
+    explotando la columna una unica vez
+    '''
+    rows, codes, categories = explode_codes(d_f[col])
+    keep = np.zeros(len(categories), dtype=bool)
+    keep[top_categories(
+        codes, len(categories), d_f['OC_rating'].to_numpy()[rows],
+        topx, min_games
+        )] = True
+    keep = keep[codes]
+    return pd.Series(
+        collect_lists(
+            rows[keep], np.asarray(categories, dtype=object)[codes[keep]],
+            len(d_f)
+            ),
+        index=d_f.index
         )
 
 
@@ -319,36 +415,34 @@ def get_top(d_f, col, topx, min_games):
 # Se definen la funcion que se usara en la ETL
 
 
-def g_cleaner(games_df):
+def g_cleaning(games_df, top_cols, executor):
     '''
-    Dado un DataFrame, se limpiara este para lograr unos valores utiles de cara
-    a desarrollar el algoritmo
+    Se realiza la limpieza de g_cleaner. Las columnas independientes se
+    tratan en el pool executor, o en este proceso si es None
     '''
 
+    # Si el dataset se ha cargado con load_games, las columnas sobrantes y el
+    # filtro de RAWG ya se habran aplicado durante la lectura
     games_df = (
         games_df
         .replace(['nan', 'None', '[]', '{}'], np.NaN)
-        .drop([
-            'bundles', 'category', 'devs', 'expanded_games', 'expansions',
-            'game_engines', 'HLTB_link', 'HLTB_name', 'OC_link', 'OC_name',
-            'OC_nreviews', 'n_count', 'parent_game', 'porting', 'ports',
-            'RAWG_name', 'release_dates', 'remakes', 'remasters',
-            'standalone_expansions', 'status', 'storyline', 'supporting',
-            'updated_at'
-            ],
-            axis=1
-            )
+        .drop(DROP_COLS, axis=1, errors='ignore')
         )
+    # En las columnas ya interpretadas con parse_columns, los contenedores
+    # vacios tambien se tratan como nulos
+    for col in games_df.columns.intersection(PARSED_COLS):
+        games_df[col] = empty_to_null(games_df[col])
 
     # Se limpian aquellos con datos incorrectos de RAWG, pues no se lograria un
     # correcto cruce con las reviews
-    games_df = (
-        games_df
-        .loc[games_df['RAWG_equal_name'] == 'True']
-        .drop('RAWG_equal_name', axis=1)
-        )
+    if 'RAWG_equal_name' in games_df:
+        games_df = (
+            games_df
+            .loc[games_df['RAWG_equal_name'] == 'True']
+            .drop('RAWG_equal_name', axis=1)
+            )
 
-    games_df['id'] = games_df['id'].astype(int)
+    games_df = apply_dtypes(games_df, GAMES_DTYPES)
     games_df = (
         games_df
         .groupby('id', as_index=False)
@@ -373,31 +467,54 @@ def g_cleaner(games_df):
     # infimo porcentaje y eliminamos la columna, pues no podra ser utilizada en
     # el desarrollo del algoritmo
     print('Comienza el tratamiento del dataset')
+    step = start_stage('g_cleaner.columns', games_df)
 
     games_df.dropna(subset=['summary'], inplace=True)
     games_df.drop('summary', axis=1, inplace=True)
 
-    # Se limpian las columnas que sean necesarias
-    games_df['age_ratings'] = games_df['age_ratings'].map(age_cols)
-    games_df['franchises'] = games_df['franchises'].map(franchise_col)
+    # Se limpian las columnas que sean necesarias. Cada columna se trata de
+    # forma independiente, por lo que se pueden tratar en paralelo
     games_df = games_df.reset_index(drop=True)
-    games_df['developer'] = games_df['developer'].fillna('[]')
-    games_df['publisher'] = games_df['publisher'].fillna('[]')
-    games_df[['developer', 'country']] = pd.DataFrame(
-        games_df['developer'].map(dev_col).tolist()
+
+    # Las desarrolladoras y el equipo de cada juego se pasan a una unica
+    # tabla, de la que se obtienen las columnas developer, country y devs.
+    # Las desarrolladoras y los paises no se repiten dentro de un juego, y de
+    # los devs solo se conservan los de STAFF_ROLES
+    staff = staff_table(games_df)
+    companies = staff.loc[staff['kind'] == 'developer']
+    games_df['developer'] = collect_records(
+        companies.drop_duplicates(['game', 'name']), games_df.index, 'name'
+        )
+    games_df['country'] = collect_records(
+        companies.dropna(subset=['country'])
+        .drop_duplicates(['game', 'country']),
+        games_df.index, 'country'
         )
-    games_df['publisher'] = games_df['publisher'].map(pub_col)
-    games_df['RAWG_nreviews'] = games_df['RAWG_nreviews'].map(rawg_rat)
-    games_df['devs'] = (
-        games_df['advanced_devs'].fillna('[]').map(ast.literal_eval)
+    games_df['devs'] = collect_records(
+        staff.loc[
+            (staff['kind'] == 'staff') & staff['position'].isin(STAFF_ROLES)
+            ],
+        games_df.index, 'name'
         )
     games_df.drop('advanced_devs', axis=1, inplace=True)
+
+    run_tasks(games_df, [
+        task('age_ratings', map_column, ['age_ratings'], ['age_ratings'],
+             col='age_ratings', mapper=age_cols),
+        task('franchises', map_column, ['franchises'], ['franchises'],
+             col='franchises', mapper=franchise_col),
+        task('publisher', map_column, ['publisher'], ['publisher'],
+             col='publisher', mapper=pub_col, fill='[]'),
+        task('RAWG_nreviews', map_column, ['RAWG_nreviews'],
+             ['RAWG_nreviews'], col='RAWG_nreviews', mapper=rawg_rat)
+        ], executor)
     games_df = games_df.loc[games_df['RAWG_nreviews'] > 0]
     games_df['series'] = games_df['franchises']
 
     # Se tratan los ratings llenando los datos nulos de OC con los de MC, e
     # iterando para el resto
     print('Se obtienen los ratings')
+    step = next_stage(step, 'g_cleaner.ratings', games_df)
     games_df.loc[games_df['OC_equal_name'] != 'True', 'OC_rating'] = np.NaN
     games_df['OC_rating'] = games_df['OC_rating'].replace(0, np.NaN)
     games_df['OC_rating'] = (
@@ -415,13 +532,16 @@ def g_cleaner(games_df):
     games_df.drop(['MC_rating', 'OC_equal_name'], axis=1, inplace=True)
 
     # Se aplican la funcion de moda a las columnas requeridas
-    for col in ['age_ratings', 'game_modes', 'player_perspectives']:
-        games_df[col] = fill_mode(games_df, col)
+    run_tasks(games_df, [
+        task(col, fill_mode, [col, 'genres', 'themes'], [col], col=col)
+        for col in ['age_ratings', 'game_modes', 'player_perspectives']
+        ], executor)
 
     # Se tratan las keywords
     print('Se tratan las keywords')
+    step = next_stage(step, 'g_cleaner.keywords', games_df)
     games_df['keywords'] = (
-        games_df['keywords'].fillna('[]').map(ast.literal_eval)
+        games_df['keywords'].fillna('[]').map(literal)
         )
 
     key_count = []
@@ -431,102 +551,93 @@ def g_cleaner(games_df):
             .loc[lambda df: ~(df['keywords'].isin(banned_keys))]
             )
 
-    games_df['keywords'] = games_df.apply(
-        lambda x: get_new_keywords(
-            x['keywords'], x['genres'], x['themes'], key_count
-            ),
-        axis=1)
+    key_index = keyword_index(key_count)
+    games_df['keywords'] = [
+        get_new_keywords(keywords, genres, themes, key_index)
+        for keywords, genres, themes in zip(
+            games_df['keywords'], games_df['genres'], games_df['themes']
+            )
+        ]
 
     # Se trata los datos de duracion
     print('Se trata la duracion')
+    step = next_stage(step, 'g_cleaner.duration', games_df)
     games_df.loc[games_df['HLTB_equal_name'] != 'True', duration_col] = np.NaN
     games_df.drop('HLTB_equal_name', axis=1, inplace=True)
     games_df[duration_col] = games_df[duration_col].replace(0, np.NaN)
-    for col in duration_col:
-        games_df[col] = fill_mean(games_df, col, False)
-
-    # Se tratan los devs para quedarnos unicamente con los que esten en las
-    # posiciones de director, escritor, disenador o productor
-    print('Se tratan los devs')
-    games_df['devs'] = games_df['devs'].map(
-        lambda devs: [
-            dev['Name'] for dev in devs
-            if dev['Position'][0] in [
-                    'director', 'writer', 'designer', 'producer'
-                    ]
-            ]
-        )
+    run_tasks(games_df, [
+        task(col, fill_mean, [col, 'genres', 'themes'], [col], col=col,
+             roundng=False)
+        for col in duration_col
+        ], executor)
 
     # Para ciertas columnas, solo se conservara un top de variables, de
     # cara a no dejar un one_hot_encoding de muchas columnas
     # Este top se hará por los juegos con una mejor nota segun los nuevos
     # valores de OC y con un minimo de juegos
     print('Se obtienen los valores top')
-    col_top = [
-        'developer', 'publisher', 'keywords', 'devs', 'franchises', 'country'
-        ]
-    for col, topx, min_games in zip(
-            col_top,
-            [175, 100, 200, 100, 200, 15],
-            [5, 10, 10, 5, 2, 10]):
-        games_df = (
-            games_df
-            .drop(col, axis=1)
-            .merge(
-                games_df
-                .explode(col)
-                .loc[lambda df: df[col].isin(
-                    get_top(games_df, col, topx, min_games)
-                    )]
-                .groupby('id', as_index=False)
-                [col]
-                .agg(lambda x: x.tolist()),
-                on='id',
-                how='left'
-                )
-            )
+    step = next_stage(step, 'g_cleaner.top', games_df)
+    top_cols = TOP_COLS if top_cols is None else top_cols
+    col_top = list(top_cols)
+    run_tasks(games_df, [
+        task(col, prune_top, [col, 'OC_rating'], [col], col=col,
+             **top_cols[col])
+        for col in col_top
+        ], executor)
+    games_df = games_df.reset_index(drop=True)
 
     # Se pasan las variables a one_hot_encoding
     print('Se realiza el one_hot_encoding')
+    step = next_stage(step, 'g_cleaner.onehot', games_df)
     col_hot = ['game_modes', 'player_perspectives']
     for col in col_hot:
-        games_df[col] = games_df[col].map(ast.literal_eval)
-        cols = games_df.columns
-        games_df = col_onehot(games_df, col)
-        games_df = games_df.rename(columns={
-            f'{col_name}': f'{col_name}_{col}'
-            for col_name in games_df if col_name not in cols
-            })
-
-    # Se pasan las variables con valores nulos a one_hot_encoding
+        games_df[col] = games_df[col].map(literal)
+
+    # Se pasan las variables con valores nulos a listas
     col_nan = ['genres', 'themes']
     for col in col_nan:
-        games_df[col] = games_df[col].fillna('[]').map(ast.literal_eval)
-        cols = games_df.columns
-        games_df = col_onehot(games_df, col)
-        games_df = games_df.rename(columns={
-            f'{col_name}': f'{col_name}_{col}'
-            for col_name in games_df if col_name not in cols
-            })
-
-    # Se pasan las variables restantes a one_hot_encoding
+        games_df[col] = (
+            games_df[col].astype(object).fillna('[]').map(literal)
+            )
+
+    # Se pasan las variables restantes a listas
     for col in col_top:
         games_df[col] = games_df[col].map(
             lambda x: x if isinstance(x, list) else []
             )
-        cols = games_df.columns
-        games_df = col_onehot(games_df, col)
-        games_df = games_df.rename(columns={
-            f'{col_name}': f'{col_name}_{col}'
-            for col_name in games_df if col_name not in cols
-            })
-
-    # Se crea un array de las columnas de one_hot
-    for col_name in col_top + col_nan + col_hot:
-        cols_to_treat = [col for col in games_df if col.endswith(col_name)]
-        games_df[col_name] = games_df[cols_to_treat].values.tolist()
-        games_df.drop(cols_to_treat, axis=1, inplace=True)
-
-    # Se devuelve el dataset limpio previo a la limpieza de las reviews
+
+    # Se guarda cada grupo de one_hot como una matriz dispersa, alineada con
+    # los id del DataFrame, en lugar de pasarlo a listas por fila
+    features = {
+        'id': games_df['id'].to_numpy(),
+        'matrix': dict(),
+        'vocabulary': dict()
+        }
+    onehot = run_tasks(games_df, [
+        task(col, col_onehot, [col], col=col)
+        for col in col_top + col_nan + col_hot
+        ], executor)
+    for col in col_top + col_nan + col_hot:
+        features['matrix'][col], features['vocabulary'][col] = onehot[col]
+    games_df.drop(col_top + col_nan + col_hot, axis=1, inplace=True)
+
+    # Se devuelve el dataset limpio previo a la limpieza de las reviews y
+    # las variables one_hot
+    end_stage(step, games_df)
     print('Primera limpieza completada')
-    return games_df
+    return games_df, features
+
+
+@instrument('g_cleaner')
+def g_cleaner(games_df, top_cols=None, max_workers=None):
+    '''
+    Dado un DataFrame, se limpiara este para lograr unos valores utiles de cara
+    a desarrollar el algoritmo
+    Las variables one_hot se devuelven aparte como matrices dispersas
+    top_cols indica, para cada columna, el top de valores que se conserva
+    max_workers es el numero de procesos con los que se tratan en paralelo
+    las columnas independientes. Por defecto se usa un unico proceso, y en
+    otro caso se crea un unico pool para toda la limpieza
+    '''
+    with task_pool(max_workers) as executor:
+        return g_cleaning(games_df, top_cols, executor)
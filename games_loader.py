@@ -0,0 +1,139 @@
+'''
+Programa utilizado para cargar el dataset de juegos leyendo unicamente las
+filas y columnas necesarias, con los tipos de datos ya convertidos
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from instrumentation import instrument
+from schema import GAMES_DTYPES, apply_dtypes
+from storage import resolve
+
+# %%
+# Se definen las constantes
+
+# Valores que se consideran nulos al convertir las columnas de texto
+NULL_VALUES = pa.array(['nan', 'None', '', '[]', '{}'])
+
+# Columnas que no se usan en la limpieza del dataset
+DROP_COLS = [
+    'bundles', 'category', 'devs', 'expanded_games', 'expansions',
+    'game_engines', 'HLTB_link', 'HLTB_name', 'OC_link', 'OC_name',
+    'OC_nreviews', 'n_count', 'parent_game', 'porting', 'ports',
+    'RAWG_name', 'release_dates', 'remakes', 'remasters',
+    'standalone_expansions', 'status', 'storyline', 'supporting',
+    'updated_at'
+    ]
+
+# Solo se conservan los juegos con un correcto cruce con RAWG
+RAWG_FILTER = pc.field('RAWG_equal_name') == 'True'
+
+# %%
+# Se definen las funciones que indican que columnas se leen
+
+
+def games_columns(path, filesystem=None):
+    '''
+    Se obtienen los nombres de las columnas del dataset en su orden original
+    '''
+    if filesystem is None:
+        filesystem, path = resolve(path)
+    return (
+        ds.dataset(path, format='feather', filesystem=filesystem)
+        .schema
+        .names
+        )
+
+
+def cleaner_columns(names):
+    '''
+    Columnas utilizadas por g_cleaner
+    '''
+    return [
+        col for col in names
+        if col not in DROP_COLS + ['RAWG_equal_name']
+        ]
+
+
+def nested_columns(names):
+    '''
+    Columnas con listas de diccionarios que g_treatment convierte a listas
+    '''
+    return names[26:30:2] + [names[49]]
+
+
+def complex_columns(names):
+    '''
+    Columnas utilizadas por g_treatment para crear el dataset detallado
+    '''
+    return (
+        [names[0]] + names[2:5] + names[7:10] + [names[11]]
+        + nested_columns(names)
+        )
+
+
+# %%
+# Se definen las funciones de conversion de tipos
+
+
+def to_type(array, arrow_type):
+    '''
+    Se convierte una columna de texto al tipo indicado, tratando como nulos
+    los valores de NULL_VALUES
+    '''
+    if not pa.types.is_string(array.type):
+        return array
+    array = pc.if_else(
+        pc.is_in(array, value_set=NULL_VALUES),
+        pa.scalar(None, array.type),
+        array
+        )
+    return pc.cast(array, arrow_type)
+
+
+def decode_table(table):
+    '''
+    Se convierten el id, los ratings, las duraciones y las fechas a su tipo
+    final mientras se encuentran en formato Arrow
+    '''
+    for col in table.column_names:
+        if col == 'id':
+            arrow_type = pa.int64()
+        elif col.endswith(('duration', 'rating')):
+            arrow_type = pa.float64()
+        elif 'date' in col and col not in DROP_COLS:
+            arrow_type = pa.timestamp('ns')
+        else:
+            continue
+        try:
+            array = to_type(table[col].combine_chunks(), arrow_type)
+        except pa.ArrowInvalid:
+            # Si el formato no es reconocido se mantiene como texto y se
+            # convertira durante la limpieza
+            continue
+        table = table.set_column(table.column_names.index(col), col, array)
+    return table
+
+
+# %%
+# Se define la funcion de carga
+
+
+@instrument('load_games')
+def load_games(path, columns=None, filesystem=None):
+    '''
+    Se carga el dataset de juegos, filtrando por RAWG_equal_name y leyendo
+    unicamente las columnas solicitadas, ya con los tipos de GAMES_DTYPES
+    path puede ser una url de cualquier almacenamiento de fsspec
+    '''
+    if filesystem is None:
+        filesystem, path = resolve(path)
+    table = (
+        ds.dataset(path, format='feather', filesystem=filesystem)
+        .to_table(columns=columns, filter=RAWG_FILTER)
+        )
+    return apply_dtypes(decode_table(table).to_pandas(), GAMES_DTYPES)
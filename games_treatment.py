@@ -6,9 +6,23 @@ limpio
 # %%
 # Se cargan las librerías necesarias para realizar este proceso
 
-import ast
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from instrumentation import instrument
+from parsers import is_null, literal
+from schema import GAMES_DTYPES, apply_dtypes
+
+# %%
+# Se definen los tipos de Arrow de las columnas anidadas. Al convertir solo
+# se leen los campos indicados, y se ignora el resto de claves
+
+NAME_TYPE = pa.list_(pa.struct([('name', pa.string())]))
+DEV_TYPE = pa.list_(pa.struct([
+    ('Name', pa.string()),
+    ('Position', pa.list_(pa.string()))
+    ]))
 
 # %%
 # Se define la funcion que ayudara en la limpieza de los datos
@@ -17,47 +31,109 @@ import numpy as np
 def get_from_dict(value):
     '''
     Dado que mucha informacion viene dada en diccionarios, se usa esta funcion
-    para obtener la parte importante
+    para obtener la parte importante. Los nulos pasan a lista vacia y los
+    diccionarios sin nombre a None, igual que en name_kernel
     '''
-    if value == []:
+    if is_null(value):
         return []
-    return [field['name'] for field in value]
+    return [field.get('name') for field in value]
 
 
 def get_dev_function(value):
     '''
     A diferencia de la funcion anterior, en este caso se obtendra el nombre y
-    cargo de cada uno de los desarrolladores del juego
+    cargo de cada uno de los desarrolladores del juego. Igual que en
+    dev_kernel, los desarrolladores sin nombre pasan a None y los que no
+    tienen cargo conservan solo el nombre
     '''
-    if value == []:
+    if is_null(value):
         return []
     return [
         f"{field['Name']}: {', '.join(field['Position'])}"
-        if 'Position' in field.keys() else field['Name']
+        if field.get('Name') is not None and field.get('Position') is not None
+        else field.get('Name')
         for field in value
         ]
 
 
+def name_kernel(array):
+    '''
+    Version vectorizada de get_from_dict: sobre un array list<struct> de
+    Arrow se proyecta el campo name de todos los structs a la vez y se
+    vuelve a agrupar por fila con los mismos offsets
+    '''
+    return pa.ListArray.from_arrays(
+        array.offsets, array.flatten().field('name')
+        )
+
+
+def dev_kernel(array):
+    '''
+    Version vectorizada de get_dev_function: los cargos de cada desarrollador
+    se unen con binary_join y se anaden a su nombre. Los desarrolladores sin
+    cargo conservan solo el nombre, y los que no tienen nombre pasan a nulo
+    '''
+    devs = array.flatten()
+    names = pc.coalesce(
+        pc.binary_join_element_wise(
+            devs.field('Name'), pc.binary_join(devs.field('Position'), ', '),
+            ': '
+            ),
+        devs.field('Name')
+        )
+    return pa.ListArray.from_arrays(array.offsets, names)
+
+
+def to_lists(array):
+    '''
+    Se pasa un array list<string> de Arrow a listas de Python, convirtiendo
+    todos los valores de una vez y cortandolos segun los offsets
+    '''
+    values = array.flatten().to_numpy(zero_copy_only=False).tolist()
+    offsets = array.offsets.to_numpy().tolist()
+    return [
+        values[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+
+def nested_column(series, kernel, arrow_type, fallback):
+    '''
+    Se convierte una columna de listas de diccionarios a un array list<struct>
+    de Arrow con el tipo dado y se aplica kernel. Si algun valor no encaja en
+    el tipo, se aplica fallback celda a celda
+    '''
+    try:
+        array = pa.array(series.tolist(), type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return series.map(fallback)
+    return pd.Series(to_lists(kernel(array)), index=series.index, dtype=object)
+
+
 # %%
 # Se define la funcion que usara la ETL
 
 
+@instrument('g_treatment')
 def g_treatment(clean_df, games_df):
     '''
     Transforma la inforamcion a un formato mas comodo para leer
+    games_df debe contener las columnas de complex_columns, ya filtradas por
+    RAWG_equal_name, tal y como las devuelve load_games
     '''
-    games_df['id'] = games_df['id'].astype(int)
-    cols = games_df.columns.tolist()
+    games_df = apply_dtypes(games_df, {'id': GAMES_DTYPES['id']})
+    # Las columnas categoricas de GAMES_DTYPES vuelven a object, ya que sus
+    # nulos se rellenan con listas
+    games_df = games_df.astype({
+        col: object for col in games_df
+        if isinstance(games_df[col].dtype, pd.CategoricalDtype)
+        })
     fused_df = (
         clean_df[
             ['id', 'name', 'platforms', 'series'] +
             clean_df.columns.tolist()[5:10]
             ]
         .merge(
-            games_df.loc[games_df['RAWG_equal_name'] == 'True'][
-                [cols[0]] + cols[2:5] + cols[7:10] + [cols[11]] + cols[26:30:2]
-                + [cols[49]]
-                ],
+            games_df,
             on='id',
             suffixes=('', '_')
             )
@@ -78,24 +154,23 @@ def g_treatment(clean_df, games_df):
         fused_df[fused_df.columns.tolist()[9:12] + ['themes']].fillna('[]')
         )
     for col in fused_df.columns[15:]:
-        fused_df[col] = fused_df[col].fillna('[]').map(ast.literal_eval)
+        fused_df[col] = fused_df[col].fillna('[]').map(literal)
 
     for col in fused_df.columns[15:-1]:
-        fused_df[col] = fused_df[col].map(get_from_dict)
-    fused_df['devs'] = fused_df['advanced_devs'].map(get_dev_function)
-    fused_df.drop('advanced_devs', axis=1, inplace=True)
-    cols = fused_df.columns.tolist()
-    fused_df = (
-        fused_df[
-            ['name', 'first_release_date'] + cols[1:8] + cols[9:11] +
-            [cols[13]] + cols[11:13] + cols[14:]
-            ]
-        .assign(
-            name_lower=lambda df: df['name'].str.lower()
+        fused_df[col] = nested_column(
+            fused_df[col], name_kernel, NAME_TYPE, get_from_dict
             )
-        .sort_values('name_lower')
-        .drop('name_lower', axis=1)
+    fused_df['devs'] = nested_column(
+        fused_df['advanced_devs'], dev_kernel, DEV_TYPE, get_dev_function
         )
+    fused_df.drop('advanced_devs', axis=1, inplace=True)
+    # Los juegos quedan en el orden del dataset limpio. Las busquedas por
+    # nombre se hacen con el indice de name_index
+    cols = fused_df.columns.tolist()
+    fused_df = fused_df[
+        ['name', 'first_release_date'] + cols[1:8] + cols[9:11] +
+        [cols[13]] + cols[11:13] + cols[14:]
+        ]
 
     clean_df.drop(
         ['id', 'platforms', 'series', 'age_ratings'],
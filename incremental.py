@@ -0,0 +1,228 @@
+'''
+Programa utilizado para limpiar las reviews de forma incremental, procesando
+unicamente los ficheros nuevos o modificados desde la ultima ejecucion
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import json
+import fsspec
+import pandas as pd
+from review_cleaner import user_stats
+from review_loader import MAX_WORKERS, REVIEW_COLS, iter_reviews
+from storage import make_parent
+from schema import REVIEWS_DTYPES, USERS_DTYPES, apply_dtypes, concat_typed
+
+# %%
+# Se definen los nombres de los ficheros de estado
+MANIFEST_FILE = 'manifest.json'
+REVIEWS_FILE = 'reviews.feather'
+USERS_FILE = 'users.feather'
+# Version del formato del estado. Un estado de otra version no es valido
+STATE_VERSION = 2
+
+# %%
+# Columna del estado con el fichero de origen de cada review
+SHARD_COL = 'shard'
+STATE_DTYPES = {**REVIEWS_DTYPES, SHARD_COL: 'category'}
+
+# %%
+# Se definen las funciones de lectura y escritura del estado
+
+
+def read_manifest(folder):
+    '''
+    Se lee el manifiesto de la ultima ejecucion. Si no existe o es de otra
+    version del estado, se devuelve uno vacio, lo que equivale a procesar todo
+    '''
+    try:
+        with fsspec.open(f'{folder}{MANIFEST_FILE}', 'r') as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        manifest = dict()
+    if manifest.get('version') != STATE_VERSION:
+        return {'shards': dict(), 'outputs': dict()}
+    return manifest
+
+
+def write_manifest(manifest, folder):
+    '''
+    Se guarda el manifiesto de la ejecucion actual
+    '''
+    with fsspec.open(f'{folder}{MANIFEST_FILE}', 'w') as file:
+        json.dump({**manifest, 'version': STATE_VERSION}, file)
+
+
+def read_state(folder, manifest):
+    '''
+    Se leen las reviews ya procesadas, con el fichero de origen de cada una,
+    y las cuentas por usuario. Si no hay manifiesto previo se parte de un
+    estado vacio
+    '''
+    if not manifest['shards']:
+        return None, None
+    return (
+        pd.read_feather(f'{folder}{REVIEWS_FILE}'),
+        pd.read_feather(f'{folder}{USERS_FILE}')
+        )
+
+
+def write_state(state_df, users_df, folder):
+    '''
+    Se guardan las reviews procesadas y las cuentas por usuario
+    '''
+    state_df.reset_index(drop=True).to_feather(
+        make_parent(f'{folder}{REVIEWS_FILE}'), compression='lz4'
+        )
+    users_df.reset_index(drop=True).to_feather(
+        f'{folder}{USERS_FILE}', compression='lz4'
+        )
+
+
+# %%
+# Se definen las funciones que detectan los cambios
+
+
+def shard_entries(objects):
+    '''
+    Se obtiene la entrada del manifiesto de cada fichero de reviews
+    objects es una lista de tuplas (clave, bytes, etag)
+    '''
+    return {key: {'size': size, 'etag': etag} for key, size, etag in objects}
+
+
+def pending_files(objects, manifest):
+    '''
+    Se obtienen los ficheros nuevos o modificados desde la ultima ejecucion
+    '''
+    return [
+        (key, size) for key, size, etag in objects
+        if manifest['shards'].get(key) != {'size': size, 'etag': etag}
+        ]
+
+
+def removed_files(objects, manifest):
+    '''
+    Se obtienen los ficheros que estaban en la ultima ejecucion y ya no
+    existen. Sus reviews se eliminan del estado igual que las de un fichero
+    modificado
+    '''
+    keys = {key for key, _, _ in objects}
+    return [key for key in manifest['shards'] if key not in keys]
+
+
+# %%
+# Se definen las funciones que incorporan los cambios al estado
+
+
+def load_shards(bucket_s3, files, max_workers=MAX_WORKERS):
+    '''
+    Se cargan los ficheros de reviews dados, anotando en cada review su
+    fichero de origen. Solo se eliminan los duplicados dentro de cada
+    fichero, ya que la copia vigente de un id repetido entre ficheros depende
+    del resto del estado
+    '''
+    shards = [
+        apply_dtypes(shard, REVIEWS_DTYPES)
+        .drop_duplicates('id')
+        .assign(**{SHARD_COL: key})
+        for key, shard in iter_reviews(
+            bucket_s3, files, REVIEW_COLS, max_workers
+            )
+        ]
+    if not shards:
+        return apply_dtypes(
+            pd.DataFrame(columns=list(STATE_DTYPES)), STATE_DTYPES
+            )
+    return concat_typed(
+        [apply_dtypes(shard, STATE_DTYPES) for shard in shards], STATE_DTYPES
+        )
+
+
+def current_reviews(state_df):
+    '''
+    Se obtienen las reviews vigentes del estado: una copia de cada id, la del
+    primer fichero en el orden de la lista, como en una ejecucion completa.
+    Se conserva el indice del estado
+    '''
+    shards = state_df[SHARD_COL].cat.reorder_categories(
+        sorted(state_df[SHARD_COL].cat.categories)
+        )
+    order = shards.cat.codes.argsort(kind='stable').to_numpy()
+    return state_df.iloc[order].drop_duplicates('id')
+
+
+def changed_copies(reviews_df, other_df, changed):
+    '''
+    Mascara de las reviews vigentes de reviews_df que no lo son en other_df
+    con la misma copia: su id es vigente en otro fichero, o no existe, o su
+    fichero ha cambiado
+    '''
+    shards = reviews_df[SHARD_COL]
+    other = other_df[SHARD_COL].cat.set_categories(shards.cat.categories)
+    owner = pd.Series(
+        other.cat.codes.to_numpy(), index=other_df['id'].to_numpy()
+        )
+    return (
+        (owner.reindex(reviews_df['id']).to_numpy()
+         != shards.cat.codes.to_numpy())
+        | shards.isin(changed).to_numpy()
+        )
+
+
+def update_state(state_df, users_df, new_df, changed):
+    '''
+    Se sustituyen en el estado todas las reviews de los ficheros de changed,
+    modificados o eliminados, por las de new_df, cargadas con load_shards. Asi
+    desaparecen tambien las reviews que se han borrado de un fichero
+    Las cuentas por usuario se actualizan restando las de las reviews que
+    dejan de estar vigentes y sumando las de las nuevas vigentes
+    Devuelve el estado, las reviews vigentes y las cuentas por usuario
+    '''
+    new_df = apply_dtypes(new_df, STATE_DTYPES)
+    if state_df is None:
+        state_df = new_df.reset_index(drop=True)
+        reviews_df = (
+            current_reviews(state_df)
+            .drop(SHARD_COL, axis=1)
+            .reset_index(drop=True)
+            )
+        return (
+            state_df, reviews_df,
+            apply_dtypes(user_stats(reviews_df), USERS_DTYPES)
+            )
+
+    state_df = apply_dtypes(state_df, STATE_DTYPES)
+    old_df = current_reviews(state_df)
+    state_df = concat_typed(
+        [state_df.loc[~state_df[SHARD_COL].isin(changed)]]
+        + ([new_df] if len(new_df) else []),
+        STATE_DTYPES
+        )
+    reviews_df = current_reviews(state_df)
+    removed = old_df.loc[changed_copies(old_df, reviews_df, changed)]
+    added = reviews_df.loc[changed_copies(reviews_df, old_df, changed)]
+
+    delta = pd.concat([
+        user_stats(added).set_index('user_id'),
+        -user_stats(removed).set_index('user_id')
+        ])
+    users_df = apply_dtypes(
+        pd.concat([users_df.set_index('user_id'), delta])
+        .groupby(level=0, observed=True)
+        .sum()
+        .loc[lambda df: df['count'] > 0]
+        .rename_axis('user_id')
+        .reset_index(),
+        {**USERS_DTYPES, 'user_id': 'category'}
+        )
+    print(
+        f'{len(added)} reviews nuevas, {len(removed)} eliminadas o '
+        f'sustituidas, {len(delta.index.unique())} usuarios afectados'
+        )
+    return (
+        state_df,
+        reviews_df.drop(SHARD_COL, axis=1).reset_index(drop=True),
+        users_df
+        )
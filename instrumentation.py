@@ -0,0 +1,231 @@
+'''
+Programa utilizado para medir cada etapa de la limpieza: tiempo real, tiempo
+de CPU, memoria maxima y filas de entrada y salida. Las medidas se escriben
+como lineas JSON y, opcionalmente, se guarda un perfil de cProfile por etapa
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import cProfile
+from contextlib import contextmanager
+from functools import wraps
+import json
+import os
+import sys
+from time import perf_counter, process_time, time
+import tracemalloc
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# %%
+# Se definen las constantes
+
+# Por defecto la configuracion se toma de las variables de entorno:
+# VRA_METRICS es el fichero de lineas JSON ('-' para la salida estandar),
+# VRA_PROFILE la carpeta de los perfiles y VRA_TRACEMALLOC activa la medida
+# de la memoria reservada desde Python
+SETTINGS = {
+    'metrics': os.environ.get('VRA_METRICS'),
+    'profile': os.environ.get('VRA_PROFILE'),
+    'tracemalloc': os.environ.get('VRA_TRACEMALLOC', '') not in ('', '0')
+    }
+
+# Etapas abiertas, de la mas externa a la mas interna
+STACK = []
+
+# %%
+# Se definen las funciones de configuracion y medida
+
+
+def configure(metrics=None, profile=None, trace_memory=None):
+    '''
+    Se cambia la configuracion dada por las variables de entorno. Solo se
+    modifican los valores indicados
+    '''
+    for key, value in (
+            ('metrics', metrics), ('profile', profile),
+            ('tracemalloc', trace_memory)):
+        if value is not None:
+            SETTINGS[key] = value
+
+
+def enabled():
+    '''
+    Indica si se debe medir alguna etapa
+    '''
+    return bool(SETTINGS['metrics'] or SETTINGS['profile'])
+
+
+def n_rows(value):
+    '''
+    Numero de filas de un DataFrame, o del primero de una tupla de
+    resultados. Si no hay ninguno se devuelve None
+    '''
+    if isinstance(value, tuple):
+        value = next(
+            (val for val in value if isinstance(val, pd.DataFrame)), None
+            )
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+def rss_peak_mb():
+    '''
+    Memoria residente maxima del proceso hasta el momento, en MB
+    '''
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # En macOS se da en bytes y en Linux en KB
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def emit(record):
+    '''
+    Se escribe la medida de una etapa como una linea JSON
+    '''
+    line = json.dumps(record)
+    if SETTINGS['metrics'] == '-':
+        print(line)
+        return
+    with open(SETTINGS['metrics'], 'a', encoding='utf-8') as file:
+        file.write(line + '\n')
+
+
+def start_stage(name, rows_in=None):
+    '''
+    Se abre una etapa. rows_in puede ser un numero o un DataFrame
+    Devuelve el registro de la etapa, o None si no se mide nada
+    '''
+    if not enabled():
+        return None
+    if SETTINGS['tracemalloc'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    record = {
+        'stage': name,
+        'parent': STACK[-1]['stage'] if STACK else None,
+        'start': time(),
+        'rows_in': (
+            rows_in if rows_in is None or isinstance(rows_in, int)
+            else n_rows(rows_in)
+            ),
+        '_wall': perf_counter(),
+        '_cpu': process_time(),
+        '_py_peak': 0,
+        '_profile': None
+        }
+    if tracemalloc.is_tracing():
+        # El pico de la etapa externa incluye los de las internas
+        if STACK:
+            STACK[-1]['_py_peak'] = max(
+                STACK[-1]['_py_peak'], tracemalloc.get_traced_memory()[1]
+                )
+        tracemalloc.reset_peak()
+    # Solo puede haber un perfil activo, el de la etapa mas externa
+    if SETTINGS['profile'] and not any(rec['_profile'] for rec in STACK):
+        record['_profile'] = cProfile.Profile()
+        record['_profile'].enable()
+    STACK.append(record)
+    return record
+
+
+def end_stage(record, rows_out=None):
+    '''
+    Se cierra una etapa abierta con start_stage y se escribe su medida
+    '''
+    if record is None:
+        return
+    wall = perf_counter() - record.pop('_wall')
+    cpu = process_time() - record.pop('_cpu')
+    profile = record.pop('_profile')
+    if profile is not None:
+        profile.disable()
+        os.makedirs(SETTINGS['profile'], exist_ok=True)
+        profile.dump_stats(
+            os.path.join(SETTINGS['profile'], f'{record["stage"]}.prof')
+            )
+    py_peak = record.pop('_py_peak')
+    if tracemalloc.is_tracing():
+        py_peak = max(py_peak, tracemalloc.get_traced_memory()[1])
+    if record in STACK:
+        STACK.remove(record)
+    if STACK:
+        STACK[-1]['_py_peak'] = max(STACK[-1]['_py_peak'], py_peak)
+
+    record.update({
+        'wall_s': round(wall, 4),
+        'cpu_s': round(cpu, 4),
+        'rss_peak_mb': rss_peak_mb(),
+        'py_peak_mb': (
+            round(py_peak / 2 ** 20, 1) if tracemalloc.is_tracing() else None
+            ),
+        'rows_out': (
+            rows_out if rows_out is None or isinstance(rows_out, int)
+            else n_rows(rows_out)
+            )
+        })
+    if SETTINGS['metrics']:
+        emit(record)
+
+
+def annotate(**fields):
+    '''
+    Se anaden campos a la medida de la etapa abierta mas interna, si se esta
+    midiendo alguna
+    '''
+    if STACK:
+        STACK[-1].update(fields)
+
+
+def next_stage(record, name, d_f=None):
+    '''
+    Se cierra la etapa record y se abre la siguiente. Las filas de salida de
+    una etapa son las de entrada de la siguiente
+    '''
+    end_stage(record, d_f)
+    return start_stage(name, d_f)
+
+
+@contextmanager
+def stage(name, d_f=None):
+    '''
+    Se mide el bloque de codigo contenido. Las filas de salida se pueden
+    indicar con record['rows_out'] = ...
+    '''
+    record = start_stage(name, d_f)
+    rows_out = {'rows_out': None} if record is None else record
+    try:
+        yield rows_out
+    finally:
+        end_stage(record, rows_out.get('rows_out'))
+
+
+def instrument(name):
+    '''
+    Decorador que mide una funcion completa. Las filas de entrada son las
+    del primer DataFrame recibido y las de salida las del resultado
+    '''
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return function(*args, **kwargs)
+            record = start_stage(
+                name,
+                n_rows(tuple(args) + tuple(kwargs.values()))
+                )
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                end_stage(record)
+                raise
+            end_stage(record, n_rows(result))
+            return result
+        return wrapper
+    return decorator
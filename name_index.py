@@ -0,0 +1,110 @@
+'''
+Programa utilizado para crear un indice de los nombres de games_complex, de
+forma que la aplicacion pueda buscar un titulo o autocompletarlo con una
+busqueda binaria, sin recorrer el fichero completo
+El indice es un fichero Arrow IPC con las claves de los nombres ordenadas y,
+para cada una, la fila del juego en games_complex. Se puede abrir como
+memory map, por lo que no hace falta cargarlo entero en memoria
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from storage import read_arrow, write_arrow
+
+# %%
+# Se definen las constantes
+
+# Bloques de marcas diacriticas que se eliminan tras la descomposicion NFKD
+COMBINING = (
+    '[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]'
+    )
+# Caracter mayor que cualquier otro, para acotar las busquedas por prefijo
+MAX_CHAR = '\U0010ffff'
+
+# %%
+# Se definen las funciones que crean el indice
+
+
+def name_keys(names):
+    '''
+    Se obtiene la clave de busqueda de cada nombre: sin acentos ni otras
+    marcas diacriticas, sin mayusculas (casefold) y sin espacios en los
+    extremos
+    '''
+    return (
+        pd.Series(names, dtype=object)
+        .astype(str)
+        .str.normalize('NFKD')
+        .str.replace(COMBINING, '', regex=True)
+        .str.casefold()
+        .str.strip()
+        )
+
+
+def build_index(names):
+    '''
+    Se crea el indice de una columna de nombres: las claves ordenadas y la
+    posicion de cada nombre en la columna. Los nombres nulos no se indexan,
+    pues no se pueden buscar
+    '''
+    names = pd.Series(names, dtype=object)
+    rows = np.flatnonzero(names.notna().to_numpy())
+    keys = name_keys(names.iloc[rows]).to_numpy(dtype=object)
+    order = np.argsort(keys, kind='stable')
+    return pa.table({
+        'key': pa.array(keys[order], type=pa.string()),
+        'row': pa.array(rows[order], type=pa.int32())
+        })
+
+
+def write_index(index, path):
+    '''
+    Se guarda el indice como fichero Arrow IPC sin comprimir
+    '''
+    write_arrow(index, path)
+
+
+def read_index(path):
+    '''
+    Se abre el indice. En disco local se usa un memory map, y en el resto de
+    almacenamientos se descarga el fichero
+    '''
+    return read_arrow(path)
+
+
+# %%
+# Se definen las funciones de busqueda
+
+
+def search(keys, value):
+    '''
+    Busqueda binaria de la primera posicion de keys cuyo valor no es menor
+    que value. Solo se leen log(n) claves del array
+    '''
+    low, high = 0, len(keys)
+    while low < high:
+        mid = (low + high) // 2
+        if keys[mid].as_py() < value:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def lookup(index, text, prefix=True, limit=10):
+    '''
+    Se obtienen las filas de games_complex cuyo nombre empieza por text, o
+    coincide con el si prefix es False, en el orden de sus claves. Con limit
+    igual a None se devuelven todas
+    '''
+    key = name_keys([text]).iloc[0]
+    keys = index.column('key')
+    start = search(keys, key)
+    end = search(keys, key + MAX_CHAR if prefix else key + '\0')
+    if limit is not None:
+        end = min(end, start + limit)
+    return index.column('row')[start:end].to_pylist()
@@ -0,0 +1,111 @@
+'''
+Programa utilizado para interpretar las columnas que contienen listas y
+diccionarios guardados como texto, de forma que cada columna se interprete una
+sola vez a lo largo de toda la ETL
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import ast
+import json
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from instrumentation import instrument
+
+# %%
+# Se definen las constantes
+
+# Valores que se tratan como nulos. Los contenedores vacios, '[]' y '{}',
+# se interpretan, ya que g_treatment los conserva como listas vacias
+NULL_VALUES = ['nan', 'None']
+
+# Columnas que se pueden interpretar nada mas cargar el dataset, pues no se
+# usan como claves de agrupacion durante la limpieza
+PARSED_COLS = [
+    'age_ratings', 'franchises', 'developer', 'publisher', 'RAWG_nreviews',
+    'advanced_devs', 'keywords'
+    ]
+
+CACHE_SIZE = 2 ** 16
+
+# %%
+# Se definen las funciones de interpretacion
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_text(text):
+    '''
+    Se interpreta un literal de Python. Si no tiene comillas dobles ni barras
+    invertidas, cambiar las comillas simples lo convierte en JSON, que se lee
+    mucho mas rapido. En cualquier otro caso se usa ast.literal_eval
+    '''
+    if '"' not in text and '\\' not in text:
+        try:
+            return json.loads(text.replace("'", '"'))
+        except ValueError:
+            pass
+    return ast.literal_eval(text)
+
+
+def literal(value):
+    '''
+    Se interpreta el valor si sigue siendo texto. Si ya se ha interpretado
+    previamente se devuelve tal cual
+    '''
+    if isinstance(value, str):
+        return parse_text(value)
+    return value
+
+
+def is_null(value):
+    '''
+    Equivalente a pd.isnull para valores que pueden ser listas o diccionarios
+    '''
+    if isinstance(value, (list, dict, tuple)):
+        return False
+    return pd.isnull(value)
+
+
+def is_empty(value):
+    '''
+    Indica si el valor es un contenedor vacio
+    '''
+    return isinstance(value, (list, dict, tuple)) and not value
+
+
+def empty_to_null(series):
+    '''
+    Se pasan a NaN los contenedores vacios de una columna interpretada, igual
+    que g_cleaner hace con '[]' y '{}' en las columnas de texto
+    '''
+    empty = np.fromiter(
+        (is_empty(value) for value in series), dtype=bool, count=len(series)
+        )
+    return series.mask(empty)
+
+
+def parse_column(series):
+    '''
+    Se interpreta una columna completa, leyendo una unica vez cada texto
+    distinto. Los nulos pasan a NaN. Las filas con el mismo texto comparten
+    el objeto, por lo que no deben modificarse
+    '''
+    codes, uniques = pd.factorize(series.where(~series.isin(NULL_VALUES)))
+    parsed = np.empty(len(uniques) + 1, dtype=object)
+    for pos, value in enumerate(uniques):
+        parsed[pos] = literal(value)
+    parsed[-1] = np.NaN
+    return pd.Series(parsed[codes], index=series.index, name=series.name)
+
+
+@instrument('parse_columns')
+def parse_columns(d_f, cols):
+    '''
+    Se interpretan las columnas dadas que existan en el DataFrame
+    '''
+    for col in cols:
+        if col in d_f:
+            d_f[col] = parse_column(d_f[col])
+    return d_f
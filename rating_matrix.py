@@ -0,0 +1,201 @@
+'''
+Programa utilizado para guardar las reviews limpias como una matriz dispersa
+CSR de usuarios por juegos con la nota de cada review, junto a los id de
+usuario y de juego de cada fila y columna
+Los arrays de la matriz se guardan en npy y los id en Arrow IPC, de forma que
+en disco local se puedan abrir como memory map sin copiar los datos
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import io
+import os
+import fsspec
+from fsspec.implementations.local import LocalFileSystem
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from scipy import sparse
+from schema import REVIEWS_DTYPES, apply_dtypes
+from storage import read_arrow, resolve, write_arrow
+
+# %%
+# Se definen los nombres de los ficheros
+MATRIX_FILES = ['indptr', 'indices', 'data']
+USERS_FILE = 'users.arrow'
+GAMES_FILE = 'games.arrow'
+RATING_COLS = ['id', 'user_id', 'game_id', 'review_rating']
+
+# %%
+# Se definen las funciones que construyen la matriz
+
+
+def track_reviews(partitions, folder):
+    '''
+    Se devuelven los ficheros de reviews tal cual, guardando en folder, en
+    disco local, las columnas necesarias para construir la matriz. Asi se
+    construye con los mismos ficheros que se exportan, sin volver a leerlos
+    ni acumularlos en memoria
+    '''
+    for number, (name, part) in enumerate(partitions):
+        if len(part):
+            part[RATING_COLS].reset_index(drop=True).to_feather(
+                os.path.join(folder, f'{number:07d}.feather')
+                )
+        yield name, part
+
+
+def rating_matrix(reviews_df):
+    '''
+    Se construye la matriz CSR de usuarios por juegos con la nota de cada
+    review. Usuarios y juegos se numeran segun el orden de sus id. Si un
+    usuario tiene varias reviews de un juego, se conserva la de mayor id
+    '''
+    reviews_df = (
+        reviews_df
+        .sort_values('id', kind='stable')
+        .drop_duplicates(['user_id', 'game_id'], keep='last')
+        )
+    user_codes, users = pd.factorize(reviews_df['user_id'], sort=True)
+    game_codes, games = pd.factorize(reviews_df['game_id'], sort=True)
+    matrix = sparse.csr_matrix(
+        (
+            reviews_df['review_rating'].to_numpy(np.int8),
+            (user_codes, game_codes)
+            ),
+        shape=(len(users), len(games))
+        )
+    return {
+        'matrix': matrix,
+        'users': np.asarray(users, dtype=object),
+        'games': np.asarray(games, dtype=object)
+        }
+
+
+def used_categories(column):
+    '''
+    Se obtienen las categorias que aparecen en una columna categorica
+    '''
+    return column.cat.remove_unused_categories().cat.categories
+
+
+def category_codes(column, categories):
+    '''
+    Se obtiene la posicion en categories del valor de cada fila, traduciendo
+    las categorias de la columna en lugar de buscar cada fila
+    '''
+    return categories.get_indexer(column.cat.categories)[column.cat.codes]
+
+
+def ratings_from_files(folder):
+    '''
+    Se construye la matriz a partir de los ficheros guardados con
+    track_reviews, leyendolos de uno en uno. En una primera pasada se
+    obtienen los usuarios, los juegos y el numero de reviews, y en la segunda
+    se rellenan arrays de ese tamano con los codigos de cada review, sin
+    unir los ficheros en un DataFrame
+    '''
+    paths = [
+        os.path.join(folder, name) for name in sorted(os.listdir(folder))
+        ]
+    if not paths:
+        return rating_matrix(pd.DataFrame(columns=RATING_COLS))
+
+    users, games, n_reviews = pd.Index([]), pd.Index([]), 0
+    for path in paths:
+        part = apply_dtypes(
+            pd.read_feather(path, columns=['user_id', 'game_id']),
+            REVIEWS_DTYPES
+            )
+        users = users.union(used_categories(part['user_id']))
+        games = games.union(used_categories(part['game_id']))
+        n_reviews += len(part)
+
+    ids = np.empty(n_reviews, dtype=np.int64)
+    rows = np.empty(n_reviews, dtype=np.int64)
+    cols = np.empty(n_reviews, dtype=np.int64)
+    data = np.empty(n_reviews, dtype=np.int8)
+    start = 0
+    for path in paths:
+        part = apply_dtypes(pd.read_feather(path), REVIEWS_DTYPES)
+        end = start + len(part)
+        ids[start:end] = part['id'].to_numpy()
+        rows[start:end] = category_codes(part['user_id'], users)
+        cols[start:end] = category_codes(part['game_id'], games)
+        data[start:end] = part['review_rating'].to_numpy(np.int8)
+        start = end
+
+    # Se ordena por usuario, juego e id, y de cada par usuario-juego se
+    # conserva la ultima review, la de mayor id
+    order = np.lexsort((ids, cols, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    last = np.ones(n_reviews, dtype=bool)
+    last[:-1] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    return {
+        'matrix': sparse.csr_matrix(
+            (data[last], (rows[last], cols[last])),
+            shape=(len(users), len(games))
+            ),
+        'users': np.asarray(users, dtype=object),
+        'games': np.asarray(games, dtype=object)
+        }
+
+
+# %%
+# Se definen las funciones de lectura y escritura
+
+
+def id_array(ids):
+    '''
+    Se pasan los id a un array de Arrow con el tipo de sus valores, de forma
+    que se puedan guardar id de texto o enteros. Sin id se usa texto
+    '''
+    if not len(ids):
+        return pa.array([], type=pa.string())
+    return pa.array(ids)
+
+
+def save_ratings(ratings, folder):
+    '''
+    Se guardan los arrays de la matriz CSR en npy y los id de usuarios y de
+    juegos en Arrow IPC
+    '''
+    for name in MATRIX_FILES:
+        with fsspec.open(f'{folder}{name}.npy', 'wb') as file:
+            np.save(file, getattr(ratings['matrix'], name))
+    for key, file_name in (('users', USERS_FILE), ('games', GAMES_FILE)):
+        write_arrow(
+            pa.table({'id': id_array(ratings[key])}),
+            f'{folder}{file_name}'
+            )
+
+
+def load_array(path):
+    '''
+    Se carga un array npy. En disco local se abre como memory map
+    '''
+    fs, fs_path = resolve(path)
+    if isinstance(fs, LocalFileSystem):
+        return np.load(fs_path, mmap_mode='r')
+    return np.load(io.BytesIO(fs.cat_file(fs_path)))
+
+
+def load_ratings(folder):
+    '''
+    Se carga la matriz guardada con save_ratings. Los id se devuelven como
+    arrays de Arrow
+    '''
+    users = read_arrow(f'{folder}{USERS_FILE}').column('id')
+    games = read_arrow(f'{folder}{GAMES_FILE}').column('id')
+    indptr, indices, data = [
+        load_array(f'{folder}{name}.npy') for name in MATRIX_FILES
+        ]
+    return {
+        'matrix': sparse.csr_matrix(
+            (data, indices, indptr), shape=(len(users), len(games)),
+            copy=False
+            ),
+        'users': users,
+        'games': games
+        }
@@ -0,0 +1,276 @@
+'''
+Programa utilizado para limpiar las reviews por partes, en dos pasadas sobre
+los ficheros originales, cuando el total de reviews no cabe en memoria
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from instrumentation import instrument, start_stage, end_stage
+from review_cleaner import (
+    MIN_GAME_REVIEWS, user_stats, valid_users, clean_games
+    )
+from review_exporter import (
+    N_REVIEWS, N_BUCKETS, id_name, game_name, game_buckets
+    )
+from schema import REVIEWS_DTYPES, USERS_DTYPES, apply_dtypes, concat_typed
+
+# %%
+# Se definen las funciones que acumulan las estadisticas
+
+
+def claim_ids(owner, ids, shard):
+    '''
+    Se asigna cada id aun sin asignar al fichero shard, en un array indexado
+    por id. Asi la segunda pasada conserva la misma copia de cada review
+    duplicada que la primera, la del primer fichero en el orden de la lista
+    Devuelve el array, ampliado si es necesario, y la mascara de las reviews
+    asignadas a este fichero
+    '''
+    if len(ids) and ids.max() >= len(owner):
+        size = max(int(ids.max()) + 1, 2 * len(owner))
+        owner = np.concatenate(
+            [owner, np.full(size - len(owner), -1, owner.dtype)]
+            )
+    first = ~pd.Series(ids).duplicated().to_numpy()
+    new = first & (owner[ids] < 0)
+    owner[ids[new]] = shard
+    return owner, new
+
+
+def add_stats(total, part, key):
+    '''
+    Se suman las cuentas de part a las acumuladas en total, agrupando por key
+    '''
+    part = part.assign(**{key: part[key].astype(object)}).set_index(key)
+    if total is None:
+        return part
+    return total.add(part, fill_value=0)
+
+
+# %%
+# Se definen las funciones que guardan y leen los ficheros intermedios
+
+
+def spill_buckets(reviews_df, mode, n_reviews, n_buckets):
+    '''
+    Fichero de salida al que pertenece cada review
+    '''
+    if mode == 'id':
+        return (reviews_df['id'].to_numpy() - 1) // n_reviews
+    if mode == 'game':
+        return game_buckets(reviews_df['game_id'], n_buckets)
+    raise ValueError(f'Division no soportada por partes: {mode}')
+
+
+def spill(reviews_df, buckets, folder, shard):
+    '''
+    Se guardan las reviews de un fichero original en disco local, en una
+    carpeta por cada fichero de salida
+    '''
+    for bucket in np.unique(buckets):
+        path = os.path.join(folder, f'{bucket:07d}')
+        os.makedirs(path, exist_ok=True)
+        (
+            reviews_df
+            .loc[buckets == bucket]
+            .reset_index(drop=True)
+            .to_feather(os.path.join(path, f'{shard:07d}.feather'))
+            )
+
+
+def read_bucket(folder, bucket, good_games):
+    '''
+    Se unen las partes guardadas de un fichero de salida, conservando las
+    reviews de juegos con suficientes reviews validas
+    '''
+    path = os.path.join(folder, f'{bucket:07d}')
+    if not os.path.isdir(path):
+        return None
+    reviews_df = concat_typed(
+        [
+            apply_dtypes(
+                pd.read_feather(os.path.join(path, name)), REVIEWS_DTYPES
+                )
+            for name in sorted(os.listdir(path))
+            ],
+        REVIEWS_DTYPES
+        )
+    reviews_df = (
+        reviews_df
+        .loc[reviews_df['game_id'].isin(good_games)]
+        .sort_values('id')
+        .reset_index(drop=True)
+        )
+    for col in reviews_df.select_dtypes('category'):
+        reviews_df[col] = reviews_df[col].cat.remove_unused_categories()
+    return reviews_df
+
+
+def spilled_partitions(folder, mode, n_spilled, good_games, n_reviews,
+                       n_buckets):
+    '''
+    Se generan los ficheros de salida de uno en uno a partir de las partes
+    guardadas, con los mismos nombres que partition_reviews. Al terminar se
+    borra la carpeta temporal
+    '''
+    try:
+        if mode == 'game':
+            for bucket in range(n_buckets):
+                reviews_df = read_bucket(folder, bucket, good_games)
+                if reviews_df is None:
+                    reviews_df = apply_dtypes(
+                        pd.DataFrame(columns=list(REVIEWS_DTYPES)),
+                        REVIEWS_DTYPES
+                        )
+                yield game_name(bucket, n_buckets), reviews_df
+            return
+
+        # Los rangos de id vacios se generan solo si hay reviews en un rango
+        # posterior, igual que en partition_by_id
+        empty = []
+        for bucket in range(n_spilled):
+            reviews_df = read_bucket(folder, bucket, good_games)
+            name = id_name(bucket * n_reviews + 1, (bucket + 1) * n_reviews)
+            if reviews_df is None or reviews_df.empty:
+                empty.append(name)
+                continue
+            for empty_name in empty:
+                yield empty_name, reviews_df.iloc[:0]
+            empty = []
+            yield name, reviews_df
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# %%
+# Se define la funcion de limpieza por partes
+
+
+@instrument('r_cleaner_chunked')
+def r_cleaner_chunked(games_df, shards, partition=None, spill_folder=None,
+                      user_rules=None):
+    '''
+    Se limpian las reviews y los juegos igual que en r_cleaner, pero sin
+    cargar nunca todas las reviews a la vez
+    shards es una funcion sin argumentos que devuelve un iterador de tuplas
+    (clave, reviews), y se llama una vez por pasada
+    En la primera pasada se acumulan las cuentas de cada usuario. En la
+    segunda se filtran las reviews contra los usuarios validos y los juegos
+    existentes, se acumulan las cuentas de cada juego y se guardan en disco
+    local agrupadas por fichero de salida. Los ficheros de salida se generan
+    al final de uno en uno
+    En memoria solo se mantienen un fichero de reviews, las cuentas por
+    usuario y por juego y un array de 4 bytes por id
+    user_rules son las reglas de valid_users, por defecto USER_RULES
+    '''
+    partition = dict(partition or dict())
+    mode = partition.pop('mode', 'id')
+    n_reviews = partition.pop('n_reviews', N_REVIEWS)
+    n_buckets = partition.pop('n_buckets', N_BUCKETS)
+    if mode not in ('id', 'game'):
+        raise ValueError(f'Division no soportada por partes: {mode}')
+
+    # Primera pasada: cuentas por usuario
+    print('Se obtienen los usuarios validos')
+    step = start_stage('r_cleaner_chunked.users')
+    owner = np.zeros(0, dtype=np.int32)
+    shard_codes = dict()
+    users_df = None
+    for key, shard in shards():
+        shard = apply_dtypes(shard, REVIEWS_DTYPES)
+        shard_codes[key] = len(shard_codes)
+        owner, new = claim_ids(
+            owner, shard['id'].to_numpy(), shard_codes[key]
+            )
+        users_df = add_stats(users_df, user_stats(shard.loc[new]), 'user_id')
+
+    if users_df is None:
+        users_df = user_stats(
+            apply_dtypes(pd.DataFrame(columns=list(REVIEWS_DTYPES)),
+                         REVIEWS_DTYPES)
+            )
+    else:
+        users_df = apply_dtypes(
+            users_df.sort_index().rename_axis('user_id').reset_index(),
+            USERS_DTYPES
+            )
+    users = pd.Index(valid_users(users_df, user_rules)['user_id'])
+    games = pd.Index(games_df['RAWG_link'].dropna().astype(object).unique())
+    end_stage(step, len(users))
+
+    # Segunda pasada: semi-cruces con usuarios y juegos, y cuentas por juego
+    print('Se limpian las reviews de juegos inexistentes')
+    step = start_stage('r_cleaner_chunked.reviews')
+    n_kept = 0
+    folder = tempfile.mkdtemp(prefix='reviews_', dir=spill_folder)
+    games_reviews_df = None
+    n_spilled = 0
+    for key, shard in shards():
+        shard = apply_dtypes(shard, REVIEWS_DTYPES)
+        ids = shard['id'].to_numpy()
+        keep = (
+            (owner[ids] == shard_codes[key])
+            & ~pd.Series(ids).duplicated().to_numpy()
+            & shard['user_id'].isin(users).to_numpy()
+            & shard['game_id'].isin(games).to_numpy()
+            )
+        shard = shard.loc[keep].reset_index(drop=True)
+        if shard.empty:
+            continue
+        n_kept += len(shard)
+        games_reviews_df = add_stats(
+            games_reviews_df,
+            # La suma se acumula en int64 para no desbordar el tipo int8
+            shard
+            .assign(review_rating=shard['review_rating'].astype(np.int64))
+            .groupby('game_id', as_index=False, observed=True)
+            ['review_rating']
+            .agg({'rating_sum': 'sum', 'RAWG_nreviews': 'count'}),
+            'game_id'
+            )
+        buckets = spill_buckets(shard, mode, n_reviews, n_buckets)
+        spill(shard, buckets, folder, shard_codes[key])
+        n_spilled = max(n_spilled, int(buckets.max()) + 1)
+
+    end_stage(step, n_kept)
+
+    # Se obtienen la nota media y el numero de reviews de cada juego
+    print('Se limpian los juegos sin un minimo de reviews validas')
+    if games_reviews_df is None:
+        games_reviews_df = pd.DataFrame(
+            columns=['rating_sum', 'RAWG_nreviews'],
+            index=pd.Index([], name='game_id')
+            )
+    games_reviews_df = (
+        games_reviews_df
+        .sort_index()
+        .rename_axis('game_id')
+        .reset_index()
+        .assign(
+            RAWG_rating=lambda df:
+            (df['rating_sum'] / df['RAWG_nreviews']).round(2),
+            RAWG_nreviews=lambda df: df['RAWG_nreviews'].astype(np.int64)
+            )
+        [['game_id', 'RAWG_rating', 'RAWG_nreviews']]
+        )
+    good_games = pd.Index(
+        games_reviews_df
+        .loc[games_reviews_df['RAWG_nreviews'] > MIN_GAME_REVIEWS, 'game_id']
+        )
+
+    print('Se obtiene el dataset limpio')
+    step = start_stage('r_cleaner_chunked.games', games_df)
+    games_df = clean_games(games_df, games_reviews_df)
+    end_stage(step, games_df)
+
+    print('Se obtienen las reviews limpias')
+    clean_reviews = spilled_partitions(
+        folder, mode, n_spilled, good_games, n_reviews, n_buckets
+        )
+    return games_df, clean_reviews
@@ -5,159 +5,258 @@ Programa utilizado para limpiar las reviews obtenidas de la pagina RAWG.io
 # %%
 # Se cargan las librerias necesarias
 
-from math import ceil
+import numpy as np
 import pandas as pd
+from instrumentation import (
+    annotate, instrument, start_stage, next_stage, end_stage
+    )
+from review_exporter import partition_reviews
+from schema import REVIEWS_DTYPES, apply_dtypes
 
 # %%
 # Se definen las constantes
 FOLDER = 'reviews/'
-N_REVIEWS = 50000
+RATINGS = [1, 3, 4, 5]
+MIN_REVIEWS = 4
+MIN_GAME_REVIEWS = 5
+
+# Reglas que debe cumplir un usuario para considerarse real, en orden. Cada
+# regla se evalua sobre los usuarios que cumplen las anteriores:
+# - min_count: al menos count reviews
+# - required: al menos una review con cada una de las notas dadas
+# - quantile_cap: el porcentaje de cada nota dada no supera su cuantil q
+# - entropy: la entropia de las notas, normalizada entre 0 y 1, esta entre
+#   min y max
+USER_RULES = [
+    {'rule': 'min_count', 'count': MIN_REVIEWS + 1},
+    {'rule': 'required', 'ratings': [4, 5]},
+    {'rule': 'quantile_cap', 'ratings': RATINGS, 'q': 0.99}
+    ]
 
 # %%
 # Se crea una función para dar un nombre único a cada juego
 
-def get_id(name, year, platforms, n_count, n_count_2):
+def unique_names(games_df):
     '''
-    Se crea un nombre único para los juegos con nombre repetido
+    Se crea un nombre único para los juegos con nombre repetido. Si el nombre
+    se repite entre distintos id se añade el año de salida y, si tambien se
+    repite el año, las plataformas. Devuelve una serie alineada con games_df
     '''
-    if n_count == 1:
-        return name
-    if n_count_2 > 1:
-        return f'{name} ({year}) - {(", ").join(platforms)}'
-    return f'{name} ({year})'
+    name = games_df['name'].astype(object)
+    n_count = name.map(name.loc[~games_df['id'].duplicated()].value_counts())
+    n_count_2 = (
+        games_df
+        .groupby(['name', 'first_release_date'])
+        ['id']
+        .transform('size')
+        )
+    with_year = (
+        name + ' (' + games_df['first_release_date'].astype(str) + ')'
+        )
+    return pd.Series(
+        np.select(
+            [n_count == 1, n_count_2 > 1],
+            [name, with_year + ' - ' + games_df['platforms'].str.join(', ')],
+            default=with_year
+            ),
+        index=games_df.index
+        )
+
 
 # %%
-# Se define la funcion que se usara para limpiar reviews y juegos
+# Se crean las funciones que obtienen las estadisticas de cada usuario
 
 
-def r_cleaner(games_df, reviews_df):
+def user_stats(reviews_df, ratings=None):
     '''
-    Se define la funcion utilizada para limpiar las reviews y los juegos
-    existentes
+    Se obtiene en una sola pasada el numero de reviews de cada usuario y
+    cuantas de ellas tienen cada una de las notas dadas, usando los codigos
+    de usuario en lugar de agrupar
     '''
+    ratings = RATINGS if ratings is None else ratings
+    codes, users = pd.factorize(reviews_df['user_id'], sort=True)
+    rating_codes = pd.Index(ratings).get_indexer(reviews_df['review_rating'])
+    valid = codes >= 0
+    n_users, n_ratings = len(users), len(ratings)
 
-    reviews_df['id'] = reviews_df['id'].astype(int)
-    reviews_df['review_rating'] = reviews_df['review_rating'].astype(int)
+    counts = np.bincount(
+        codes[valid & (rating_codes >= 0)] * n_ratings
+        + rating_codes[valid & (rating_codes >= 0)],
+        minlength=n_users * n_ratings
+        ).reshape(n_users, n_ratings)
 
-    # Se agrupan los usuarios segun la media de sus valoraciones, las reviews
-    # totales y el numero de reviews con cada nota distinta
-    # Permaneceran los usuarios con 5 o mas reviews y que tengan, como minimo,
-    # una valoracion con valor 4 y 5, ademas de despreciar aquellos usuarios
-    # que esten por encima del percentil 99 en uno de los cuatro valores
-    # posibles
+    users_df = pd.DataFrame(counts, columns=[str(rat) for rat in ratings])
+    users_df.insert(0, 'count', np.bincount(codes[valid], minlength=n_users))
+    users_df.insert(0, 'user_id', users)
+    return users_df
 
-    print('Se obtienen los usuarios validos')
-    users_df = (
-        reviews_df
-        .groupby('user_id', as_index=False)
-        ['review_rating']
-        .agg({
-            'count': 'count',
-            '1': lambda x: (x == 1).sum(),
-            '3': lambda x: (x == 3).sum(),
-            '4': lambda x: (x == 4).sum(),
-            '5': lambda x: (x == 5).sum()
-            })
-        .loc[lambda df: df['count'] > 4]
+
+def rating_shares(users_df, ratings=None):
+    '''
+    Se pasan las cuentas de cada nota a porcentaje sobre el total de reviews
+    de cada usuario. Por defecto se usan todas las notas de users_df
+    '''
+    rating_cols = (
+        rating_columns(users_df) if ratings is None
+        else [str(rat) for rat in ratings]
+        )
+    return pd.concat([
+        users_df[['user_id', 'count']],
+        users_df[rating_cols].div(users_df['count'], axis=0)
+        ],
+        axis=1
         )
 
-    users_df_per = (
-        pd.concat([
-            users_df[['user_id', 'count']],
-            users_df[['1', '3', '4', '5']].div(users_df['count'], axis=0)
-            ],
-            axis=1
-            )
+
+# %%
+# Se crean las funciones compartidas por la limpieza en memoria y por partes
+
+
+def rating_columns(users_df):
+    '''
+    Columnas de users_df con las cuentas de cada nota, que son las notas con
+    las que se creo en user_stats
+    '''
+    return [col for col in users_df if col not in ('user_id', 'count')]
+
+
+def select_shares(shares, ratings, columns):
+    '''
+    Porcentajes de las notas dadas, siendo columns las notas de cada columna
+    de shares. Las notas que no se han contado no tienen reviews, por lo que
+    su porcentaje es 0
+    '''
+    selected = np.zeros((len(shares), len(ratings)))
+    for pos, rat in enumerate(ratings):
+        if str(int(rat)) in columns:
+            selected[:, pos] = shares[:, columns.index(str(int(rat)))]
+    return selected
+
+
+def rule_min_count(counts, shares, alive, rule, columns):
+    '''
+    Usuarios con al menos rule['count'] reviews
+    '''
+    return counts >= rule['count']
+
+
+def rule_required(counts, shares, alive, rule, columns):
+    '''
+    Usuarios con al menos una review de cada nota de rule['ratings']
+    '''
+    return (select_shares(shares, rule['ratings'], columns) > 0).all(axis=1)
+
+
+def rule_quantile_cap(counts, shares, alive, rule, columns):
+    '''
+    Usuarios cuyo porcentaje de cada nota no supera el cuantil rule['q'] de
+    los usuarios que siguen siendo validos. Los cuantiles de todas las notas
+    se calculan en una sola llamada sobre la matriz de porcentajes
+    '''
+    if not alive.any():
+        return alive
+    selected = select_shares(shares, rule['ratings'], columns)
+    caps = np.quantile(selected[alive], rule['q'], axis=0)
+    return (selected <= caps).all(axis=1)
+
+
+def rule_entropy(counts, shares, alive, rule, columns):
+    '''
+    Usuarios cuya entropia de notas, dividida por la maxima posible, esta
+    entre rule['min'] y rule['max']. Descarta a quienes siempre dan la misma
+    nota o las reparten por igual
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = -np.where(shares > 0, shares * np.log(shares), 0).sum(axis=1)
+    entropy /= np.log(shares.shape[1])
+    return (entropy >= rule.get('min', 0)) & (entropy <= rule.get('max', 1))
+
+
+USER_RULE_FUNCTIONS = {
+    'min_count': rule_min_count,
+    'required': rule_required,
+    'quantile_cap': rule_quantile_cap,
+    'entropy': rule_entropy
+    }
+
+
+def user_filter(users_df, rules=None):
+    '''
+    Se obtiene la mascara de usuarios validos aplicando las reglas en orden
+    sobre la matriz de cuentas por nota, sin copiar el DataFrame en cada
+    regla. Las notas son las columnas de users_df, por lo que las reglas
+    funcionan con cualquier conjunto de notas de user_stats. Devuelve la
+    mascara y cuantos usuarios ha descartado cada regla
+    '''
+    rules = USER_RULES if rules is None else rules
+    counts = users_df['count'].to_numpy()
+    columns = rating_columns(users_df)
+    ratings = users_df[columns].to_numpy(np.float64)
+    shares = np.divide(
+        ratings, counts[:, None],
+        out=np.zeros_like(ratings), where=counts[:, None] > 0
         )
 
-    users_df = (
-        users_df_per
-        .loc[(users_df['4'] > 0) & (users_df['5'] > 0)]
-        .loc[lambda df:
-             (df['1'] <= df['1'].quantile(0.99)) &
-             (df['3'] <= df['3'].quantile(0.99)) &
-             (df['3'] <= df['4'].quantile(0.99)) &
-             (df['5'] <= df['5'].quantile(0.99))
-             ]
+    alive = np.ones(len(users_df), dtype=bool)
+    removed = dict()
+    for pos, rule in enumerate(rules):
+        mask = USER_RULE_FUNCTIONS[rule['rule']](
+            counts, shares, alive, rule, columns
             )
+        name = f'{pos}_{rule["rule"]}'
+        removed[name] = int((alive & ~mask).sum())
+        alive &= mask
+    return alive, removed
 
-    # Se limpian las reviews permaneciendo las de usuarios validos
-    reviews_df = reviews_df.merge(users_df[['user_id']], on='user_id')
 
-    # Se eliminan las reviews de juegos que no esten disponibles en el dataset
-    print('Se limpian las reviews de juegos inexistentes')
+def valid_users(users_df, rules=None):
+    '''
+    Se agrupan los usuarios segun la media de sus valoraciones, las reviews
+    totales y el numero de reviews con cada nota distinta
+    Permaneceran los usuarios que cumplan las reglas dadas, por defecto
+    USER_RULES: 5 o mas reviews, como minimo una valoracion con valor 4 y 5,
+    y no estar por encima del percentil 99 en ninguno de los cuatro valores
+    posibles
+    Los usuarios descartados por cada regla se muestran y se anaden a la
+    medida de la etapa
+    '''
+    alive, removed = user_filter(users_df, rules)
+    for name, n_users in removed.items():
+        print(f'Regla {name}: {n_users} usuarios descartados')
+    annotate(removed_users=removed)
+    return rating_shares(users_df.loc[alive])
 
-    reviews_df = (
-        reviews_df
-        .merge(
-            games_df[['RAWG_link']],
-            left_on='game_id',
-            right_on='RAWG_link'
-            )
-        .drop('RAWG_link', axis=1)
-        .drop_duplicates('id')
-        .sort_values('id')
-        .reset_index(drop=True)
-        )
 
-    # Se realiza la misma limpieza, pero con los juegos con review
-    print('Se limpian los juegos sin un minimo de reviews validas')
-    games_reviews_df = (
+def game_stats(reviews_df):
+    '''
+    Se obtienen la nota media y el numero de reviews validas de cada juego
+    '''
+    return (
         reviews_df
-        .groupby('game_id', as_index=False)
+        .groupby('game_id', as_index=False, observed=True)
         ['review_rating']
         .agg({
             'RAWG_rating': 'mean',
             'RAWG_nreviews': 'count'
             })
-        # .loc[lambda df: df['RAWG_nreviews'] > 5]
         .assign(RAWG_rating=lambda df: df['RAWG_rating'].round(2))
         )
 
-    # Se limpia el dataset usando los juegos con varias reviews
-    reviews_df = (
-        reviews_df
-        .merge(
-            games_reviews_df[['game_id']]
-            .loc[games_reviews_df['RAWG_nreviews'] > 5],
-            on='game_id'
-            )
-        .sort_values('id')
-        )
 
-    # Se obtiene un nombre unico para los juegos con nombres repetidos
-    game_count = games_df.drop_duplicates('id')['name'].value_counts()
-    games_df = (
-        games_df
-        .assign(
-            n_count=games_df['name'].map(lambda name: game_count[name])
-            )
-    )
+def clean_games(games_df, games_reviews_df):
+    '''
+    Se obtiene el dataset de juegos limpio con los nuevos datos de
+    RAWG_rating y RAWG_nreviews de games_reviews_df
+    '''
+    # Se obtiene un nombre unico para los juegos con nombres repetidos. Los
+    # juegos sin nombre o sin fecha de salida no se pueden identificar y se
+    # descartan
     games_df = (
         games_df
-        .merge(
-            games_df
-            .groupby(['name', 'first_release_date'])['id']
-            .count()
-            .reset_index()
-            .rename(columns={'id': 'n_count_2'}),
-            on=['name', 'first_release_date']
-            )
-        )
-    games_df['name'] = games_df.apply(
-        lambda game: get_id(
-            game['name'],
-            game['first_release_date'],
-            game['platforms'],
-            game['n_count'],
-            game['n_count_2']
-            ),
-        axis=1
+        .assign(name=unique_names(games_df))
+        .dropna(subset=['name', 'first_release_date'])
         )
-    games_df.drop(['n_count', 'n_count_2'], axis=1, inplace=True)
 
-    # Se obtienen los nuevos datos de RAWG_rating y RAWG_nreviews
-    print('Se obtiene el dataset limpio')
     games_df = (
         games_df.drop(['RAWG_rating', 'RAWG_nreviews'], axis=1)
         .merge(
@@ -173,31 +272,107 @@ def r_cleaner(games_df, reviews_df):
         .sort_values('name')
         )
     cols = games_df.columns.tolist()
-    games_df = games_df[
+    return games_df[
         cols[3::-1] + [cols[9]] + cols[4:9] + cols[-2:] +
         cols[10:-2]
         ]
 
-    # Se exportan las reviews
+
+# %%
+# Se define la funcion que se usara para limpiar reviews y juegos
+
+
+def sort_ids(reviews_df):
+    '''
+    Se ordenan las reviews por id y se descartan los id repetidos, quedando
+    la primera aparicion de cada uno. Los ficheros de reviews ya estan
+    ordenados por rangos de id, por lo que normalmente no hace falta ordenar
+    '''
+    if not reviews_df['id'].is_monotonic_increasing:
+        reviews_df = reviews_df.sort_values('id', kind='stable')
+    ids = reviews_df['id'].to_numpy()
+    repeated = np.zeros(len(ids), dtype=bool)
+    repeated[1:] = ids[1:] == ids[:-1]
+    if repeated.any():
+        reviews_df = reviews_df.loc[~repeated]
+    return reviews_df.reset_index(drop=True)
+
+
+def filter_reviews(games_df, reviews_df, users_df=None, user_rules=None):
+    '''
+    Se limpian las reviews y los juegos existentes, sin dividir las reviews
+    en ficheros. Devuelve el dataset de juegos y las reviews limpias,
+    ordenadas por id
+    Si se indica users_df, se usaran esas cuentas por usuario en lugar de
+    calcularlas de nuevo a partir de todas las reviews
+    user_rules son las reglas de valid_users, por defecto USER_RULES
+    '''
+
+    reviews_df = apply_dtypes(reviews_df, REVIEWS_DTYPES)
+
+    print('Se obtienen los usuarios validos')
+    step = start_stage('r_cleaner.users', reviews_df)
+    if users_df is None:
+        users_df = user_stats(reviews_df)
+    users_df = valid_users(users_df, user_rules)
+    end_stage(step, users_df)
+
+    # Se limpian las reviews permaneciendo las de usuarios validos y las de
+    # juegos disponibles en el dataset. Son semi-cruces: sobre columnas
+    # categoricas, isin comprueba cada categoria una sola vez y filtra por
+    # sus codigos, sin copiar las columnas como haria un merge
+    step = start_stage('r_cleaner.reviews', reviews_df)
+    print('Se limpian las reviews de juegos inexistentes')
+    reviews_df = reviews_df.loc[
+        reviews_df['user_id'].isin(users_df['user_id']).to_numpy()
+        & reviews_df['game_id'].isin(games_df['RAWG_link']).to_numpy()
+        ]
+    reviews_df = sort_ids(reviews_df)
+
+    # Se realiza la misma limpieza, pero con los juegos con review
+    print('Se limpian los juegos sin un minimo de reviews validas')
+    step = next_stage(step, 'r_cleaner.games_reviews', reviews_df)
+    games_reviews_df = game_stats(reviews_df)
+
+    # Se limpia el dataset usando los juegos con varias reviews. Al filtrar
+    # se mantiene el orden por id
+    reviews_df = reviews_df.loc[
+        reviews_df['game_id'].isin(
+            games_reviews_df['game_id']
+            .loc[games_reviews_df['RAWG_nreviews'] > MIN_GAME_REVIEWS]
+            ).to_numpy()
+        ]
+
+    end_stage(step, reviews_df)
+
+    print('Se obtiene el dataset limpio')
+    step = start_stage('r_cleaner.games', games_df)
+    games_df = clean_games(games_df, games_reviews_df)
+    end_stage(step, games_df)
+
+    return games_df, apply_dtypes(reviews_df, REVIEWS_DTYPES)
+
+
+@instrument('r_cleaner')
+def r_cleaner(games_df, reviews_df, users_df=None, partition=None,
+              user_rules=None):
+    '''
+    Se define la funcion utilizada para limpiar las reviews y los juegos
+    existentes
+    Si se indica users_df, se usaran esas cuentas por usuario en lugar de
+    calcularlas de nuevo a partir de todas las reviews
+    partition indica como se dividen las reviews limpias en ficheros, segun
+    los parametros de partition_reviews, y user_rules las reglas de
+    valid_users
+    '''
+    games_df, reviews_df = filter_reviews(
+        games_df, reviews_df, users_df, user_rules
+        )
+
+    # Se dividen las reviews en ficheros, que se generan segun se vayan
+    # exportando
     print('Se obtienen las reviews limpias')
-    clean_reviews = dict()
-    for top_name in list(range(
-            N_REVIEWS,
-            int(ceil(reviews_df['id'].max()/N_REVIEWS)*N_REVIEWS)+1,
-            N_REVIEWS
-            )):
-        low_name = top_name - (N_REVIEWS-1)
-        mini_reviews_df = (
-            reviews_df.loc[
-                (reviews_df['id'] >= low_name) & (reviews_df['id'] <= top_name)
-                ]
-            .drop_duplicates('id')
-            .sort_values('id')
-            .reset_index(drop=True)
-            )
-        clean_reviews[
-            f'reviews_clean_{low_name:07d}_{top_name:07d}.feather'
-            ] = mini_reviews_df
+    clean_reviews = partition_reviews(reviews_df, **(partition or dict()))
 
-    # Se devuelven los DataFrames de reviews y el dataset de juegos limpio
+    # Se devuelven los ficheros de reviews y el dataset de juegos limpio
     return games_df, clean_reviews
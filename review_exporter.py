@@ -0,0 +1,278 @@
+'''
+Programa utilizado para dividir las reviews limpias en ficheros y subirlos de
+forma concurrente
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import hashlib
+import fsspec
+from fsspec.implementations.local import LocalFileSystem
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from instrumentation import instrument
+from schema import arrow_table
+from storage import make_parent, resolve
+
+# %%
+# Se definen las constantes
+N_REVIEWS = 50000
+N_BUCKETS = 64
+TARGET_BYTES = 64 * 2 ** 20
+MAX_WORKERS = 16
+
+# Filas por grupo en los ficheros de Parquet. Cada grupo guarda el minimo y
+# el maximo de cada columna, de forma que los lectores pueden saltarse los
+# grupos que no cumplen un filtro
+ROW_GROUP = 10000
+# Orden de las filas dentro de cada fichero de Parquet
+DATASET_SORT = ['game_id', 'user_id', 'id']
+# Patron de los nombres de los ficheros de salida de cada formato
+FEATHER_PATTERN = 'reviews_clean_*.feather'
+DATASET_PATTERN = '*=*/part.parquet'
+
+# %%
+# Se definen las funciones que dividen las reviews
+
+
+def id_name(low, top):
+    '''
+    Nombre del fichero con las reviews entre los ids low y top
+    '''
+    return f'reviews_clean_{low:07d}_{top:07d}.feather'
+
+
+def game_name(bucket, n_buckets=N_BUCKETS):
+    '''
+    Nombre del fichero con las reviews de los juegos del grupo bucket
+    '''
+    return f'reviews_clean_g{bucket:03d}_{n_buckets:03d}.feather'
+
+
+def dataset_name(name):
+    '''
+    Ruta dentro del dataset de Parquet de las reviews del fichero name, con
+    la particion en formato hive: id_range=low_top o game_bucket=bucket
+    '''
+    key = name[len('reviews_clean_'):-len('.feather')]
+    if key.startswith('g'):
+        return f'game_bucket={key[1:].split("_")[0]}/part.parquet'
+    return f'id_range={key}/part.parquet'
+
+
+def game_buckets(game_ids, n_buckets=N_BUCKETS):
+    '''
+    Grupo al que pertenece cada juego segun el hash de su game_id
+    '''
+    return (
+        pd.util.hash_array(np.asarray(game_ids, dtype=object)) % n_buckets
+        ).astype(np.int64)
+
+
+def split_sorted(reviews_df, bounds, names):
+    '''
+    Dadas las reviews ordenadas, se devuelve cada tramo entre los
+    limites dados junto a su nombre
+    '''
+    for (start, end), name in zip(bounds, names):
+        part = reviews_df.iloc[start:end].reset_index(drop=True)
+        # Cada fichero solo guarda las categorias que utiliza
+        for col in part.select_dtypes('category'):
+            part[col] = part[col].cat.remove_unused_categories()
+        yield name, part
+
+
+def partition_by_id(reviews_df, n_reviews=N_REVIEWS):
+    '''
+    Se divide por rangos de n_reviews ids, incluyendo los rangos vacios para
+    que sobreescriban ficheros antiguos
+    '''
+    ids = reviews_df['id'].to_numpy()
+    tops = np.arange(
+        n_reviews, int(np.ceil(ids[-1] / n_reviews) * n_reviews) + 1,
+        n_reviews
+        )
+    lows = tops - (n_reviews - 1)
+    bounds = zip(
+        np.searchsorted(ids, lows, 'left'),
+        np.searchsorted(ids, tops, 'right')
+        )
+    names = [id_name(low, top) for low, top in zip(lows, tops)]
+    return split_sorted(reviews_df, bounds, names)
+
+
+def partition_by_game(reviews_df, n_buckets=N_BUCKETS):
+    '''
+    Se divide segun el hash del game_id, de forma que todas las reviews de un
+    juego esten en el mismo fichero
+    '''
+    buckets = game_buckets(reviews_df['game_id'], n_buckets)
+    order = np.lexsort((reviews_df['id'].to_numpy(), buckets))
+    reviews_df = reviews_df.iloc[order]
+    buckets = buckets[order]
+    edges = np.searchsorted(buckets, np.arange(n_buckets + 1))
+    names = [game_name(bucket, n_buckets) for bucket in range(n_buckets)]
+    return split_sorted(reviews_df, zip(edges[:-1], edges[1:]), names)
+
+
+def partition_by_size(reviews_df, target_bytes=TARGET_BYTES):
+    '''
+    Se divide en ficheros con un tamano en memoria cercano a target_bytes,
+    nombrados segun el primer y ultimo id que contienen
+    '''
+    ids = reviews_df['id'].to_numpy()
+    row_bytes = (
+        reviews_df.memory_usage(deep=True, index=False).sum() / len(ids)
+        )
+    n_rows = max(1, int(target_bytes // row_bytes))
+    starts = np.arange(0, len(ids), n_rows)
+    ends = np.minimum(starts + n_rows, len(ids))
+    names = [
+        id_name(ids[start], ids[end - 1]) for start, end in zip(starts, ends)
+        ]
+    return split_sorted(reviews_df, zip(starts, ends), names)
+
+
+PARTITIONS = {
+    'id': partition_by_id,
+    'game': partition_by_game,
+    'size': partition_by_size
+    }
+
+
+def partition_reviews(reviews_df, mode='id', **kwargs):
+    '''
+    Se ordenan las reviews por id una unica vez y se devuelven, segun se
+    piden, los ficheros en los que se dividen
+    '''
+    if reviews_df.empty:
+        return iter([])
+    if not reviews_df['id'].is_monotonic_increasing:
+        reviews_df = reviews_df.sort_values('id')
+    return PARTITIONS[mode](reviews_df, **kwargs)
+
+
+# %%
+# Se definen las funciones de escritura
+
+
+def output_digest(d_f):
+    '''
+    Se obtiene una huella del contenido de un fichero de salida
+    '''
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(d_f, index=False).to_numpy().tobytes()
+        ).hexdigest()
+
+
+def write_atomic(d_f, path):
+    '''
+    Se escribe primero en un fichero temporal y despues se renombra, de forma
+    que nunca se pueda leer un fichero a medio escribir
+    '''
+    fs, fs_path = fsspec.core.url_to_fs(make_parent(path))
+    d_f.to_feather(f'{path}.tmp', compression='lz4')
+    fs.mv(f'{fs_path}.tmp', fs_path)
+
+
+def write_parquet(d_f, path, row_group=ROW_GROUP, sort=DATASET_SORT):
+    '''
+    Se escribe en Parquet con los tipos nativos de cada columna, ordenando
+    las filas por las columnas de sort para que las estadisticas de cada
+    grupo de filas sean lo mas estrechas posible. Con sort igual a None se
+    conserva el orden de las filas. Igual que en write_atomic, se escribe
+    primero en un fichero temporal
+    '''
+    fs, fs_path = fsspec.core.url_to_fs(make_parent(path))
+    # Las categorias estan ordenadas, por lo que ordenar por sus codigos es
+    # ordenar por su texto
+    if sort:
+        d_f = d_f.sort_values(
+            [col for col in sort if col in d_f], kind='stable'
+            )
+    with fs.open(f'{fs_path}.tmp', 'wb') as file:
+        pq.write_table(
+            arrow_table(d_f), file, row_group_size=row_group,
+            compression='zstd', write_statistics=True
+            )
+    fs.mv(f'{fs_path}.tmp', fs_path)
+
+
+def remove_stale(folder, pattern, keep):
+    '''
+    Se eliminan de folder los ficheros de salida que siguen pattern y no
+    estan en keep, como los de una ejecucion anterior cuyo nombre ya no se
+    genera. Devuelve sus nombres
+    '''
+    fs, path = resolve(folder)
+    path = path.rstrip('/')
+    removed = []
+    for file in sorted(fs.glob(f'{path}/{pattern}')):
+        name = file[len(path):].lstrip('/')
+        if name in keep:
+            continue
+        fs.rm(file)
+        # En local se elimina tambien la carpeta de la particion, si queda
+        # vacia
+        if '/' in name and isinstance(fs, LocalFileSystem):
+            try:
+                fs.rmdir(fs._parent(file))
+            except OSError:
+                pass
+        removed.append(name)
+    return removed
+
+
+@instrument('export_reviews')
+def export_reviews(partitions, folder, digests=None, max_workers=MAX_WORKERS,
+                   dataset_folder=None):
+    '''
+    Se suben los ficheros de forma concurrente, con como maximo el doble de
+    escrituras pendientes que hilos. Si se dan las huellas de la ejecucion
+    anterior, solo se suben los ficheros que hayan cambiado
+    Si se da dataset_folder, cada fichero se escribe ademas en Parquet dentro
+    de un dataset particionado en formato hive. Con folder igual a None solo
+    se escribe el dataset
+    Al terminar se eliminan los ficheros de salida que no se han generado en
+    esta ejecucion, para que no queden reviews duplicadas
+    Devuelve las huellas de todos los ficheros y los nombres de los subidos
+    '''
+    digests = dict() if digests is None else digests
+    new_digests, written = dict(), []
+    outputs, patterns = [], []
+    if folder is not None:
+        outputs.append((lambda name: name, write_atomic, folder))
+        patterns.append((folder, FEATHER_PATTERN))
+    if dataset_folder is not None:
+        outputs.append((dataset_name, write_parquet, dataset_folder))
+        patterns.append((dataset_folder, DATASET_PATTERN))
+    # Arrow carga su integracion con pandas la primera vez que la usa, y esa
+    # carga no es segura entre hilos, por lo que se hace antes de lanzarlos
+    arrow_table(pd.DataFrame({'id': [0]}))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for name, review in partitions:
+            digest = output_digest(review)
+            for get_name, writer, out_folder in outputs:
+                out_name = get_name(name)
+                new_digests[out_name] = digest
+                if digests.get(out_name) == digest:
+                    continue
+                if len(pending) >= 2 * max_workers:
+                    done, pending = wait(
+                        pending, return_when=FIRST_COMPLETED
+                        )
+                    for future in done:
+                        future.result()
+                pending.add(
+                    executor.submit(writer, review, f'{out_folder}{out_name}')
+                    )
+                written.append(out_name)
+        for future in wait(pending).done:
+            future.result()
+    for out_folder, pattern in patterns:
+        remove_stale(out_folder, pattern, new_digests)
+    return new_digests, written
@@ -0,0 +1,93 @@
+'''
+Programa utilizado para cargar de forma concurrente las reviews almacenadas
+en S3
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import numpy as np
+import pandas as pd
+from instrumentation import instrument
+from review_chunked import claim_ids
+from schema import REVIEWS_DTYPES, apply_dtypes, concat_typed
+
+# %%
+# Se definen las constantes
+REVIEW_COLS = ['id', 'user_id', 'game_id', 'review_rating']
+MAX_WORKERS = 16
+
+# %%
+# Se definen las funciones de lectura
+
+
+def read_shard(path, columns):
+    '''
+    Se lee un fichero de reviews, devolviendo tambien el tiempo empleado
+    '''
+    start = perf_counter()
+    shard = pd.read_feather(path, columns=columns)
+    return shard, perf_counter() - start
+
+
+def iter_reviews(bucket_s3, files, columns=None, max_workers=MAX_WORKERS):
+    '''
+    Se leen los ficheros de reviews de forma concurrente y se devuelven en el
+    orden de la lista, de forma que el resultado no dependa de cual termine
+    antes. Como maximo habra el doble de lecturas pendientes que hilos, para
+    no acumular en memoria ficheros sin procesar
+    files es una lista de tuplas (clave, bytes)
+    '''
+    files = deque(files)
+    max_pending = 2 * max_workers
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        while files or pending:
+            while files and len(pending) < max_pending:
+                key, size = files.popleft()
+                future = executor.submit(
+                    read_shard, f'{bucket_s3}/{key}', columns
+                    )
+                pending.append((future, key, size))
+            future, key, size = pending.popleft()
+            shard, elapsed = future.result()
+            print(
+                f'{key}: {len(shard)} reviews, {size} bytes, '
+                f'{elapsed:.2f} s'
+                )
+            yield key, shard
+
+
+@instrument('load_reviews')
+def load_reviews(bucket_s3, files, columns=REVIEW_COLS,
+                 max_workers=MAX_WORKERS):
+    '''
+    Se cargan todas las reviews, eliminando los duplicados segun llega cada
+    fichero en lugar de hacerlo sobre el conjunto completo. Como los ficheros
+    llegan en el orden de la lista, se conserva la primera copia de cada id,
+    la misma que asigna claim_ids en el modo por partes. Cada fichero se
+    convierte a sus tipos finales antes de unirlo al resto
+    '''
+    files = list(files)
+    start = perf_counter()
+    # Array indexado por id en el que se marcan los ya cargados. Basta con un
+    # byte por id, pues todos se asignan al mismo fichero, el 0
+    seen = np.zeros(0, dtype=np.int8)
+    reviews_list = []
+    for _, shard in iter_reviews(bucket_s3, files, columns, max_workers):
+        shard = apply_dtypes(shard, REVIEWS_DTYPES)
+        seen, new = claim_ids(seen, shard['id'].to_numpy(), 0)
+        if not new.all():
+            shard = shard.loc[new]
+        reviews_list.append(shard)
+
+    print(
+        f'{len(files)} ficheros, {sum(size for _, size in files)} bytes, '
+        f'{perf_counter() - start:.2f} s'
+        )
+    if not reviews_list:
+        return apply_dtypes(pd.DataFrame(columns=columns), REVIEWS_DTYPES)
+    return concat_typed(reviews_list, REVIEWS_DTYPES)
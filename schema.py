@@ -0,0 +1,112 @@
+'''
+Programa utilizado para definir el tipo de dato de cada columna a lo largo de
+la ETL, de cara a reducir la memoria utilizada y a que los cruces se realicen
+sobre codigos enteros en lugar de texto
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+import pyarrow as pa
+
+# %%
+# Se definen los tipos de cada conjunto de datos
+
+REVIEWS_DTYPES = {
+    'id': 'int32',
+    'user_id': 'category',
+    'game_id': 'category',
+    'review_rating': 'int8'
+    }
+
+USERS_DTYPES = {
+    'count': 'int32',
+    '1': 'int32',
+    '3': 'int32',
+    '4': 'int32',
+    '5': 'int32'
+    }
+
+# Las columnas de listas y diccionarios se mantienen como objetos, y el ano de
+# salida como float, pues forma parte del nombre unico de cada juego
+GAMES_DTYPES = {
+    'id': 'int32',
+    'name': 'string',
+    'RAWG_link': 'category',
+    'genres': 'category',
+    'themes': 'category',
+    'OC_equal_name': 'category',
+    'HLTB_equal_name': 'category'
+    }
+
+# %%
+# Se definen las funciones que aplican los tipos
+
+
+def apply_dtypes(d_f, dtypes):
+    '''
+    Se aplican a las columnas existentes los tipos dados, sin copiar las que
+    ya lo tengan
+    '''
+    for col, dtype in dtypes.items():
+        if col in d_f and d_f[col].dtype != dtype:
+            d_f[col] = d_f[col].astype(dtype)
+    return d_f
+
+
+def concat_typed(frames, dtypes):
+    '''
+    Se unen varios DataFrames ya tipados. Las categoricas se unen sobre sus
+    codigos con union_categoricals, en lugar de pasar por texto
+    '''
+    frames = [frame.reset_index(drop=True) for frame in frames]
+    cat_cols = [
+        col for col, dtype in dtypes.items()
+        if dtype == 'category' and col in frames[0]
+        ]
+    joined = pd.concat(
+        [frame.drop(cat_cols, axis=1) for frame in frames],
+        ignore_index=True
+        )
+    for col in cat_cols:
+        joined[col] = pd.Series(
+            union_categoricals(
+                [frame[col] for frame in frames], sort_categories=True
+                )
+            )
+    return joined[frames[0].columns]
+
+
+def feather_frame(d_f):
+    '''
+    Se prepara un DataFrame para guardarlo en feather: solo las columnas de
+    objetos (listas, diccionarios, fechas) pasan a texto, y el resto conserva
+    su tipo
+    '''
+    d_f = d_f.reset_index(drop=True)
+    for col in d_f:
+        if d_f[col].dtype == object:
+            d_f[col] = d_f[col].astype(str)
+    return d_f
+
+
+def arrow_table(d_f):
+    '''
+    Se convierte un DataFrame a una tabla de Arrow conservando los tipos
+    nativos de cada columna: listas, diccionarios, enteros, reales, fechas y
+    categoricas. Las columnas de objetos que Arrow no puede tipar, por mezclar
+    valores de distinto tipo, pasan a texto igual que en feather_frame
+    '''
+    d_f = d_f.reset_index(drop=True)
+    arrays = []
+    for pos in range(d_f.shape[1]):
+        column = d_f.iloc[:, pos]
+        try:
+            arrays.append(pa.array(column, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.array(column.astype(str)))
+    return pa.Table.from_arrays(
+        arrays, names=[str(col) for col in d_f.columns]
+        )
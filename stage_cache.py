@@ -0,0 +1,133 @@
+'''
+Programa utilizado para guardar en disco local el resultado de cada etapa de
+la ETL, de forma que al repetir una ejecucion solo se recalculen las etapas
+cuyas entradas, parametros o codigo hayan cambiado
+Cada resultado se guarda bajo una clave calculada a partir de la huella de
+sus entradas, que para las etapas intermedias es la clave de la etapa
+anterior. Cuando la cache supera su tamano maximo se eliminan los resultados
+usados hace mas tiempo
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+
+# %%
+# Se definen las constantes
+
+CACHE_FOLDER = os.path.join(os.path.expanduser('~'), '.cache', 'vra_cleaner')
+MAX_BYTES = 20 * 2 ** 30
+EXTENSION = '.pkl'
+
+# %%
+# Se definen las funciones que calculan las claves
+
+
+def code_version(*functions):
+    '''
+    Huella del codigo fuente de los modulos que definen las funciones dadas.
+    Cualquier cambio en ellos, incluidas sus constantes, invalida los
+    resultados guardados
+    '''
+    modules = {inspect.getmodule(function) for function in functions}
+    digest = hashlib.sha1()
+    for module in sorted(modules, key=lambda module: module.__name__):
+        digest.update(inspect.getsource(module).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_key(stage, inputs, params=None, code=''):
+    '''
+    Clave de una etapa: huella de sus entradas, de sus parametros y de la
+    version de su codigo
+    '''
+    content = json.dumps(
+        {'stage': stage, 'inputs': inputs, 'params': params, 'code': code},
+        sort_keys=True, default=str
+        )
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+# %%
+# Se definen las funciones de lectura y escritura
+
+
+def entry_path(folder, stage, key):
+    '''
+    Fichero en el que se guarda el resultado de una etapa
+    '''
+    return os.path.join(folder, f'{stage}-{key}{EXTENSION}')
+
+
+def load(folder, stage, key):
+    '''
+    Se lee el resultado guardado de una etapa. Se actualiza su fecha de
+    modificacion, que indica cuando se uso por ultima vez
+    Devuelve None si no existe
+    '''
+    path = entry_path(folder, stage, key)
+    try:
+        with open(path, 'rb') as file:
+            value = pickle.load(file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+    os.utime(path)
+    return value
+
+
+def store(folder, stage, key, value, max_bytes=MAX_BYTES):
+    '''
+    Se guarda el resultado de una etapa, escribiendo primero un fichero
+    temporal, y se aplica el tamano maximo de la cache
+    '''
+    os.makedirs(folder, exist_ok=True)
+    path = entry_path(folder, stage, key)
+    with open(f'{path}.tmp', 'wb') as file:
+        pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f'{path}.tmp', path)
+    evict(folder, max_bytes)
+
+
+def evict(folder, max_bytes=MAX_BYTES):
+    '''
+    Se eliminan los resultados usados hace mas tiempo hasta que la cache
+    ocupe como maximo max_bytes
+    '''
+    entries = []
+    with os.scandir(folder) as scan:
+        for entry in scan:
+            if entry.name.endswith(EXTENSION):
+                info = entry.stat()
+                entries.append((info.st_mtime, info.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+
+
+def cached(settings, stage, key, function, *args, **kwargs):
+    '''
+    Se devuelve el resultado guardado de la etapa o, si no existe, se
+    ejecuta function y se guarda su resultado. settings es un diccionario con
+    la carpeta de la cache (folder) y su tamano maximo (max_bytes). Si es
+    None, la etapa se ejecuta siempre
+    '''
+    if settings is None:
+        return function(*args, **kwargs)
+    value = load(settings['folder'], stage, key)
+    if value is not None:
+        print(f'Etapa {stage} recuperada de la cache')
+        return value
+    value = function(*args, **kwargs)
+    store(
+        settings['folder'], stage, key, value,
+        settings.get('max_bytes', MAX_BYTES)
+        )
+    return value
@@ -0,0 +1,137 @@
+'''
+Programa utilizado para acceder al almacenamiento de la ETL a traves de
+fsspec, de forma que el mismo proceso pueda trabajar sobre un bucket de S3,
+una carpeta local o un sistema de ficheros en memoria
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import os
+import fsspec
+from fsspec.implementations.local import LocalFileSystem
+import pyarrow as pa
+
+# %%
+# Se definen las constantes
+
+# Protocolo de fsspec de cada tipo de almacenamiento
+BACKENDS = {
+    's3': 's3',
+    'local': 'file',
+    'memory': 'memory'
+    }
+
+# %%
+# Se definen las funciones de acceso
+
+
+def storage_root(backend='s3', root=''):
+    '''
+    Se obtiene la url raiz del almacenamiento. Para S3 root es el nombre del
+    bucket, con o sin s3://, y para local una carpeta
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f'Almacenamiento no soportado: {backend}')
+    root = root.split('://')[-1].rstrip('/')
+    if backend == 'local':
+        return os.path.abspath(root or '.')
+    return f'{BACKENDS[backend]}://{root}'
+
+
+def resolve(url):
+    '''
+    Se obtiene el sistema de ficheros de una url y la ruta dentro de el
+    '''
+    return fsspec.core.url_to_fs(url)
+
+
+def make_parent(url):
+    '''
+    Se crea la carpeta que contendra el fichero url. En S3 no existen las
+    carpetas, pero en local hay que crearlas antes de escribir
+    '''
+    fs, path = resolve(url)
+    if isinstance(fs, LocalFileSystem):
+        fs.makedirs(fs._parent(path), exist_ok=True)
+    return url
+
+
+def fingerprint(info):
+    '''
+    Huella de un fichero: su ETag en S3 o, si no lo hay, su tamano y fecha
+    de modificacion
+    '''
+    etag = info.get('ETag') or info.get('etag')
+    if etag:
+        return etag
+    modified = info.get('mtime', info.get('LastModified', info.get('created')))
+    return f'{info["size"]}-{modified}'
+
+
+def file_fingerprint(url):
+    '''
+    Huella de un unico fichero
+    '''
+    fs, path = resolve(url)
+    return fingerprint(fs.info(path))
+
+
+def list_files(root, prefix):
+    '''
+    Se listan los ficheros bajo prefix, devolviendo tuplas (clave, bytes,
+    huella) con las claves relativas a root
+    '''
+    fs, path = resolve(root)
+    path = path.rstrip('/')
+    try:
+        entries = fs.find(f'{path}/{prefix}', detail=True)
+    except FileNotFoundError:
+        return []
+    files = []
+    for name, info in sorted(entries.items()):
+        key = name[len(path):].lstrip('/')
+        if info.get('type') == 'directory' or len(key) <= len(prefix):
+            continue
+        files.append((key, info['size'], fingerprint(info)))
+    return files
+
+
+def copy_files(source, target, prefixes):
+    '''
+    Se copian los ficheros bajo prefixes de un almacenamiento a otro, por
+    ejemplo para trabajar sobre una copia local de S3
+    '''
+    source_fs, source_path = resolve(source)
+    target_fs, target_path = resolve(target)
+    for prefix in prefixes:
+        for key, _, _ in list_files(source, prefix):
+            target_file = f'{target_path.rstrip("/")}/{key}'
+            target_fs.makedirs(os.path.dirname(target_file), exist_ok=True)
+            with source_fs.open(f'{source_path.rstrip("/")}/{key}') as src, \
+                    target_fs.open(target_file, 'wb') as dst:
+                while chunk := src.read(2 ** 24):
+                    dst.write(chunk)
+
+
+def write_arrow(table, url):
+    '''
+    Se guarda una tabla como fichero Arrow IPC sin comprimir, de forma que se
+    pueda abrir como memory map
+    '''
+    with fsspec.open(make_parent(url), 'wb') as file:
+        with pa.ipc.new_file(file, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_arrow(url):
+    '''
+    Se lee un fichero Arrow IPC. En disco local se abre como memory map, sin
+    copiar los datos, y en el resto de almacenamientos se descarga
+    '''
+    fs, path = resolve(url)
+    if isinstance(fs, LocalFileSystem):
+        source = pa.memory_map(path)
+    else:
+        source = pa.py_buffer(fs.cat_file(path))
+    return pa.ipc.open_file(source).read_all()
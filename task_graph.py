@@ -0,0 +1,344 @@
+'''
+Programa utilizado para ejecutar en paralelo, en un pool de procesos, los
+pasos de la limpieza que trabajan sobre columnas independientes
+Cada paso declara las columnas que lee y las que escribe. Los pasos que no
+dependen de otros pendientes se ejecutan a la vez. Las columnas de tipos
+primitivos, de texto y de listas de texto se envian a los procesos en
+formato Arrow a traves de memoria compartida. El resto de columnas de
+objetos, como las de diccionarios o las que tienen nulos, se serializan con
+pickle
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+import pickle
+import pyarrow as pa
+import pandas as pd
+
+# %%
+# Se definen las constantes
+
+# Por defecto los pasos se ejecutan en el propio proceso
+MAX_WORKERS = 1
+
+# %%
+# Se definen las funciones de intercambio de datos entre procesos
+
+
+def write_ipc(table, buf):
+    '''
+    Se escribe una tabla de Arrow en el buffer dado. Las vistas sobre el
+    buffer se liberan al salir, de forma que despues se pueda cerrar
+    '''
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(buf))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+
+
+def list_values(array):
+    '''
+    Se pasa un array list<string> de Arrow a listas de Python, convirtiendo
+    todos los textos a la vez y cortandolos segun los offsets
+    '''
+    array = array.combine_chunks()
+    values = array.flatten().to_pylist()
+    offsets = array.offsets.to_numpy()
+    offsets = (offsets - offsets[0]).tolist()
+    return [
+        values[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+
+
+def read_ipc(buf, size, converted=()):
+    '''
+    Se lee la tabla de Arrow del buffer dado y se copia a un DataFrame, para
+    no mantener vistas sobre el buffer. converted son las columnas de objetos
+    que guardo to_shared, como tuplas (campo, columna); las de listas se
+    devuelven como listas de Python
+    '''
+    with pa.ipc.open_stream(pa.py_buffer(buf)[:size]) as reader:
+        table = reader.read_all()
+    fields = [field for field, _ in converted]
+    d_f = table.drop(fields).to_pandas().copy()
+    for field, col in converted:
+        array = table[field]
+        if pa.types.is_list(array.type):
+            d_f[col] = pd.Series(list_values(array), index=d_f.index)
+        else:
+            d_f[col] = pd.Series(
+                array.to_numpy(zero_copy_only=False), index=d_f.index
+                )
+    return d_f
+
+
+def arrow_column(series):
+    '''
+    Se convierte a Arrow una columna de objetos si todos sus valores son
+    texto o listas de texto, sin nulos, pues solo entonces se recupera tal
+    cual. En otro caso devuelve None y la columna se envia con pickle
+    '''
+    if series.empty or not isinstance(series.iloc[0], (str, list)):
+        return None
+    try:
+        array = pa.array(series, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+    if array.null_count:
+        return None
+    if pa.types.is_string(array.type):
+        return array
+    # Arrow tambien acepta tuplas y arrays como listas, pero se recuperarian
+    # como listas
+    if (pa.types.is_list(array.type)
+            and pa.types.is_string(array.type.value_type)
+            and not array.flatten().null_count
+            and all(type(value) is list for value in series)):
+        return array
+    return None
+
+
+def to_shared(d_f):
+    '''
+    Se guardan en un bloque de memoria compartida, en formato Arrow, las
+    columnas primitivas de d_f y las de objetos que arrow_column puede
+    convertir. El resto de columnas de objetos se guardan con pickle
+    Devuelve una referencia que se puede enviar a otro proceso
+    '''
+    converted = dict()
+    for col in d_f:
+        if d_f[col].dtype == object:
+            array = arrow_column(d_f[col])
+            if array is not None:
+                converted[col] = array
+    object_cols = [
+        col for col in d_f
+        if d_f[col].dtype == object and col not in converted
+        ]
+    arrow_cols = [
+        col for col in d_f if col not in object_cols and col not in converted
+        ]
+    # Las columnas convertidas se guardan con un nombre de campo propio, ya
+    # que los nombres de las columnas pueden no ser texto
+    ref = {
+        'columns': d_f.columns.tolist(),
+        'objects': pickle.dumps(d_f[object_cols], protocol=5),
+        'converted': [
+            (f'__object_{pos}__', col) for pos, col in enumerate(converted)
+            ],
+        'shared': None
+        }
+    if not arrow_cols and not converted:
+        return ref
+    table = pa.Table.from_pandas(d_f[arrow_cols], preserve_index=True)
+    for field, col in ref['converted']:
+        table = table.append_column(field, converted[col])
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    block = shared_memory.SharedMemory(create=True, size=max(1, mock.size()))
+    try:
+        write_ipc(table, block.buf)
+    except BaseException:
+        # Si falla la escritura nadie recibira la referencia, por lo que el
+        # bloque se libera aqui
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    ref['shared'] = (block.name, mock.size())
+    return ref
+
+
+def from_shared(ref, unlink=False):
+    '''
+    Se reconstruye el DataFrame guardado con to_shared. Si unlink es True se
+    libera el bloque de memoria compartida tras leerlo
+    '''
+    d_f = pickle.loads(ref['objects'])
+    if ref['shared'] is not None:
+        name, size = ref['shared']
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            arrow_df = read_ipc(block.buf, size, ref['converted'])
+        finally:
+            block.close()
+            if unlink:
+                block.unlink()
+        d_f = pd.concat([arrow_df, d_f], axis=1)
+    return d_f[ref['columns']]
+
+
+def release(ref):
+    '''
+    Se libera el bloque de memoria compartida de una referencia
+    '''
+    if ref['shared'] is not None:
+        block = shared_memory.SharedMemory(name=ref['shared'][0])
+        try:
+            block.close()
+        finally:
+            block.unlink()
+
+
+def run_remote(function, ref, kwargs):
+    '''
+    Se ejecuta un paso en un proceso del pool. Si el resultado es una Series
+    o un DataFrame se devuelve tambien a traves de memoria compartida
+    '''
+    result = function(from_shared(ref), **kwargs)
+    if isinstance(result, pd.Series):
+        return 'series', to_shared(result.to_frame())
+    if isinstance(result, pd.DataFrame):
+        return 'frame', to_shared(result)
+    return 'value', result
+
+
+def read_remote(kind, value):
+    '''
+    Se recupera en el proceso principal el resultado de run_remote
+    '''
+    if kind == 'series':
+        return from_shared(value, unlink=True).iloc[:, 0]
+    if kind == 'frame':
+        return from_shared(value, unlink=True)
+    return value
+
+
+def discard_remote(kind, value):
+    '''
+    Se libera el resultado de run_remote sin leerlo
+    '''
+    if kind in ('series', 'frame'):
+        release(value)
+
+
+# %%
+# Se definen las funciones del grafo de pasos
+
+
+def task(name, function, inputs, outputs=None, **kwargs):
+    '''
+    Se declara un paso: function recibe un DataFrame con las columnas inputs
+    y los argumentos kwargs. Su resultado se guarda en las columnas outputs,
+    o se devuelve tal cual si no se indican
+    '''
+    return {
+        'name': name,
+        'function': function,
+        'inputs': list(inputs),
+        'outputs': list(outputs or []),
+        'kwargs': kwargs
+        }
+
+
+def dependencies(tasks):
+    '''
+    Se obtienen, para cada paso, los pasos anteriores de los que depende:
+    los que escriben columnas que lee o escribe, y los que leen columnas que
+    escribe
+    '''
+    deps = []
+    for pos, current in enumerate(tasks):
+        reads, writes = set(current['inputs']), set(current['outputs'])
+        deps.append({
+            prev for prev in range(pos)
+            if set(tasks[prev]['outputs']) & (reads | writes)
+            or set(tasks[prev]['inputs']) & writes
+            })
+    return deps
+
+
+def apply_result(d_f, current, result):
+    '''
+    Se guarda el resultado de un paso en sus columnas de salida
+    '''
+    if not current['outputs']:
+        return
+    if len(current['outputs']) == 1:
+        d_f[current['outputs'][0]] = result
+    else:
+        # Con varias salidas el resultado es un DataFrame con una columna por
+        # salida, en el mismo orden
+        for pos, col in enumerate(current['outputs']):
+            d_f[col] = result.iloc[:, pos]
+
+
+@contextmanager
+def task_pool(max_workers=MAX_WORKERS):
+    '''
+    Se crea el pool de procesos en el que run_tasks ejecuta los pasos, de
+    forma que se pueda reutilizar en varias llamadas. Con max_workers igual a
+    1 no se crea pool y se devuelve None
+    '''
+    if max_workers is None or max_workers <= 1:
+        yield None
+        return
+    # Los procesos del pool deben compartir el registro de bloques de memoria
+    # compartida del proceso principal, para que no los den por perdidos
+    resource_tracker.ensure_running()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield executor
+
+
+def run_tasks(d_f, tasks, executor=None):
+    '''
+    Se ejecutan los pasos sobre d_f, que se modifica con las columnas de
+    salida. Los resultados se aplican en el orden en que se declararon los
+    pasos, de forma que las columnas nuevas quedan siempre en la misma
+    posicion. Devuelve un diccionario con el resultado de cada paso
+    Los pasos se ejecutan en executor, creado con task_pool. Si es None se
+    ejecutan en este proceso
+    '''
+    results = dict()
+    if executor is None or len(tasks) <= 1:
+        for current in tasks:
+            results[current['name']] = current['function'](
+                d_f[current['inputs']], **current['kwargs']
+                )
+            apply_result(d_f, current, results[current['name']])
+        return results
+
+    deps = dependencies(tasks)
+    done, started = [], set()
+    applied = 0
+    pending = dict()
+    try:
+        while applied < len(tasks):
+            # Se lanzan los pasos cuyas dependencias ya estan aplicadas
+            for pos, current in enumerate(tasks):
+                if (pos in done or pos in started
+                        or any(dep >= applied for dep in deps[pos])):
+                    continue
+                ref = to_shared(d_f[current['inputs']])
+                future = executor.submit(
+                    run_remote, current['function'], ref, current['kwargs']
+                    )
+                pending[future] = (pos, ref)
+                started.add(pos)
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                pos, ref = pending.pop(future)
+                release(ref)
+                results[tasks[pos]['name']] = read_remote(*future.result())
+                done.append(pos)
+            # Se aplican en orden los resultados disponibles
+            while applied < len(tasks) and applied in done:
+                current = tasks[applied]
+                apply_result(d_f, current, results[current['name']])
+                applied += 1
+    finally:
+        # Si un paso falla, se cancelan los pendientes y se espera a los que
+        # estan en marcha para liberar sus bloques y los de sus resultados
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        for future, (pos, ref) in pending.items():
+            release(ref)
+            if not future.cancelled() and future.exception() is None:
+                discard_remote(*future.result())
+    return results
@@ -0,0 +1,9 @@
+'''
+Configuracion de las pruebas: los modulos de la ETL estan en la raiz del
+repositorio, por lo que se anade al path
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
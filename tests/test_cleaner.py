@@ -0,0 +1,133 @@
+'''
+Prueba de humo de la ETL completa sobre datos sinteticos, en disco local y
+en memoria
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from benchmarks.synthetic import games, review_shards
+from cleaner import (
+    CLEAN_FOLDER, COMPLEX_NAME, COMPLEX_PARQUET_NAME, INDEX_NAME,
+    NEW_FILE_NAME, NEW_PARQUET_NAME, RATINGS_FOLDER, main, read_settings
+    )
+from name_index import read_index
+from rating_matrix import load_ratings
+from storage import copy_files, list_files, storage_root
+
+# %%
+# Se definen las constantes
+
+N_GAMES = 300
+N_REVIEWS = 30000
+SHARD_SIZE = 12000
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def write_mirror(folder):
+    '''
+    Se escriben los juegos y las reviews con la estructura del bucket
+    '''
+    os.makedirs(os.path.join(folder, 'dataset'))
+    os.makedirs(os.path.join(folder, 'reviews'))
+    games(N_GAMES).to_feather(os.path.join(folder, 'dataset', 'games.feather'))
+    for number, shard in enumerate(
+            review_shards(N_REVIEWS, N_GAMES, SHARD_SIZE)):
+        shard.to_feather(
+            os.path.join(folder, 'reviews', f'reviews_{number:05d}.feather')
+            )
+
+
+def settings(tmp_path, backend, root, **etl):
+    '''
+    Se obtiene la configuracion con read_settings a partir de un fichero
+    '''
+    path = tmp_path / f'settings_{len(os.listdir(tmp_path))}.toml'
+    lines = ['[STORAGE]', f'backend = {backend}', f'root = {root}', '[ETL]']
+    lines += [f'{key} = {value}' for key, value in etl.items()]
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    return read_settings(str(path))
+
+
+def clean_reviews(root):
+    '''
+    Se leen todas las reviews limpias, ordenadas por id
+    '''
+    return (
+        pd.concat([
+            pd.read_feather(f'{root}/{key}')
+            for key, _, _ in list_files(root, CLEAN_FOLDER)
+            ])
+        .astype(str)
+        .sort_values('id')
+        .reset_index(drop=True)
+        )
+
+
+@pytest.fixture(scope='module')
+def mirror(tmp_path_factory):
+    '''
+    Copia sintetica del bucket, compartida por las pruebas
+    '''
+    folder = tmp_path_factory.mktemp('mirror')
+    write_mirror(str(folder))
+    return folder
+
+
+# %%
+# Se definen las pruebas
+
+
+def test_main_local(mirror, tmp_path):
+    root = storage_root('local', str(tmp_path / 'bucket'))
+    copy_files(str(mirror), root, ['dataset/', 'reviews/'])
+    main(settings(
+        tmp_path, 'local', root, formats='feather,parquet', ratings='true'
+        ))
+
+    clean_df = pd.read_feather(f'{root}/{NEW_FILE_NAME}')
+    complex_df = pd.read_feather(f'{root}/{COMPLEX_NAME}')
+    assert len(clean_df) and len(complex_df)
+    assert not complex_df.columns.duplicated().any()
+    for name, parquet in (
+            (NEW_FILE_NAME, NEW_PARQUET_NAME),
+            (COMPLEX_NAME, COMPLEX_PARQUET_NAME)):
+        assert (
+            pq.read_table(f'{root}/{parquet}').column('name').to_pylist()
+            == pd.read_feather(f'{root}/{name}')['name'].tolist()
+            )
+
+    reviews_df = clean_reviews(root)
+    assert len(reviews_df)
+    ratings = load_ratings(f'{root}/{RATINGS_FOLDER}')
+    assert 0 < ratings['matrix'].nnz <= len(reviews_df)
+    assert read_index(f'{root}/{INDEX_NAME}').num_rows == len(complex_df)
+
+
+def test_main_modes_agree(mirror, tmp_path):
+    outputs = []
+    for etl in ({}, {'chunked': 'true'}, {'incremental': 'true'}):
+        root = storage_root('local', str(tmp_path / f'bucket_{len(outputs)}'))
+        copy_files(str(mirror), root, ['dataset/', 'reviews/'])
+        main(settings(tmp_path, 'local', root, **etl))
+        outputs.append((
+            pd.read_feather(f'{root}/{NEW_FILE_NAME}'), clean_reviews(root)
+            ))
+    for clean_df, reviews_df in outputs[1:]:
+        pd.testing.assert_frame_equal(clean_df, outputs[0][0])
+        pd.testing.assert_frame_equal(reviews_df, outputs[0][1])
+
+
+def test_main_memory(mirror, tmp_path):
+    root = storage_root('memory', f'vra_{os.getpid()}_{tmp_path.name}')
+    copy_files(str(mirror), root, ['dataset/', 'reviews/'])
+    main(settings(tmp_path, 'memory', root))
+    clean_df = pd.read_feather(f'{root}/{NEW_FILE_NAME}')
+    assert len(clean_df)
+    assert len(clean_reviews(root))
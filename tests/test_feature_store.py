@@ -0,0 +1,53 @@
+'''
+Pruebas del almacen de variables one_hot
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import numpy as np
+import pytest
+from scipy import sparse
+from feature_store import align_features, load_features, save_features
+
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def features():
+    '''
+    Variables de tres juegos con un unico grupo de columnas
+    '''
+    return {
+        'id': np.array([10, 20, 30]),
+        'matrix': {
+            'genres': sparse.csr_matrix(
+                np.array([[1, 0], [0, 1], [1, 1]], dtype=np.int8)
+                )
+            },
+        'vocabulary': {'genres': ['Action', 'RPG']}
+        }
+
+
+# %%
+# Se definen las pruebas
+
+
+def test_align_features_reorders_rows(tmp_path):
+    aligned = align_features(features(), [30, 10])
+    assert aligned['id'].tolist() == [30, 10]
+    assert aligned['matrix']['genres'].toarray().tolist() == [[1, 1], [1, 0]]
+
+    save_features(aligned, f'{tmp_path}/')
+    loaded = load_features(f'{tmp_path}/')
+    assert loaded['id'].tolist() == [30, 10]
+    assert loaded['vocabulary'] == aligned['vocabulary']
+    assert (
+        loaded['matrix']['genres'] != aligned['matrix']['genres']
+        ).nnz == 0
+
+
+def test_align_features_missing_id():
+    with pytest.raises(ValueError, match='40'):
+        align_features(features(), [10, 40])
@@ -0,0 +1,260 @@
+'''
+Pruebas de las funciones de games_cleaner
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import numpy as np
+import pandas as pd
+import pytest
+from games_cleaner import (
+    fill_mean, fill_mode, get_top, keyword_explosion, keyword_index,
+    prune_top
+    )
+
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def old_keyword_explosion(d_f, fixed_col):
+    '''
+    Implementacion anterior a los tipos compactos, sobre columnas object
+    '''
+    return (
+        d_f[fixed_col + ['keywords']]
+        .explode('keywords')
+        .dropna()
+        .value_counts()
+        .reset_index()
+        .rename(columns={0: 'count'})
+        )
+
+
+def old_merge(value_col, genres, themes, genre_theme_df, genre_df, default):
+    '''
+    Implementacion anterior de merge_mean y merge_mode, que buscaba el valor
+    de cada fila filtrando los DataFrames de cada nivel
+    '''
+    if not pd.isnull(value_col):
+        return value_col
+    sp_df = genre_theme_df.loc[
+        (genre_theme_df['genres'] == genres) &
+        (genre_theme_df['themes'] == themes)
+        ]
+    if len(sp_df) == 1:
+        return sp_df.iloc[0, -1]
+    sp_df = genre_df.loc[genre_df['genres'] == genres]
+    if len(sp_df) == 1:
+        return sp_df.iloc[0, -1]
+    return default
+
+
+def old_fill(d_f, col, levels, default):
+    '''
+    Implementacion anterior de fill_mean y fill_mode, fila a fila
+    '''
+    return d_f.apply(
+        lambda x: old_merge(
+            x[col], x['genres'], x['themes'], *levels, default
+            ),
+        axis=1
+        )
+
+
+def old_fill_mode(d_f, col):
+    '''
+    Implementacion anterior de fill_mode
+    '''
+    levels = [
+        d_f
+        .groupby(fixed_col + [col])
+        [col]
+        .agg(['count', 'max'])
+        .sort_values(fixed_col + ['count'])
+        .reset_index()
+        .drop_duplicates(fixed_col)
+        .drop(['count', 'max'], axis=1)
+        for fixed_col in [['genres', 'themes'], ['genres']]
+        ]
+    return old_fill(d_f, col, levels, d_f[col].value_counts().index[0])
+
+
+def old_fill_mean(d_f, col, roundng=True):
+    '''
+    Implementacion anterior de fill_mean
+    '''
+    levels = [
+        round(
+            d_f.groupby(fixed_col, as_index=False)[col].mean(),
+            0 if roundng else 2
+            ).dropna()
+        for fixed_col in [['genres', 'themes'], ['genres']]
+        ]
+    if roundng:
+        mean = int(d_f[col].mean())
+    else:
+        mean = round(d_f[col].mean(), 2)
+    return old_fill(d_f, col, levels, mean)
+
+
+def games_with_gaps(seed=0):
+    '''
+    Juegos con nulos que se rellenan en cada nivel: por genero y tema, solo
+    por genero cuando la pareja no tiene valores, y con el valor global
+    cuando tampoco los tiene el genero o este es nulo
+    '''
+    rng = np.random.default_rng(seed)
+    n_games = 300
+    games_df = pd.DataFrame({
+        'genres': rng.choice(['Action', 'RPG', 'Puzzle', 'Indie', None],
+                             n_games),
+        'themes': rng.choice(['Fantasy', 'Horror', 'Comedy', None], n_games),
+        'duration': rng.uniform(1, 80, n_games).round(2),
+        'rating': rng.integers(40, 100, n_games).astype(float),
+        'modes': rng.choice(['Single', 'Multi', 'Coop'], n_games)
+        })
+    empty = (
+        (games_df['genres'] == 'Indie')
+        | ((games_df['genres'] == 'RPG') & (games_df['themes'] == 'Horror'))
+        | (rng.random(n_games) < 0.3)
+        )
+    games_df.loc[empty, ['duration', 'rating', 'modes']] = np.NaN
+    return games_df
+
+
+def old_get_top(d_f, col, topx, min_games):
+    '''
+    Implementacion anterior de get_top, explotando la columna
+    '''
+    return (
+        d_f
+        .explode(col)
+        .groupby(col, as_index=False)
+        ['OC_rating']
+        .agg(['max', 'count'])
+        .reset_index()
+        .loc[lambda df: df['count'] > min_games]
+        .sort_values(['max', 'count'], ascending=False)
+        .iloc[:topx, 0]
+        .tolist()
+        )
+
+
+def old_prune_top(d_f, col, topx, min_games):
+    '''
+    Implementacion anterior de la poda del top, con isin sobre la columna
+    explotada y volviendo a unir por id. Los juegos sin valores del top
+    quedaban nulos y despues pasaban a lista vacia
+    '''
+    pruned = (
+        d_f
+        .drop(col, axis=1)
+        .merge(
+            d_f
+            .explode(col)
+            .loc[lambda df: df[col].isin(
+                old_get_top(d_f, col, topx, min_games)
+                )]
+            .groupby('id', as_index=False)
+            [col]
+            .agg(lambda x: x.tolist()),
+            on='id',
+            how='left'
+            )
+        )
+    return pruned[col].map(lambda x: x if isinstance(x, list) else [])
+
+
+def games_with_top(seed=0):
+    '''
+    Juegos con listas de valores, algunas vacias, con empates en OC_rating y
+    valores justo en el limite de min_games
+    '''
+    rng = np.random.default_rng(seed)
+    n_games = 150
+    values = [f'dev_{i:02d}' for i in range(30)]
+    return pd.DataFrame({
+        'id': np.arange(n_games),
+        'developer': [
+            list(rng.choice(values, rng.integers(0, 4), replace=False))
+            for _ in range(n_games)
+            ],
+        # Pocas notas distintas para que haya empates en el maximo
+        'OC_rating': rng.choice([60.0, 70.0, 80.0, 85.0, np.NaN], n_games)
+        })
+
+
+def games_with_ties():
+    '''
+    Juegos con muchas keywords empatadas en numero de apariciones, dentro de
+    cada grupo y entre grupos
+    '''
+    keywords = [f'key_{i:02d}' for i in range(40)]
+    genres = ['Action', 'RPG', 'Puzzle', None]
+    themes = ['Fantasy', 'Horror', None]
+    rows = []
+    for i in range(120):
+        rows.append({
+            'genres': genres[i % len(genres)],
+            'themes': themes[i % len(themes)],
+            'keywords': [keywords[(i * 7 + j) % 40] for j in range(i % 5)]
+            })
+    return pd.DataFrame(rows)
+
+
+# %%
+# Se definen las pruebas
+
+
+def test_keyword_explosion_keeps_tie_order():
+    games_df = games_with_ties()
+    typed_df = games_df.astype({'genres': 'category', 'themes': 'category'})
+    for cols in [['genres', 'themes'], ['genres'], []]:
+        expected = old_keyword_explosion(games_df, cols)
+        result = keyword_explosion(typed_df, cols)
+        pd.testing.assert_frame_equal(
+            result.astype({col: object for col in cols}), expected
+            )
+
+
+def test_keyword_index_matches_old_counts():
+    games_df = games_with_ties()
+    typed_df = games_df.astype({'genres': 'category', 'themes': 'category'})
+    for cols in [['genres', 'themes'], ['genres'], []]:
+        expected = keyword_index([old_keyword_explosion(games_df, cols)])
+        assert keyword_index([keyword_explosion(typed_df, cols)]) == expected
+
+
+@pytest.mark.parametrize('typed', [False, True])
+def test_fill_matches_old_merge(typed):
+    games_df = games_with_gaps()
+    typed_df = (
+        games_df.astype({'genres': 'category', 'themes': 'category'})
+        if typed else games_df.copy()
+        )
+    cases = [
+        (fill_mean, old_fill_mean, 'rating', {}),
+        (fill_mean, old_fill_mean, 'duration', {'roundng': False}),
+        (fill_mode, old_fill_mode, 'modes', {})
+        ]
+    for function, old_function, col, kwargs in cases:
+        expected = old_function(games_df, col, **kwargs)
+        result = function(typed_df, col, **kwargs)
+        assert result.isna().sum() == 0
+        assert result.tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize(
+    'topx, min_games', [(5, 4), (12, 7), (40, 5), (40, 0)]
+    )
+def test_prune_top_matches_old_isin(topx, min_games):
+    games_df = games_with_top()
+    col = 'developer'
+    expected = old_get_top(games_df, col, topx, min_games)
+    assert get_top(games_df, col, topx, min_games) == expected
+    result = prune_top(games_df, col, topx, min_games)
+    assert result.index.equals(games_df.index)
+    expected = old_prune_top(games_df, col, topx, min_games)
+    assert result.tolist() == expected.tolist()
@@ -0,0 +1,193 @@
+'''
+Pruebas de las funciones de games_treatment
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import ast
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import games
+from games_cleaner import g_cleaner
+from games_loader import (
+    cleaner_columns, complex_columns, games_columns, load_games,
+    nested_columns
+    )
+from games_treatment import (
+    DEV_TYPE, NAME_TYPE, dev_kernel, g_treatment, get_dev_function,
+    get_from_dict, name_kernel, nested_column
+    )
+from parsers import PARSED_COLS, literal, parse_columns
+
+# %%
+# Se definen las constantes
+
+N_GAMES = 300
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def old_get_from_dict(value):
+    '''
+    Implementacion anterior de get_from_dict
+    '''
+    if value == []:
+        return []
+    return [field['name'] for field in value]
+
+
+def old_get_dev_function(value):
+    '''
+    Implementacion anterior de get_dev_function
+    '''
+    if value == []:
+        return []
+    return [
+        f"{field['Name']}: {', '.join(field['Position'])}"
+        if 'Position' in field.keys() else field['Name']
+        for field in value
+        ]
+
+
+def old_g_treatment(clean_df, games_df):
+    '''
+    Implementacion anterior, sobre el dataset original con las columnas como
+    texto
+    '''
+    games_df['id'] = games_df['id'].astype(int)
+    cols = games_df.columns.tolist()
+    fused_df = (
+        clean_df[
+            ['id', 'name', 'platforms', 'series'] +
+            clean_df.columns.tolist()[5:10]
+            ]
+        .merge(
+            games_df.loc[games_df['RAWG_equal_name'] == 'True'][
+                [cols[0]] + cols[2:5] + cols[7:10] + [cols[11]] + cols[26:30:2]
+                + [cols[49]]
+                ],
+            on='id',
+            suffixes=('', '_')
+            )
+        .drop('id', axis=1)
+        .drop_duplicates('name')
+        .replace(['nan'], np.NaN)
+        )
+    fused_df['first_release_date'] = (
+        pd.to_datetime(fused_df['first_release_date']).dt.date
+        )
+    fused_df.drop(
+        [col for col in fused_df.columns if col.endswith('_')],
+        axis=1,
+        inplace=True
+        )
+
+    fused_df[fused_df.columns.tolist()[9:12] + ['themes']] = (
+        fused_df[fused_df.columns.tolist()[9:12] + ['themes']].fillna('[]')
+        )
+    for col in fused_df.columns[15:]:
+        fused_df[col] = fused_df[col].fillna('[]').map(ast.literal_eval)
+
+    for col in fused_df.columns[15:-1]:
+        fused_df[col] = fused_df[col].map(get_from_dict)
+    fused_df['devs'] = fused_df['advanced_devs'].map(get_dev_function)
+    fused_df.drop('advanced_devs', axis=1, inplace=True)
+    cols = fused_df.columns.tolist()
+    return fused_df[
+        ['name', 'first_release_date'] + cols[1:8] + cols[9:11] +
+        [cols[13]] + cols[11:13] + cols[14:]
+        ]
+
+
+def games_with_empty_lists(path):
+    '''
+    Se guarda un dataset sintetico con listas vacias y nulos en las columnas
+    que se interpretan
+    '''
+    games_df = games(N_GAMES)
+    rows = games_df.index
+    games_df.loc[rows % 5 == 0, 'keywords'] = '[]'
+    games_df.loc[rows % 11 == 0, 'keywords'] = 'nan'
+    games_df.loc[rows % 6 == 0, 'game_engines'] = '[]'
+    games_df.loc[rows % 7 == 0, 'advanced_devs'] = '[]'
+    games_df.to_feather(path)
+    return games_df
+
+
+# Valores que la implementacion anterior ya aceptaba, con claves que no se
+# usan, y valores nulos o sin la clave buscada, con lo que fallaba
+NAMES = [
+    [], [{'id': 1, 'name': 'Unreal'}],
+    [{'name': 'Unity', 'slug': 'unity'}, {'name': 'Godot'}]
+    ]
+NAMES_EXTRA = [None, [{'id': 2}], [{'name': 'Source'}, {'slug': 'gold'}]]
+DEVS = [
+    [], [{'Name': 'Ana'}],
+    [{'Name': 'Luis', 'Position': ['Design', 'Code'], 'Id': 3},
+     {'Name': 'Eva', 'Position': []}]
+    ]
+DEVS_EXTRA = [
+    None, [{'Position': ['Art']}], [{'Name': 'Sam', 'Position': None}]
+    ]
+
+# %%
+# Se definen las pruebas
+
+
+def test_kernels_match_fallback_and_old_functions():
+    for values, kernel, arrow_type, fallback, old in [
+            (NAMES, name_kernel, NAME_TYPE, get_from_dict, old_get_from_dict),
+            (DEVS, dev_kernel, DEV_TYPE, get_dev_function,
+             old_get_dev_function)]:
+        series = pd.Series(values, dtype=object)
+        expected = [old(value) for value in values]
+        assert series.map(fallback).tolist() == expected
+        result = nested_column(series, kernel, arrow_type, fallback)
+        assert result.tolist() == expected
+
+
+def test_kernels_match_fallback_with_nulls_and_missing_keys():
+    for values, kernel, arrow_type, fallback in [
+            (NAMES + NAMES_EXTRA, name_kernel, NAME_TYPE, get_from_dict),
+            (DEVS + DEVS_EXTRA, dev_kernel, DEV_TYPE, get_dev_function)]:
+        series = pd.Series(values, dtype=object)
+        expected = series.map(fallback).tolist()
+        result = nested_column(series, kernel, arrow_type, fallback)
+        assert result.tolist() == expected
+        # Con un NaN, que Arrow no acepta, se usa fallback en toda la columna
+        with_nan = pd.Series(values + [np.NaN], dtype=object)
+        result = nested_column(with_nan, kernel, arrow_type, fallback)
+        assert result.tolist() == expected + [[]]
+    assert get_from_dict(None) == [] and get_from_dict([{'id': 2}]) == [None]
+    assert get_dev_function([{'Position': ['Art']}]) == [None]
+    assert get_dev_function([{'Name': 'Sam', 'Position': None}]) == ['Sam']
+
+
+def test_g_treatment_matches_old_with_empty_lists(tmp_path):
+    path = str(tmp_path / 'games.feather')
+    raw_df = games_with_empty_lists(path)
+    names = games_columns(path)
+    clean_cols, complex_cols = cleaner_columns(names), complex_columns(names)
+    games_df = parse_columns(
+        load_games(
+            path,
+            columns=[col for col in names if col in clean_cols + complex_cols]
+            ),
+        PARSED_COLS + [
+            col for col in nested_columns(names) if col not in PARSED_COLS
+            ]
+        )
+    clean_df, _ = g_cleaner(games_df[clean_cols])
+
+    _, complex_df = g_treatment(clean_df.copy(), games_df[complex_cols])
+    expected = old_g_treatment(clean_df.copy(), raw_df).sort_index()
+
+    assert complex_df.columns.tolist() == expected.columns.tolist()
+    # Antes keywords se devolvia como texto, y ahora interpretada
+    expected['keywords'] = expected['keywords'].map(literal)
+    assert (complex_df['keywords'].map(lambda value: value == [])).any()
+    pd.testing.assert_frame_equal(
+        complex_df.astype(str), expected.astype(str)
+        )
@@ -0,0 +1,103 @@
+'''
+Pruebas del estado incremental de las reviews
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import pandas as pd
+from incremental import SHARD_COL, STATE_DTYPES, update_state
+from schema import apply_dtypes
+
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def shard(key, ids, users, ratings):
+    '''
+    Reviews de un fichero, como las devuelve load_shards
+    '''
+    return apply_dtypes(
+        pd.DataFrame({
+            'id': ids,
+            'user_id': users,
+            'game_id': [f'game_{i % 3}' for i in ids],
+            'review_rating': ratings,
+            SHARD_COL: key
+            }),
+        STATE_DTYPES
+        )
+
+
+def full_run(*shards):
+    '''
+    Reviews vigentes y cuentas por usuario de una ejecucion completa
+    '''
+    return update_state(None, None, pd.concat(shards), [])[1:]
+
+
+def assert_same(result, expected):
+    '''
+    Se comparan las reviews y las cuentas por usuario
+    '''
+    for got, want in zip(result, expected):
+        key = got.columns[0]
+        pd.testing.assert_frame_equal(
+            got.astype(str).sort_values(key).reset_index(drop=True),
+            want.astype(str).sort_values(key).reset_index(drop=True)
+            )
+
+
+# %%
+# Se definen las pruebas
+
+
+def test_update_state_drops_deleted_rows():
+    first = shard('a', [1, 2, 3, 4], ['u1', 'u1', 'u2', 'u3'], [5, 4, 1, 3])
+    second = shard('b', [5, 6, 7], ['u2', 'u3', 'u3'], [5, 5, 4])
+    state_df, _, users_df = update_state(None, None, first, [])
+    state_df, _, users_df = update_state(state_df, users_df, second, [])
+
+    # Se borran dos reviews del primer fichero, una de ellas la unica de u1
+    # con nota 5, y se modifica otra
+    changed = shard('a', [2, 3], ['u1', 'u2'], [4, 3])
+    state_df, reviews_df, users_df = update_state(
+        state_df, users_df, changed, ['a']
+        )
+    assert sorted(reviews_df['id']) == [2, 3, 5, 6, 7]
+    assert len(state_df) == 5
+    assert_same((reviews_df, users_df), full_run(changed, second))
+
+
+def test_update_state_removed_file():
+    first = shard('a', [1, 2], ['u1', 'u2'], [5, 4])
+    second = shard('b', [3, 4], ['u1', 'u3'], [1, 5])
+    state_df, _, users_df = update_state(
+        None, None, pd.concat([first, second]), []
+        )
+    empty = shard('a', [], [], [])
+    state_df, reviews_df, users_df = update_state(
+        state_df, users_df, empty, ['b']
+        )
+    assert sorted(reviews_df['id']) == [1, 2]
+    assert_same((reviews_df, users_df), full_run(first))
+
+
+def test_update_state_duplicates_follow_listing_order():
+    # El id 3 esta en los dos ficheros: se conserva la copia de 'a' y, si se
+    # borra de 'a', pasa a ser vigente la de 'b'
+    first = shard('a', [1, 3], ['u1', 'u1'], [5, 4])
+    second = shard('b', [3, 4], ['u2', 'u2'], [1, 1])
+    state_df, reviews_df, users_df = update_state(
+        None, None, pd.concat([second, first]), []
+        )
+    assert reviews_df.set_index('id').loc[3, 'user_id'] == 'u1'
+
+    changed = shard('a', [1], ['u1'], [5])
+    state_df, reviews_df, users_df = update_state(
+        state_df, users_df, changed, ['a']
+        )
+    assert reviews_df.set_index('id').loc[3, 'user_id'] == 'u2'
+    assert_same((reviews_df, users_df), full_run(changed, second))
+    assert users_df['count'].sum() == len(reviews_df)
@@ -0,0 +1,64 @@
+'''
+Pruebas del indice de nombres de games_complex
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import numpy as np
+import pandas as pd
+import pytest
+from name_index import (
+    build_index, lookup, name_keys, read_index, write_index
+    )
+
+# %%
+# Se definen las constantes
+
+NAMES = [
+    'Pokémon Red', 'POKEMON Blue', None, 'Pokemon', 'Zelda', np.NaN,
+    ' Ōkami ', 'Straße', 'pokémon yellow', 'None', 'Pokemon'
+    ]
+
+# %%
+# Se definen las pruebas
+
+
+@pytest.fixture(name='index')
+def fixture_index(tmp_path):
+    path = str(tmp_path / 'names.arrow')
+    write_index(build_index(pd.Series(NAMES, dtype=object)), path)
+    return read_index(path)
+
+
+def test_nulls_not_indexed(index):
+    rows = index.column('row').to_pylist()
+    assert sorted(rows) == [0, 1, 3, 4, 6, 7, 8, 9, 10]
+    # Solo se encuentra el juego que se llama 'None', no los que no tienen
+    # nombre
+    assert lookup(index, 'none', prefix=False) == [9]
+    assert lookup(index, 'non') == [9]
+
+
+def test_accents_and_case(index):
+    assert lookup(index, 'pokemon', prefix=False) == [3, 10]
+    assert lookup(index, 'POKÉMON RED', prefix=False) == [0]
+    assert lookup(index, 'okami', prefix=False) == [6]
+    assert lookup(index, 'STRASSE', prefix=False) == [7]
+
+
+def test_prefix_and_limit(index):
+    assert sorted(lookup(index, 'Poke', limit=None)) == [0, 1, 3, 8, 10]
+    # Las filas salen en el orden de las claves
+    assert lookup(index, 'poke', limit=None) == [3, 10, 1, 0, 8]
+    assert lookup(index, 'poke', limit=2) == [3, 10]
+    assert lookup(index, 'pokemon b') == [1]
+    assert lookup(index, 'zz') == []
+    assert lookup(index, '') == lookup(index, '', limit=None)[:10]
+
+
+def test_keys_match_rows(index):
+    rows = index.column('row').to_pylist()
+    keys = name_keys([NAMES[row] for row in rows]).tolist()
+    assert keys == index.column('key').to_pylist()
+    assert keys == sorted(keys)
@@ -0,0 +1,83 @@
+'''
+Pruebas de la matriz de notas de usuarios por juegos
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import numpy as np
+import pandas as pd
+from rating_matrix import (
+    load_ratings, rating_matrix, ratings_from_files, save_ratings,
+    track_reviews
+    )
+from schema import REVIEWS_DTYPES, apply_dtypes
+
+
+# %%
+# Se definen las pruebas
+
+
+def test_ratings_from_files_matches_rating_matrix(tmp_path):
+    rng = np.random.default_rng(0)
+    n_reviews = 2000
+    reviews_df = apply_dtypes(
+        pd.DataFrame({
+            'id': rng.permutation(n_reviews) + 1,
+            'user_id': [f'u{i}' for i in rng.integers(0, 150, n_reviews)],
+            'game_id': [f'g{i}' for i in rng.integers(0, 40, n_reviews)],
+            'review_rating': rng.choice([1, 3, 4, 5], n_reviews)
+            }),
+        REVIEWS_DTYPES
+        )
+    # Cada fichero conserva solo sus categorias, como en partition_reviews
+    partitions = [
+        (str(number), part.apply(
+            lambda col: col.cat.remove_unused_categories()
+            if col.dtype == 'category' else col
+            ))
+        for number, part in enumerate(np.array_split(reviews_df, 7))
+        ] + [('empty', reviews_df.iloc[:0])]
+
+    names = [name for name, _ in track_reviews(partitions, str(tmp_path))]
+    assert names == [name for name, _ in partitions]
+
+    expected = rating_matrix(reviews_df)
+    result = ratings_from_files(str(tmp_path))
+    assert (result['users'] == expected['users']).all()
+    assert (result['games'] == expected['games']).all()
+    for name in ['indptr', 'indices', 'data']:
+        assert np.array_equal(
+            getattr(result['matrix'], name), getattr(expected['matrix'], name)
+            )
+
+
+def test_ratings_from_files_empty(tmp_path):
+    result = ratings_from_files(str(tmp_path))
+    assert result['matrix'].shape == (0, 0)
+
+
+def test_save_ratings_with_integer_ids(tmp_path):
+    reviews_df = pd.DataFrame({
+        'id': [1, 2, 3, 4],
+        'user_id': [30, 10, 30, 20],
+        'game_id': [7, 7, 5, 9],
+        'review_rating': [5, 3, 4, 1]
+        })
+    folder = f'{tmp_path}/ratings/'
+    for ratings in [
+            rating_matrix(reviews_df),
+            rating_matrix(apply_dtypes(reviews_df, REVIEWS_DTYPES))]:
+        save_ratings(ratings, folder)
+        result = load_ratings(folder)
+        assert result['users'].to_pylist() == [10, 20, 30]
+        assert result['games'].to_pylist() == [5, 7, 9]
+        assert (result['matrix'] != ratings['matrix']).nnz == 0
+
+
+def test_save_ratings_empty(tmp_path):
+    folder = f'{tmp_path}/ratings/'
+    save_ratings(ratings_from_files(str(tmp_path)), folder)
+    result = load_ratings(folder)
+    assert result['users'].type == 'string'
+    assert result['matrix'].shape == (0, 0)
@@ -0,0 +1,159 @@
+'''
+Pruebas de las reglas de usuarios validos y de los nombres unicos de
+review_cleaner
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import numpy as np
+import pandas as pd
+from review_cleaner import USER_RULES, unique_names, user_stats, valid_users
+from schema import REVIEWS_DTYPES, apply_dtypes
+
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def reviews(n_reviews=3000, ratings=(1, 3, 4, 5), seed=0):
+    '''
+    Reviews aleatorias de 200 usuarios con las notas dadas
+    '''
+    rng = np.random.default_rng(seed)
+    return apply_dtypes(
+        pd.DataFrame({
+            'id': np.arange(1, n_reviews + 1),
+            'user_id': [f'u{i}' for i in rng.integers(0, 200, n_reviews)],
+            'game_id': [f'g{i}' for i in rng.integers(0, 50, n_reviews)],
+            'review_rating': rng.choice(ratings, n_reviews)
+            }),
+        REVIEWS_DTYPES
+        )
+
+
+def get_id(name, year, platforms, n_count, n_count_2):
+    '''
+    Implementacion anterior del nombre unico de un juego
+    '''
+    if n_count == 1:
+        return name
+    if n_count_2 > 1:
+        return f'{name} ({year}) - {(", ").join(platforms)}'
+    return f'{name} ({year})'
+
+
+def old_unique_names(games_df):
+    '''
+    Implementacion anterior, fila a fila con get_id. Los juegos sin fecha de
+    salida se descartaban al unir los recuentos por nombre y fecha
+    '''
+    game_count = games_df.drop_duplicates('id')['name'].value_counts()
+    games_df = (
+        games_df
+        .assign(
+            n_count=games_df['name'].map(lambda name: game_count[name])
+            )
+        )
+    games_df = (
+        games_df
+        .merge(
+            games_df
+            .groupby(['name', 'first_release_date'])['id']
+            .count()
+            .reset_index()
+            .rename(columns={'id': 'n_count_2'}),
+            on=['name', 'first_release_date']
+            )
+        )
+    return games_df.set_index('row').apply(
+        lambda game: get_id(
+            game['name'],
+            game['first_release_date'],
+            game['platforms'],
+            game['n_count'],
+            game['n_count_2']
+            ),
+        axis=1
+        )
+
+
+def games_with_names():
+    '''
+    Juegos con nombres repetidos entre distintos id, con el mismo ano o no,
+    con varias filas por id, sin fecha de salida y sin enlace de RAWG
+    '''
+    rows = [
+        (1, 'Solo', 2001.0, ['PC'], 'solo'),
+        (2, 'Twin', 2001.0, ['PC'], 'twin-1'),
+        (3, 'Twin', 2005.0, ['PS4', 'Xbox One'], 'twin-2'),
+        (4, 'Same', 2010.0, ['PC'], 'same-1'),
+        (5, 'Same', 2010.0, ['Switch', 'PS4'], 'same-2'),
+        (6, 'Multi', 2012.0, ['PC', 'PS4'], 'multi'),
+        (6, 'Multi', 2012.0, ['PC', 'PS4'], 'multi'),
+        (7, 'Dated', np.NaN, ['PC'], 'dated-1'),
+        (8, 'Dated', 2015.0, ['PC'], 'dated-2'),
+        (9, 'Linkless', 2018.0, ['PC'], None),
+        (10, 'Linkless', 2019.0, ['PS4'], 'linkless'),
+        (11, 'Ghost', 2020.0, [], None)
+        ]
+    return pd.DataFrame(
+        rows,
+        columns=['id', 'name', 'first_release_date', 'platforms', 'RAWG_link']
+        ).assign(row=lambda df: df.index)
+
+
+# %%
+# Se definen las pruebas
+
+
+def test_unique_names_matches_get_id():
+    games_df = games_with_names()
+    expected = old_unique_names(games_df.copy())
+    result = unique_names(games_df)
+    assert result.index.equals(games_df.index)
+    dated = games_df['first_release_date'].notna()
+    assert result[dated].to_dict() == expected.to_dict()
+    assert result.tolist() == [
+        'Solo', 'Twin (2001.0)', 'Twin (2005.0)', 'Same (2010.0) - PC',
+        'Same (2010.0) - Switch, PS4', 'Multi', 'Multi', 'Dated (nan)',
+        'Dated (2015.0)', 'Linkless (2018.0)', 'Linkless (2019.0)', 'Ghost'
+        ]
+
+
+def test_rule_with_uncounted_rating():
+    # Ningun usuario tiene reviews con nota 2, que no se cuenta por defecto
+    users_df = user_stats(reviews())
+    required = valid_users(
+        users_df, [{'rule': 'required', 'ratings': [2]}]
+        )
+    assert required.empty
+    capped = valid_users(
+        users_df, [{'rule': 'quantile_cap', 'ratings': [2], 'q': 0.5}]
+        )
+    assert len(capped) == len(users_df)
+
+
+def test_rules_with_other_ratings():
+    reviews_df = reviews(ratings=(1, 2, 3, 4, 5))
+    users_df = user_stats(reviews_df, ratings=[1, 2, 3, 4, 5])
+    rules = USER_RULES + [
+        {'rule': 'required', 'ratings': [2]},
+        {'rule': 'entropy', 'min': 0.2}
+        ]
+    result = valid_users(users_df, rules)
+    ratings = ['1', '2', '3', '4', '5']
+    assert list(result.columns) == ['user_id', 'count'] + ratings
+    assert len(result)
+    assert (result[ratings].sum(axis=1).round(6) == 1).all()
+
+
+def test_rules_match_default_ratings():
+    # Con las notas por defecto el resultado no cambia al contar tambien la 2
+    reviews_df = reviews()
+    expected = valid_users(user_stats(reviews_df))
+    result = valid_users(user_stats(reviews_df, ratings=[1, 2, 3, 4, 5]))
+    pd.testing.assert_frame_equal(
+        result.drop('2', axis=1).reset_index(drop=True),
+        expected.reset_index(drop=True)
+        )
@@ -0,0 +1,89 @@
+'''
+Pruebas de la exportacion de las reviews limpias
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from review_exporter import export_reviews, partition_reviews
+from schema import REVIEWS_DTYPES, apply_dtypes
+
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def sample_reviews(n_reviews, seed=0):
+    '''
+    Reviews sinteticas con ids consecutivos
+    '''
+    rng = np.random.default_rng(seed)
+    return apply_dtypes(
+        pd.DataFrame({
+            'id': np.arange(1, n_reviews + 1),
+            'user_id': [f'u{i}' for i in rng.integers(0, 300, n_reviews)],
+            'game_id': [f'g{i}' for i in rng.integers(0, 50, n_reviews)],
+            'review_rating': rng.choice([1, 3, 4, 5], n_reviews)
+            }),
+        REVIEWS_DTYPES
+        )
+
+
+def export(reviews_df, root, partition, digests=None):
+    '''
+    Se exportan las reviews en Feather y en Parquet bajo root
+    '''
+    return export_reviews(
+        partition_reviews(reviews_df, **partition),
+        f'{root}/clean/', digests, 2, f'{root}/dataset/'
+        )
+
+
+def read_folder(root):
+    '''
+    Se leen todos los ficheros de salida bajo root, ordenados por id, junto
+    a sus nombres
+    '''
+    names, parts = [], []
+    for folder, _, files in sorted(os.walk(root)):
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            names.append(os.path.relpath(path, root))
+            if name.endswith('.feather'):
+                parts.append(pd.read_feather(path))
+            else:
+                parts.append(pd.read_parquet(path))
+    reviews_df = pd.concat(parts).astype(str).sort_values('id')
+    return names, reviews_df.reset_index(drop=True)
+
+
+# %%
+# Se definen las pruebas
+
+
+@pytest.mark.parametrize('partition', [
+    {'mode': 'size', 'target_bytes': 20000},
+    {'mode': 'id', 'n_reviews': 500},
+    {'mode': 'game', 'n_buckets': 8}
+    ])
+def test_rerun_matches_fresh_run(tmp_path, partition):
+    first = sample_reviews(3000)
+    # Se eliminan reviews del principio y se pierden las ultimas, de forma
+    # que cambian los limites de los ficheros
+    second = first.iloc[200:2400].loc[lambda df: df['id'] % 7 != 0]
+
+    digests, _ = export(first, tmp_path / 'rerun', partition)
+    digests, _ = export(second, tmp_path / 'rerun', partition, digests)
+    fresh, _ = export(second, tmp_path / 'fresh', partition)
+    assert digests == fresh
+
+    for out in ['clean', 'dataset']:
+        rerun_names, rerun_df = read_folder(tmp_path / 'rerun' / out)
+        fresh_names, fresh_df = read_folder(tmp_path / 'fresh' / out)
+        assert rerun_names == fresh_names
+        assert len(rerun_df) == len(second)
+        pd.testing.assert_frame_equal(rerun_df, fresh_df)
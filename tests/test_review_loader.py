@@ -0,0 +1,53 @@
+'''
+Pruebas de la carga de las reviews
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+import numpy as np
+import pandas as pd
+import pytest
+from review_loader import load_reviews
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def write_shards(folder, n_shards=6, n_reviews=400, seed=0):
+    '''
+    Se escriben ficheros de reviews con ids repetidos dentro de cada fichero
+    y entre ficheros. El usuario indica el fichero y la fila de cada copia
+    '''
+    rng = np.random.default_rng(seed)
+    files, shards = [], []
+    for number in range(n_shards):
+        shard = pd.DataFrame({
+            'id': rng.integers(1, 2 * n_reviews, n_reviews),
+            'user_id': [f'u{number}_{row}' for row in range(n_reviews)],
+            'game_id': [f'g{i}' for i in rng.integers(0, 20, n_reviews)],
+            'review_rating': rng.choice([1, 3, 4, 5], n_reviews)
+            })
+        key = f'reviews_{number:05d}.feather'
+        shard.to_feather(folder / key)
+        files.append((key, (folder / key).stat().st_size))
+        shards.append(shard)
+    return files, shards
+
+
+# %%
+# Se definen las pruebas
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_load_reviews_keeps_first_copy(tmp_path, max_workers):
+    files, shards = write_shards(tmp_path)
+    reviews_df = load_reviews(str(tmp_path), files, max_workers=max_workers)
+
+    expected = pd.concat(shards).drop_duplicates('id')
+    assert reviews_df['id'].tolist() == expected['id'].tolist()
+    assert (
+        reviews_df['user_id'].astype(str).tolist()
+        == expected['user_id'].tolist()
+        )
+    assert reviews_df.index.equals(pd.RangeIndex(len(expected)))
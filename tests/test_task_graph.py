@@ -0,0 +1,156 @@
+'''
+Pruebas de las funciones de task_graph
+'''
+
+# %%
+# Se cargan las librerias necesarias
+
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import pytest
+from task_graph import from_shared, run_tasks, task, task_pool, to_shared
+import task_graph
+
+
+# %%
+# Se definen las funciones auxiliares
+
+
+def double(d_f, col):
+    '''
+    Paso que duplica una columna
+    '''
+    return d_f[col] * 2
+
+
+def fail(d_f, col):
+    '''
+    Paso que siempre falla
+    '''
+    raise ValueError(col)
+
+
+def exists(name):
+    '''
+    Indica si existe el bloque de memoria compartida name
+    '''
+    try:
+        block = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    block.close()
+    return True
+
+
+def spy_blocks(monkeypatch):
+    '''
+    Se guardan los nombres de los bloques que crea to_shared en el proceso
+    principal
+    '''
+    names = []
+
+    def spy(d_f):
+        ref = to_shared(d_f)
+        if ref['shared'] is not None:
+            names.append(ref['shared'][0])
+        return ref
+
+    monkeypatch.setattr(task_graph, 'to_shared', spy)
+    return names
+
+
+# %%
+# Se definen las pruebas
+
+
+def test_to_shared_round_trip():
+    d_f = pd.DataFrame({'a': [1, 2, 3], 'b': ['x', None, 'z']})
+    ref = to_shared(d_f)
+    pd.testing.assert_frame_equal(from_shared(ref, unlink=True), d_f)
+    assert not exists(ref['shared'][0])
+
+
+def test_to_shared_object_columns():
+    d_f = pd.DataFrame({
+        'text': ['x', 'y', 'z'],
+        'lists': [['a', 'b'], [], ['c']],
+        'dicts': [{'k': 1}, {}, {'j': [2]}],
+        'nulls': ['x', np.NaN, 'z'],
+        'tuples': [['a'], ('b',), ['c']],
+        0: [['d'], ['e', 'f'], []]
+        }, index=[4, 8, 15])
+    ref = to_shared(d_f)
+    # Solo el texto y las listas de texto, sin nulos, pasan por Arrow
+    assert [col for _, col in ref['converted']] == ['text', 'lists', 0]
+    result = from_shared(ref, unlink=True)
+    pd.testing.assert_frame_equal(result, d_f)
+    assert type(result['lists'].iloc[0]) is list
+    assert type(result['tuples'].iloc[1]) is tuple
+
+
+def test_to_shared_releases_block_on_error(monkeypatch):
+    names = []
+    original = shared_memory.SharedMemory
+
+    def tracked(*args, **kwargs):
+        block = original(*args, **kwargs)
+        names.append(block.name)
+        return block
+
+    def broken(table, buf):
+        raise OSError('write')
+
+    monkeypatch.setattr(shared_memory, 'SharedMemory', tracked)
+    monkeypatch.setattr(task_graph, 'write_ipc', broken)
+    with pytest.raises(OSError):
+        to_shared(pd.DataFrame({'a': [1, 2, 3]}))
+    monkeypatch.setattr(shared_memory, 'SharedMemory', original)
+    assert names and not any(exists(name) for name in names)
+
+
+def test_from_shared_unlinks_on_error(monkeypatch):
+    ref = to_shared(pd.DataFrame({'a': [1, 2, 3]}))
+
+    def broken(*args):
+        raise OSError('read')
+
+    monkeypatch.setattr(task_graph, 'read_ipc', broken)
+    with pytest.raises(OSError):
+        from_shared(ref, unlink=True)
+    assert not exists(ref['shared'][0])
+
+
+def test_run_tasks_pool_matches_serial():
+    tasks = [
+        task(col, double, [col], [col], col=col) for col in ['a', 'b', 'c']
+        ]
+    serial = pd.DataFrame({'a': [1, 2], 'b': [3, 4], 'c': [5, 6]})
+    parallel = serial.copy()
+    run_tasks(serial, tasks)
+    with task_pool(2) as executor:
+        run_tasks(parallel, tasks, executor)
+        # El mismo pool se reutiliza en varias llamadas
+        run_tasks(parallel, tasks, executor)
+    run_tasks(serial, tasks)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_run_tasks_releases_blocks_on_error(monkeypatch):
+    names = spy_blocks(monkeypatch)
+    d_f = pd.DataFrame({'a': [1, 2], 'b': [3, 4], 'c': [5, 6]})
+    tasks = [
+        task('a', double, ['a'], ['a'], col='a'),
+        task('b', fail, ['b'], ['b'], col='b'),
+        task('c', double, ['c'], ['c'], col='c')
+        ]
+    with task_pool(2) as executor:
+        with pytest.raises(ValueError):
+            run_tasks(d_f, tasks, executor)
+    assert len(names) == 3
+    assert not any(exists(name) for name in names)
+
+
+def test_task_pool_serial():
+    with task_pool(1) as executor:
+        assert executor is None